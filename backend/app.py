@@ -1,14 +1,46 @@
-from fastapi import FastAPI, HTTPException
+# Startup phases are timed from here (see /api/startup and startup.py)
+from startup import LazyModule, StartupReport
+STARTUP = StartupReport()
+
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+from datetime import date
+import contextvars
+import functools
+import inspect
+import io
+import os
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.io as pio
-import json
-from ml_models import PharmacyML
-
-app = FastAPI(title="Pharmacy EDA Dashboard (FastAPI)")
+from ml_models import HEAVY_MODULES, PharmacyML
+from data_cache import DATA_FILES, SCHEMAS
+from data_backend import create_backend
+from response_cache import ResponseCache, cache_key, cached_endpoint
+from render_pool import RenderPool, render_json
+import dashboard
+from model_monitor import ModelMonitor
+from model_registry import ModelRegistry, ModelSubscriber, TrainingJob
+import data_export
+from downsample import downsample_figure
+import forecast
+import recommender
+from ingest import CsvTailer
+from serialization import FastJSONResponse, dumps, figure_payload
+from indexes import RowFilter
+from metrics import REGISTRY, MetricsMiddleware, stage
+
+STARTUP.mark("imports")
+
+# plotly.express loads on the first chart (or the warm-up after startup)
+px = LazyModule("plotly.express")
+go = LazyModule("plotly.graph_objects")
+
+app = FastAPI(title="Pharmacy EDA Dashboard (FastAPI)", default_response_class=FastJSONResponse)
 
 # CORS
 app.add_middleware(
@@ -17,49 +49,301 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
-DATA_DIR = "data"
+# Compress anything bigger than a small JSON reply (chart payloads, exports).
+# Level 6: level 9 spent ~60ms on the largest chart for ~3% smaller output.
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=6)
+
+# Outermost: per-route latency/size/error metrics, Server-Timing stage header and
+# ?profile=1 reports, opt-in (PHARMACY_PROFILE=1) since any caller could trigger them
+app.add_middleware(MetricsMiddleware, allow_profile=os.environ.get("PHARMACY_PROFILE", "0") == "1")
+
+# PHARMACY_DATA_DIR points the API at another copy of the CSVs (e.g. benchmark data)
+DATA_DIR = os.environ.get("PHARMACY_DATA_DIR", "data")
+
+# Where the tables live: "pandas" (default) keeps every table in memory, typed via
+# the columnar cache in data/.cache; "duckdb" keeps them in an embedded DuckDB file
+# and runs groupbys/filters there, so memory doesn't grow with the row count.
+BACKEND_NAME = os.environ.get("PHARMACY_BACKEND", "pandas")
+DUCKDB_MEMORY_LIMIT = os.environ.get("PHARMACY_DUCKDB_MEMORY")
+
+# Multi-worker serving (serve.py): PHARMACY_SNAPSHOT is a shared Arrow snapshot of
+# the tables that every process maps read-only. PHARMACY_ROLE is "coordinator" for
+# the one process that trains and publishes models, "worker" for the API workers.
+SNAPSHOT_DIR = os.environ.get("PHARMACY_SNAPSHOT")
+ROLE = os.environ.get("PHARMACY_ROLE")
+# A snapshot is read-only: an append would only reach the process handling the request
+READ_ONLY = SNAPSHOT_DIR is not None
 
-# Attempt to load datasets
 def load_data():
-    d = {}
-    files = {
-        "customers": "Customers.csv",
-        "medicine": "Medicine.csv",
-        "pharmacy": "PharmacyShops.csv",
-        "prescriptions": "Prescriptions.csv",
-        "purchases": "Purchases.csv",
-        "sales_bills": "SalesBills.csv",
-        "stocks": "Stocks.csv",
-        "med_type": "TypesofMedicine.csv"
-    }
-    for k, fname in files.items():
-        try:
-            d[k] = pd.read_csv(f"{DATA_DIR}/{fname}")
-        except Exception as e:
-            d[k] = pd.DataFrame()
-            print(f"Warning: couldn't load {fname}: {e}")
-    return d
-
-DATA = load_data()
-ML_SYSTEM = PharmacyML(DATA)
-
-# Helper - safe parse date column
-def ensure_date(df, col):
-    if col in df.columns:
-        try:
-            df[col] = pd.to_datetime(df[col], errors="coerce")
-        except Exception:
-            pass
-    return df
+    return create_backend(BACKEND_NAME, DATA_DIR, DATA_FILES, duckdb_memory_limit=DUCKDB_MEMORY_LIMIT,
+                          snapshot=SNAPSHOT_DIR)
+
+# Optional: pick up rows appended to the CSVs on disk (poll interval in seconds, 0 = off).
+# The offsets are taken before loading; rows the load already has are skipped.
+TAIL_INTERVAL = float(os.environ.get("PHARMACY_TAIL_INTERVAL", "0"))
+CSV_TAILER = CsvTailer(DATA_DIR, DATA_FILES, lambda table, rows: ingest_rows(table, rows, skip_existing=True),
+                       TAIL_INTERVAL)
+CSV_TAILER.mark()
+
+with STARTUP.phase("load_data"):
+    BACKEND = load_data()
+# The in-memory tables (all of them with pandas, none with duckdb)
+DATA = BACKEND.data
+
+# Models are trained (or restored from the registry) in the background after
+# startup, so the API answers immediately; ML endpoints return 503 until ready.
+MODEL_DIR = "models"
+ML_SYSTEM = PharmacyML({}, train=False)
+# Training runs every model's final fit and CV folds across a process pool
+# (default one worker per CPU); a model over its budget (seconds) is cancelled.
+ML_JOBS = int(os.environ.get("PHARMACY_ML_JOBS", "0")) or None
+ML_CV_FOLDS = int(os.environ.get("PHARMACY_ML_CV_FOLDS", str(PharmacyML.CV_FOLDS)))
+ML_TIME_BUDGET = float(os.environ.get("PHARMACY_ML_BUDGET", str(PharmacyML.TIME_BUDGET)))
+
+def _build_ml(state):
+    if state is not None:
+        return PharmacyML({}, state=state)
+    return PharmacyML(ml_inputs(), n_jobs=ML_JOBS, cv_folds=ML_CV_FOLDS, time_budget=ML_TIME_BUDGET)
+
+def ml_inputs():
+    # Training reads the shared denormalized sales table; no joins per run
+    return {"sales_fact": BACKEND.sales_fact()}
+
+# Models trained by the same code and settings; a run on changed data starts from
+# the newest entry of its lineage instead of retraining (see _reuse_ml)
+ML_LINEAGE = f"v{PharmacyML.VERSION}-cv{ML_CV_FOLDS}"
+MODEL_REGISTRY = ModelRegistry(MODEL_DIR)
+
+def _ml_fingerprint():
+    return BACKEND.fingerprint(PharmacyML.SOURCE_TABLES, salt=ML_LINEAGE)
+
+def _publish_ml(ml):
+    global ML_SYSTEM
+    ML_SYSTEM = ml
+    # Score any sales that arrived while these models were being prepared
+    MODEL_MONITOR.notify()
+
+def _reuse_ml(state):
+    # Sales rows only ever get appended; if the rows the models have seen aren't
+    # all still there as they were, the data was replaced, so retrain from scratch
+    ml = PharmacyML({}, state=state)
+    fact = BACKEND.sales_fact()
+    if fact is None or not ml.has_seen(fact):
+        return None
+    return MODEL_MONITOR.catch_up(ml)
+
+LAST_REFRESH_KEY = None
+
+def _refreshed_ml(ml):
+    # Saved so a restart on this data loads it; the entry of the previous refresh in
+    # this process is superseded (the one for the data on disk is kept)
+    global LAST_REFRESH_KEY
+    key = _ml_fingerprint()
+    MODEL_REGISTRY.save(key, ml.export_state())
+    MODEL_REGISTRY.set_latest(ML_LINEAGE, key)
+    if LAST_REFRESH_KEY not in (None, key):
+        MODEL_REGISTRY.remove(LAST_REFRESH_KEY)
+    LAST_REFRESH_KEY = key
+    _publish_ml(ml)
+
+# Newly ingested sales are scored against the current models in the background;
+# drift (PSI) or rolling error past these thresholds triggers a warm-started refresh
+MODEL_MONITOR = ModelMonitor(
+    lambda: ML_SYSTEM, BACKEND.sales_fact, _refreshed_ml, rows_fn=lambda: BACKEND.count("sales_bills"),
+    psi_threshold=float(os.environ.get("PHARMACY_DRIFT_PSI", "0.2")),
+    error_ratio=float(os.environ.get("PHARMACY_DRIFT_ERROR_RATIO", "1.25")),
+    accuracy_drop=float(os.environ.get("PHARMACY_DRIFT_ACCURACY_DROP", "0.05")),
+    min_rows=int(os.environ.get("PHARMACY_DRIFT_MIN_ROWS", "500")),
+    enabled=not READ_ONLY and ROLE != "render" and os.environ.get("PHARMACY_DRIFT_MONITOR", "1") != "0",
+)
 
-# Helper to return Plotly JSON with Inference
-def response_with_inference(fig, inference_text):
-    return {
-        "graph": json.loads(fig.to_json()),
+if ROLE == "worker":
+    # Only the coordinator trains; workers load what it publishes for this snapshot
+    TRAINING_JOB = ModelSubscriber(MODEL_REGISTRY, _build_ml, _publish_ml,
+                                   tag=os.path.basename(SNAPSHOT_DIR or ""))
+else:
+    TRAINING_JOB = TrainingJob(MODEL_REGISTRY, _build_ml, _ml_fingerprint, _publish_ml,
+                               publish_tag=os.path.basename(SNAPSHOT_DIR) if ROLE == "coordinator" else None,
+                               lineage=ML_LINEAGE, reuse_fn=_reuse_ml)
+
+@app.on_event("startup")
+def start_model_training():
+    TRAINING_JOB.start()
+
+def _draw_first_chart():
+    # plotly builds its figure validators on the first figure (~0.6s), not on import
+    figure_payload(px.line(pd.DataFrame({"x": [0, 1], "y": [0, 1]}), x="x", y="y"))
+
+def warm_up(background=True):
+    """Import the lazily loaded libraries (plotly, scikit-learn) ahead of the first request."""
+    hooks = [_draw_first_chart]
+    if recommender.sp is not None and ROLE != "render" and BACKEND.has("prescriptions"):
+        hooks.append(recommender_index)
+    STARTUP.warm_up(HEAVY_MODULES, hooks=hooks, background=background)
+
+@app.on_event("startup")
+def start_warm_up():
+    STARTUP.mark("startup")
+    warm_up()
+
+def require_models():
+    if not TRAINING_JOB.ready:
+        raise HTTPException(status_code=503, detail=f"Models not ready ({TRAINING_JOB.state})")
+
+# Per-table version counters; bump a table's version whenever its rows change
+# so every cached response derived from it is invalidated.
+DATA_VERSIONS = BACKEND.versions
+
+def data_version(tables):
+    return tuple(DATA_VERSIONS.get(t, 0) for t in tables)
+
+RESPONSE_CACHE = ResponseCache(maxsize=256)
+
+# Chart computations run off the event loop in a bounded pool; identical concurrent
+# requests share one computation. PHARMACY_RENDER_QUEUE caps distinct computations
+# in flight (more get 503), PHARMACY_RENDER_TIMEOUT is seconds before a 504.
+# PHARMACY_RENDER_PROCESSES > 0 renders in processes instead of threads, which needs
+# the shared read-only snapshot of serve.py so every process sees the same data.
+RENDER_PROCESSES = int(os.environ.get("PHARMACY_RENDER_PROCESSES", "0"))
+if RENDER_PROCESSES and not SNAPSHOT_DIR:
+    print("Warning: PHARMACY_RENDER_PROCESSES needs a shared snapshot (serve.py); rendering in threads")
+    RENDER_PROCESSES = 0
+RENDER_POOL = RenderPool(
+    threads=int(os.environ.get("PHARMACY_RENDER_THREADS", "4")),
+    processes=RENDER_PROCESSES if ROLE != "render" else 0,
+    max_pending=int(os.environ.get("PHARMACY_RENDER_QUEUE", "64")),
+    timeout=float(os.environ.get("PHARMACY_RENDER_TIMEOUT", "30")),
+)
+
+@app.on_event("startup")
+def start_render_pool():
+    RENDER_POOL.start()
+
+@app.on_event("shutdown")
+def stop_render_pool():
+    RENDER_POOL.shutdown()
+
+# async: building the filter is trivial, so it shouldn't cost a threadpool hop
+async def row_filter(start: Optional[date] = None, end: Optional[date] = None,
+               shop_id: Optional[str] = None, medicine_id: Optional[str] = None,
+               payment_mode: Optional[str] = None, customer_id: Optional[str] = None):
+    return RowFilter(start=start, end=end, shop_id=shop_id, medicine_id=medicine_id,
+                     payment_mode=payment_mode, customer_id=customer_id)
+
+# Set while /api/dashboard renders: table -> filtered slice (all columns), so charts
+# reading the same table share one filtering pass. In-memory backend only: with
+# DuckDB the filter runs in SQL and a shared slice would pull every column.
+DASHBOARD_SLICES = contextvars.ContextVar("dashboard_slices", default=None)
+
+def _slice_table(name, flt, columns=None):
+    with stage("slice"):
+        df, note = BACKEND.rows(name, flt, columns)
+        if flt is not None and flt.active:
+            # Categories absent from the slice would show up as empty groups in plotly
+            cats = df.select_dtypes("category")
+            df = df.assign(**{col: cats[col].cat.remove_unused_categories() for col in cats.columns})
+        return df, note
+
+def filter_table(name, flt, columns=None):
+    """Rows of a table matching the filter, plus which filters were applied/ignored."""
+    slices = DASHBOARD_SLICES.get()
+    if slices is None or BACKEND.name != "pandas":
+        return _slice_table(name, flt, columns)
+    if name not in slices:
+        slices[name] = _slice_table(name, flt)
+    df, note = slices[name]
+    return (df if columns is None else df[[c for c in columns if c in df.columns]]), note
+
+def rollup(cube, by, flt):
+    """Grouped sums from the backend (pre-aggregated cube or SQL GROUP BY)."""
+    with stage("aggregate"):
+        return BACKEND.rollup(cube, by, flt)
+
+def summarize(name, by, flt):
+    """Per-group distribution summaries (mergeable sketches + bin counts) from the backend."""
+    with stage("aggregate"):
+        return BACKEND.summarize(name, by, flt)
+
+# Box plot drawn from per-group sketches: plotly gets each group's quartiles,
+# whiskers and (capped) outliers instead of every raw value.
+def box_figure(groups, x, y, title, color=False):
+    colors = px.colors.qualitative.Plotly
+    fig = go.Figure()
+    ordered = sorted(groups, key=lambda k: str(k[0]))
+    # Like px.box: one trace for all groups, or one per group when colored by it
+    for i, keys in enumerate([[k] for k in ordered] if color else [ordered]):
+        names = [str(k[0]) for k in keys]
+        stats = [groups[k].sketch.box() for k in keys]
+        trace_color = colors[i % len(colors)]
+        name = names[0] if color else y
+        fig.add_trace(go.Box(
+            x=names, name=name, legendgroup=name, showlegend=color, marker_color=trace_color,
+            q1=[b["q1"] for b in stats], median=[b["median"] for b in stats], q3=[b["q3"] for b in stats],
+            lowerfence=[b["lowerfence"] for b in stats], upperfence=[b["upperfence"] for b in stats]))
+        outliers = [(n, v) for n, b in zip(names, stats) for v in b["outliers"]]
+        if outliers:
+            fig.add_trace(go.Scatter(
+                x=[n for n, _ in outliers], y=[v for _, v in outliers], mode="markers", name=name,
+                legendgroup=name, showlegend=False, marker_color=trace_color, hoverinfo="x+y"))
+    fig.update_layout(title=title, xaxis_title=x, yaxis_title=y, boxmode="overlay",
+                      legend_title_text=x if color else None)
+    return fig
+
+# Histogram drawn from merged fixed-width bin counts
+def histogram_figure(summary, x, title, color):
+    edges, counts = summary.bins.bars()
+    width = summary.bins.width
+    fig = go.Figure(go.Bar(x=[e + width / 2 for e in edges], y=counts, width=width,
+                           marker_color=color, name=x))
+    fig.update_layout(title=title, xaxis_title=x, yaxis_title="count", bargap=0)
+    return fig
+
+# Appends update the table, its version, indexes and aggregates together
+def ingest_rows(table, df, skip_existing=False):
+    if table == "prescriptions" and recommender.sp is not None:
+        # Under the recommender's lock: a build starting between the append and
+        # add() would load the batch and then count it again
+        with RECOMMENDER.appending():
+            batch, errors = BACKEND.append(table, df, skip_existing)
+            if batch is not None and not batch.empty:
+                RECOMMENDER.add(batch)
+        return batch, errors
+    batch, errors = BACKEND.append(table, df, skip_existing)
+    if batch is not None and not batch.empty and table == "sales_bills":
+        MODEL_MONITOR.notify()
+    return batch, errors
+
+@app.on_event("startup")
+def start_csv_tailer():
+    if TAIL_INTERVAL > 0 and not READ_ONLY:
+        CSV_TAILER.start()
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+def cached(*tables):
+    return cached_endpoint(RESPONSE_CACHE, data_version, *tables, pool=RENDER_POOL)
+
+# Helper to return Plotly JSON with Inference.
+# max_points caps the points shipped across all traces (LTTB for lines, grid sampling for markers).
+# filters is the applied/ignored summary from the request's RowFilter, if any.
+def response_with_inference(fig, inference_text, max_points=None, filters=None):
+    with stage("downsample"):
+        original, kept = downsample_figure(fig, max_points)
+    with stage("serialize"):
+        graph = figure_payload(fig)
+    out = {
+        "graph": graph,
         "inference": inference_text
     }
+    if kept < original:
+        out["sampling"] = {"original_points": original, "returned_points": kept}
+    if filters:
+        out["filters"] = filters
+    return out
 
 # Pydantic Models for ML Inputs
 class LinearInput(BaseModel):
@@ -75,6 +359,25 @@ class TreeInput(BaseModel):
     price: float
     type_id: str
 
+class RecordBatch(BaseModel):
+    records: List[Dict[str, Any]]
+
+def json_records(payload):
+    """Records of a JSON batch ({"records": [...]} or a bare list of objects); 422 otherwise."""
+    if isinstance(payload, dict):
+        try:
+            payload = RecordBatch(**payload).records
+        except (TypeError, ValueError):
+            payload = None
+    if not isinstance(payload, list) or not all(isinstance(r, dict) for r in payload):
+        raise HTTPException(status_code=422, detail='Body must be a list of records or {"records": [...]}')
+    return payload
+
+MAX_PREDICT_ROWS = 100000
+# JSON batches up to this many records are scored by the compiled model (when the
+# model has one) right on the event loop, skipping pandas and sklearn
+COMPILED_MAX_ROWS = int(os.environ.get("PHARMACY_COMPILED_MAX_ROWS", "64"))
+
 @app.get("/")
 def index():
     return {"message": "Pharmacy EDA API is running. Access endpoints for data."}
@@ -82,7 +385,8 @@ def index():
 @app.get("/heads")
 def heads():
     out = {}
-    for name, df in DATA.items():
+    for name in BACKEND.tables():
+        df = BACKEND.head(name)
         if df.empty:
             out[name] = "Empty"
         else:
@@ -91,23 +395,37 @@ def heads():
 
 # --- ML Endpoints ---
 
+@app.get("/api/ml/status")
+def model_status():
+    return dict(TRAINING_JOB.status(), models=ML_SYSTEM.training, inference=ML_SYSTEM.inference)
+
+@app.get("/api/ml/drift")
+def model_drift():
+    """PSI per feature and live error per model on sales that arrived after fitting."""
+    require_models()
+    return MODEL_MONITOR.status(ML_SYSTEM)
+
 @app.get("/api/ml/regression/compare")
 def compare_regression_models():
+    require_models()
     return ML_SYSTEM.get_regression_metrics()
 
 @app.get("/api/ml/regression/plot/{model_name}")
 def get_regression_plot(model_name: str):
+    require_models()
     plot = ML_SYSTEM.get_regression_plot(model_name)
     if plot is None:
         return {"error": "Plot not available"}
-    return plot
+    return Response(content=dumps(plot), media_type="application/json")
 
 @app.get("/api/ml/classification/metrics")
 def get_classification_metrics():
+    require_models()
     return ML_SYSTEM.get_classification_metrics()
 
 @app.get("/api/ml/confusion_matrix/{model_name}")
 def get_model_confusion_matrix(model_name: str):
+    require_models()
     # Support both regression (binned) and classification CMs
     cm = ML_SYSTEM.get_confusion_matrix(model_name)
     if cm is None:
@@ -119,206 +437,581 @@ def get_model_confusion_matrix(model_name: str):
         return {"error": f"Confusion matrix not available for {model_name}"}
     return cm
 
-# Prediction Endpoints (Simplified for now, focusing on comparison)
-# We can add specific prediction endpoints if needed, but the user asked for comparison.
+# --- Prediction Endpoints ---
+
+@app.get("/api/ml/models")
+def list_models():
+    require_models()
+    return {name: ML_SYSTEM.features.get(name) for name in ML_SYSTEM.models}
+
+async def _read_prediction_input(request):
+    """
+    Accept a JSON batch ({"records": [...]} or a bare list), a CSV body, or a CSV
+    upload. Returns the list of records for JSON, a DataFrame for CSV.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=422, detail="Expected a CSV upload in form field 'file'")
+        return _read_csv(await upload.read())
+    if content_type.startswith("text/csv"):
+        return _read_csv(await request.body())
+
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Body must be JSON records or CSV")
+    return json_records(payload)
+
+def _read_csv(data):
+    # An empty body (EmptyDataError), ragged rows (ParserError) and bad encodings are all ValueErrors
+    try:
+        return pd.read_csv(io.BytesIO(data))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Could not parse CSV: {e}")
+
+@app.post("/api/ml/predict/{model_name}")
+async def predict(model_name: str, request: Request, response: Response):
+    require_models()
+    ml = ML_SYSTEM
+    if model_name not in ml.models:
+        raise HTTPException(status_code=404, detail=f"Unknown model '{model_name}'")
+
+    body = await _read_prediction_input(request)
+    if isinstance(body, list) and 0 < len(body) <= COMPILED_MAX_ROWS:
+        result = ml.predict_records(model_name, body)
+        if result is not None:
+            preds, errors = result
+            if preds is None:
+                raise HTTPException(status_code=422, detail=errors)
+            response.headers["X-Inference"] = "compiled"
+            return {"model": model_name, "count": len(preds), "predictions": preds.tolist()}
+
+    df = pd.DataFrame.from_records(body) if isinstance(body, list) else body
+    if df.empty:
+        return {"model": model_name, "count": 0, "predictions": []}
+    if len(df) > MAX_PREDICT_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_PREDICT_ROWS} records per request")
+
+    X, errors = ml.validate_features(model_name, df)
+    if X is None:
+        raise HTTPException(status_code=422, detail=errors)
+    preds = await run_in_threadpool(ml.predict_batch, model_name, X)
+    response.headers["X-Inference"] = "pipeline"
+    return {"model": model_name, "count": len(preds), "predictions": preds.tolist()}
 
 
 # --- Visualization Endpoints ---
+# Every chart accepts the common filters (start, end, shop_id, medicine_id, payment_mode,
+# customer_id); filters a table can't honour are listed under "filters.ignored".
+
+NO_MATCH = {"error": "No data for the selected filters"}
 
 # 1. Sales over time (Line)
 @app.get("/sales_over_time")
-def sales_over_time():
-    sales = DATA.get("sales_bills", pd.DataFrame()).copy()
-    if "sale_date" not in sales.columns or sales.empty:
+@cached("sales_bills")
+def sales_over_time(max_points: int = 1000, flt: RowFilter = Depends(row_filter)):
+    if not BACKEND.has_rollup("sales"):
         return {"error": "Data missing"}
-    sales = ensure_date(sales, "sale_date")
-    sales_over_time = sales.groupby("sale_date", dropna=True)["final_price"].sum().reset_index()
-    fig = px.line(sales_over_time, x="sale_date", y="final_price", title="Total Sales Over Time")
+    sales_over_time = rollup("sales", ["sale_date"], flt).sort_values("sale_date")
+    if sales_over_time.empty:
+        return NO_MATCH
+    with stage("figure"):
+        fig = px.line(sales_over_time, x="sale_date", y="final_price", title="Total Sales Over Time")
     
     total_sales = sales_over_time["final_price"].sum()
     peak_day = sales_over_time.loc[sales_over_time["final_price"].idxmax()]["sale_date"].strftime('%Y-%m-%d')
     inference = f"Total sales recorded are {total_sales:,.2f}. The highest sales occurred on {peak_day}, indicating a potential peak in demand or a specific event."
     
-    return response_with_inference(fig, inference)
+    return response_with_inference(fig, inference, max_points, BACKEND.describe_rollup("sales", flt))
 
 # 2. Payment mode vs status (Bar)
 @app.get("/payment_mode_status")
-def payment_mode_status():
-    sales = DATA.get("sales_bills", pd.DataFrame())
-    if sales.empty or "payment_mode" not in sales.columns:
+@cached("sales_bills")
+def payment_mode_status(flt: RowFilter = Depends(row_filter)):
+    if not BACKEND.has_rollup("sales"):
         return {"error": "Data missing"}
-    counts = sales.groupby(["payment_mode", "status"]).size().reset_index(name="count")
-    fig = px.bar(counts, x="payment_mode", y="count", color="status", title="Payment Modes vs Status", barmode="group")
+    counts = rollup("sales", ["payment_mode", "status"], flt).sort_values(["payment_mode", "status"])
+    if counts.empty:
+        return NO_MATCH
+    with stage("figure"):
+        fig = px.bar(counts, x="payment_mode", y="count", color="status", title="Payment Modes vs Status", barmode="group")
     
-    top_mode = counts.groupby("payment_mode")["count"].sum().idxmax()
+    top_mode = counts.groupby("payment_mode", observed=True)["count"].sum().idxmax()
     inference = f"The most popular payment mode is {top_mode}. Analyzing the status distribution helps identify if certain payment methods have higher cancellation rates."
     
-    return response_with_inference(fig, inference)
+    return response_with_inference(fig, inference, filters=BACKEND.describe_rollup("sales", flt))
 
 # 3. Customer age distribution (Histogram)
 @app.get("/customer_age_dist")
-def customer_age_dist():
-    cust = DATA.get("customers", pd.DataFrame())
-    if cust.empty or "age" not in cust.columns:
+@cached("customers")
+def customer_age_dist(flt: RowFilter = Depends(row_filter)):
+    if not BACKEND.has_summary("customer_age"):
         return {"error": "Data missing"}
-    fig = px.histogram(cust, x="age", nbins=20, title="Customer Age Distribution", color_discrete_sequence=["skyblue"])
+    groups, note = summarize("customer_age", [], flt)
+    if not groups:
+        return NO_MATCH
+    with stage("figure"):
+        fig = histogram_figure(groups[()], "age", "Customer Age Distribution", "skyblue")
     
-    avg_age = cust["age"].mean()
+    avg_age = groups[()].mean
     inference = f"The average customer age is {avg_age:.1f} years. The distribution highlights the primary demographic group, aiding in targeted marketing."
     
-    return response_with_inference(fig, inference)
+    return response_with_inference(fig, inference, filters=note)
 
 # 4. Purchase cost distribution (Histogram)
 @app.get("/purchase_cost_dist")
-def purchase_cost_dist():
-    purchases = DATA.get("purchases", pd.DataFrame())
-    if purchases.empty or "cost_price" not in purchases.columns:
+@cached("purchases")
+def purchase_cost_dist(flt: RowFilter = Depends(row_filter)):
+    if not BACKEND.has_summary("purchase_cost"):
         return {"error": "Data missing"}
-    fig = px.histogram(purchases, x="cost_price", nbins=20, title="Distribution of Purchase Cost", color_discrete_sequence=["purple"])
+    groups, note = summarize("purchase_cost", [], flt)
+    if not groups:
+        return NO_MATCH
+    with stage("figure"):
+        fig = histogram_figure(groups[()], "cost_price", "Distribution of Purchase Cost", "purple")
     
     inference = "This histogram shows the spread of purchase costs. Skewness towards lower values suggests frequent small-scale purchases."
-    return response_with_inference(fig, inference)
+    return response_with_inference(fig, inference, filters=note)
 
 # 5. Quantity Purchased per Supplier (Bar)
 @app.get("/supplier_qty")
-def supplier_qty():
-    purchases = DATA.get("purchases", pd.DataFrame())
-    if purchases.empty or "supplier_name" not in purchases.columns:
+@cached("purchases")
+def supplier_qty(flt: RowFilter = Depends(row_filter)):
+    if not BACKEND.has_rollup("purchases"):
         return {"error": "Data missing"}
-    sup_qty = purchases.groupby("supplier_name", dropna=True)["quantity"].sum().reset_index()
-    sup_qty = sup_qty.sort_values("quantity", ascending=False)
-    fig = px.bar(sup_qty, x="supplier_name", y="quantity", title="Quantity Purchased per Supplier")
+    sup_qty = rollup("purchases", ["supplier_name"], flt).sort_values("quantity", ascending=False)
+    if sup_qty.empty:
+        return NO_MATCH
+    with stage("figure"):
+        fig = px.bar(sup_qty, x="supplier_name", y="quantity", title="Quantity Purchased per Supplier")
     
     top_sup = sup_qty.iloc[0]["supplier_name"]
     inference = f"{top_sup} is the leading supplier by quantity. Reliance on a single supplier for bulk stock might pose a supply chain risk."
-    return response_with_inference(fig, inference)
+    return response_with_inference(fig, inference, filters=BACKEND.describe_rollup("purchases", flt))
 
 # 6. Available Stock Units per Shop (Box)
 @app.get("/stock_box")
-def stock_box():
-    stocks = DATA.get("stocks", pd.DataFrame())
-    if stocks.empty or "shop_id" not in stocks.columns:
+@cached("stocks")
+def stock_box(flt: RowFilter = Depends(row_filter)):
+    if not BACKEND.has_summary("stock_units"):
         return {"error": "Data missing"}
-    fig = px.box(stocks, x="shop_id", y="available_units", title="Available Stock Units per Shop")
+    groups, note = summarize("stock_units", ["shop_id"], flt)
+    if not groups:
+        return NO_MATCH
+    with stage("figure"):
+        fig = box_figure(groups, "shop_id", "available_units", "Available Stock Units per Shop")
     
     inference = "The box plot reveals variability in stock levels across shops. Outliers indicate shops with significantly higher or lower inventory than average."
-    return response_with_inference(fig, inference)
+    return response_with_inference(fig, inference, filters=note)
 
 # 7. Sales correlation heatmap (Heatmap)
 @app.get("/sales_corr_heatmap")
-def sales_corr_heatmap():
-    sales = DATA.get("sales_bills", pd.DataFrame())
+@cached("sales_bills")
+def sales_corr_heatmap(flt: RowFilter = Depends(row_filter)):
     cols = ["quantity", "discount", "final_price"]
-    if sales.empty or not all(c in sales.columns for c in cols):
+    if not BACKEND.has("sales_bills") or not all(c in BACKEND.columns("sales_bills") for c in cols):
         return {"error": "Data missing"}
-    corr = sales[cols].corr()
-    fig = px.imshow(corr, text_auto=True, title="Correlation between Sales Variables", color_continuous_scale="RdBu_r")
+    with stage("aggregate"):
+        corr, note = BACKEND.corr("sales_bills", cols, flt)
+    if corr is None:
+        return NO_MATCH
+    with stage("figure"):
+        fig = px.imshow(corr, text_auto=True, title="Correlation between Sales Variables", color_continuous_scale="RdBu_r")
     
     inference = "The heatmap displays relationships between sales variables. A strong correlation between Quantity and Final Price is expected."
-    return response_with_inference(fig, inference)
+    return response_with_inference(fig, inference, filters=note)
 
 # 8. Top doctors by prescriptions (Bar)
 @app.get("/top_doctors")
-def top_doctors():
-    pres = DATA.get("prescriptions", pd.DataFrame())
-    if pres.empty or "doctor_name" not in pres.columns:
+@cached("prescriptions")
+def top_doctors(flt: RowFilter = Depends(row_filter)):
+    if not BACKEND.has_rollup("prescriptions"):
         return {"error": "Data missing"}
-    doc_count = pres["doctor_name"].value_counts().head(10).reset_index()
-    doc_count.columns = ["doctor_name", "count"]
-    fig = px.bar(doc_count, x="doctor_name", y="count", title="Top 10 Doctors by Prescriptions")
+    doc_count = rollup("prescriptions", ["doctor_name"], flt).nlargest(10, "count")
+    if doc_count.empty:
+        return NO_MATCH
+    with stage("figure"):
+        fig = px.bar(doc_count, x="doctor_name", y="count", title="Top 10 Doctors by Prescriptions")
     
     top_doc = doc_count.iloc[0]["doctor_name"]
     inference = f"{top_doc} prescribes the most medications. Building a relationship with top prescribers could be beneficial."
-    return response_with_inference(fig, inference)
+    return response_with_inference(fig, inference, filters=BACKEND.describe_rollup("prescriptions", flt))
 
 # 9. Prescription trends by year (Line)
 @app.get("/prescription_trend")
-def prescription_trend():
-    pres = DATA.get("prescriptions", pd.DataFrame()).copy()
-    if pres.empty or "date" not in pres.columns:
+@cached("prescriptions")
+def prescription_trend(flt: RowFilter = Depends(row_filter)):
+    if not BACKEND.has_rollup("prescriptions"):
         return {"error": "Data missing"}
-    pres = ensure_date(pres, "date")
-    presc_trend = pres.groupby(pres["date"].dt.year)["prescription_id"].count().reset_index()
+    daily = rollup("prescriptions", ["date"], flt)
+    if daily.empty:
+        return NO_MATCH
+    with stage("aggregate"):
+        presc_trend = daily.groupby(daily["date"].dt.year)["count"].sum().reset_index()
     presc_trend.columns = ["year", "count"]
-    fig = px.line(presc_trend, x="year", y="count", markers=True, title="Prescriptions Over the Years")
+    with stage("figure"):
+        fig = px.line(presc_trend, x="year", y="count", markers=True, title="Prescriptions Over the Years")
     
     inference = "The trend line shows the volume of prescriptions over time. An upward trend indicates business growth or increased market reach."
-    return response_with_inference(fig, inference)
+    return response_with_inference(fig, inference, filters=BACKEND.describe_rollup("prescriptions", flt))
 
 # 10. Discount vs Final Price (Scatter)
 @app.get("/discount_vs_price")
-def discount_vs_price():
-    sales = DATA.get("sales_bills", pd.DataFrame())
-    if sales.empty:
+@cached("sales_bills")
+def discount_vs_price(max_points: int = 2000, flt: RowFilter = Depends(row_filter)):
+    if not BACKEND.has("sales_bills"):
         return {"error": "Data missing"}
-    fig = px.scatter(sales, x="discount", y="final_price", 
-                     color="payment_mode" if "payment_mode" in sales.columns else None,
-                     size="quantity" if "quantity" in sales.columns else None,
-                     hover_data=["status"] if "status" in sales.columns else None,
-                     title="Discount vs Final Price by Payment Mode")
+    sales, note = filter_table("sales_bills", flt,
+                               ["discount", "final_price", "payment_mode", "quantity", "status"])
+    if sales.empty:
+        return NO_MATCH
+    with stage("figure"):
+        fig = px.scatter(sales, x="discount", y="final_price", 
+                         color="payment_mode" if "payment_mode" in sales.columns else None,
+                         size="quantity" if "quantity" in sales.columns else None,
+                         hover_data=["status"] if "status" in sales.columns else None,
+                         title="Discount vs Final Price by Payment Mode")
     
     inference = "This scatter plot explores if higher discounts correlate with higher final prices (bulk buys). Color coding reveals payment preferences."
-    return response_with_inference(fig, inference)
+    return response_with_inference(fig, inference, max_points, note)
 
 # 11. Top 10 medicines by revenue (Bar)
 @app.get("/top_meds")
-def top_meds():
-    sales = DATA.get("sales_bills", pd.DataFrame())
-    meds = DATA.get("medicine", pd.DataFrame())
-    if sales.empty or meds.empty:
+@cached("sales_bills", "medicine")
+def top_meds(flt: RowFilter = Depends(row_filter)):
+    if not BACKEND.has_rollup("sales") or not BACKEND.has("medicine"):
         return {"error": "Data missing"}
-    top = sales.groupby("medicine_id", dropna=True)["final_price"].sum().nlargest(10).reset_index()
-    top = top.merge(meds[["medicine_id", "medicine_name"]], on="medicine_id", how="left")
-    fig = px.bar(top, x="medicine_name", y="final_price", title="Top 10 Medicines by Revenue", color="final_price")
+    top = rollup("sales", ["medicine_id"], flt).nlargest(10, "final_price")[["medicine_id", "final_price"]]
+    if top.empty:
+        return NO_MATCH
+    # Only the ten names are looked up (positionally), not merged with the whole medicine table
+    with stage("slice"):
+        names = BACKEND.lookup("medicine", top["medicine_id"], ["medicine_name"])
+    top = top.assign(medicine_name=names["medicine_name"])
+    with stage("figure"):
+        fig = px.bar(top, x="medicine_name", y="final_price", title="Top 10 Medicines by Revenue", color="final_price")
     
     top_med = top.iloc[0]["medicine_name"]
     inference = f"{top_med} generates the highest revenue. Ensuring consistent stock of this item is critical for profitability."
-    return response_with_inference(fig, inference)
+    return response_with_inference(fig, inference, filters=BACKEND.describe_rollup("sales", flt))
 
 # 12. Shop ratings by location (Box)
 @app.get("/shop_ratings_box")
-def shop_ratings_box():
-    shops = DATA.get("pharmacy", pd.DataFrame())
-    if shops.empty:
+@cached("pharmacy")
+def shop_ratings_box(flt: RowFilter = Depends(row_filter)):
+    if not BACKEND.has_summary("shop_ratings"):
         return {"error": "Data missing"}
-    fig = px.box(shops, x="location", y="rating", color="location", title="Shop Ratings by Location")
+    groups, note = summarize("shop_ratings", ["location"], flt)
+    if not groups:
+        return NO_MATCH
+    with stage("figure"):
+        fig = box_figure(groups, "location", "rating", "Shop Ratings by Location", color=True)
     
     inference = "Ratings vary by location. Locations with lower median ratings may require operational improvements or staff training."
-    return response_with_inference(fig, inference)
+    return response_with_inference(fig, inference, filters=note)
 
 # 13. Shop ratings histogram (Histogram)
 @app.get("/shop_ratings_hist")
-def shop_ratings_hist():
-    shops = DATA.get("pharmacy", pd.DataFrame())
-    if shops.empty:
+@cached("pharmacy")
+def shop_ratings_hist(flt: RowFilter = Depends(row_filter)):
+    if not BACKEND.has_summary("shop_ratings"):
         return {"error": "Data missing"}
-    fig = px.histogram(shops, x="rating", nbins=10, title="Shop Ratings Distribution", color_discrete_sequence=["orange"])
+    groups, note = summarize("shop_ratings", [], flt)
+    if not groups:
+        return NO_MATCH
+    with stage("figure"):
+        fig = histogram_figure(groups[()], "rating", "Shop Ratings Distribution", "orange")
     
     inference = "The distribution of ratings gives an overview of customer satisfaction. A left-skewed distribution would indicate mostly positive feedback."
-    return response_with_inference(fig, inference)
+    return response_with_inference(fig, inference, filters=note)
+
+# --- Demand forecast ---
+# Daily demand of every shop x medicine over the last PHARMACY_FORECAST_HISTORY_DAYS
+# days (default 364), forecast for all series at once and compared with current stock.
+FORECAST_HISTORY_DAYS = int(os.environ.get("PHARMACY_FORECAST_HISTORY_DAYS", "364"))
+FORECAST_STATUSES = ("stockout", "reorder", "ok", "untracked")
+
+@functools.lru_cache(maxsize=8)
+def reorder_plan(versions, horizon, lead_time, service_level):
+    """Forecast and reorder plan of every series; `versions` (data versions) keys the cache."""
+    with stage("aggregate"):
+        dates = BACKEND.rollup("sales", ["sale_date"], None)
+        origin = dates["sale_date"].max()
+        start = origin - pd.Timedelta(days=FORECAST_HISTORY_DAYS - 1)
+        daily = BACKEND.rollup("sales", ["shop_id", "medicine_id", "sale_date", "status"], RowFilter(start=start))
+        daily = daily[daily["status"].astype(str).isin(forecast.DEMAND_STATUSES)]
+        stocks, _ = BACKEND.rows("stocks", None, forecast.PAIR + ["available_units", "last_updated"])
+    with stage("forecast"):
+        return forecast.reorder_plan(daily, stocks, origin, FORECAST_HISTORY_DAYS, horizon,
+                                     lead_time, service_level)
+
+@app.get("/api/forecast")
+@cached("sales_bills", "stocks")
+def demand_forecast(horizon: int = 14, lead_time: int = 7, service_level: float = 0.95,
+                    status: Optional[str] = None, offset: int = 0, limit: int = 100,
+                    flt: RowFilter = Depends(row_filter)):
+    """
+    Days of cover and reorder suggestions per shop x medicine, most urgent first.
+    shop_id/medicine_id filter the series; status (comma-separated) picks
+    stockout/reorder/ok/untracked rows.
+    """
+    if not BACKEND.has_rollup("sales") or not BACKEND.has("stocks"):
+        return {"error": "Data missing"}
+    if not 1 <= horizon <= 365 or not 0 <= lead_time <= 365:
+        return {"error": "horizon must be 1-365 days and lead_time 0-365 days"}
+    if not 0.5 <= service_level < 1:
+        return {"error": "service_level must be at least 0.5 and below 1"}
+    wanted = [s.strip() for s in status.split(",") if s.strip()] if status else []
+    unknown = [s for s in wanted if s not in FORECAST_STATUSES]
+    if unknown:
+        return {"error": f"Unknown status {unknown}. Use {', '.join(FORECAST_STATUSES)}."}
+
+    plan, summary = reorder_plan(data_version(("sales_bills", "stocks")), horizon, lead_time, service_level)
+    rows = plan
+    for col in ("shop_id", "medicine_id"):
+        if col in flt.keys:
+            rows = rows[rows[col].isin(flt.keys[col])]
+    if wanted:
+        rows = rows[rows["status"].isin(wanted)]
+    offset, limit = max(offset, 0), min(max(limit, 0), MAX_PAGE_SIZE)
+    page = rows.iloc[offset:offset + limit].replace([np.inf], np.nan)
+    out = dict(summary, horizon_days=horizon, lead_time_days=lead_time, service_level=service_level,
+               total=len(rows), offset=offset, limit=limit, items=page.to_dict("records"))
+    note = flt.describe(None, ["shop_id", "medicine_id"])
+    if note:
+        out["filters"] = note
+    return out
 
+# --- Recommendations ---
+# "Prescribed together" neighbours from the sparse customer x medicine matrix of
+# Prescriptions; the top PHARMACY_RECOMMEND_TOP_K (default 20) are kept per medicine.
+RECOMMEND_TOP_K = int(os.environ.get("PHARMACY_RECOMMEND_TOP_K", "20"))
+RECOMMENDER = recommender.CoOccurrenceIndex(k=RECOMMEND_TOP_K)
+
+def recommender_index():
+    """The co-occurrence index, built from Prescriptions on first use (or by the warm-up)."""
+    return RECOMMENDER.ensure(lambda: BACKEND.rows("prescriptions", None, ["customer_id", "medicine_id"])[0])
+
+@app.get("/api/recommender")
+def recommender_status():
+    if recommender.sp is None:
+        return {"error": "Recommendations require scipy"}
+    return RECOMMENDER.status()
+
+@app.get("/api/recommend/{medicine_id}")
+def recommend(medicine_id: str, n: int = 10, metric: str = "cosine"):
+    """Medicines most often prescribed to the same customers as `medicine_id`."""
+    if recommender.sp is None:
+        return {"error": "Recommendations require scipy"}
+    if not BACKEND.has("prescriptions"):
+        return {"error": "Data missing"}
+    if metric not in recommender.METRICS:
+        return {"error": f"metric must be one of {list(recommender.METRICS)}"}
+    found = recommender_index().recommend(medicine_id, min(max(n, 1), RECOMMEND_TOP_K), metric)
+    if found is None:
+        return {"error": f"No prescriptions for medicine '{medicine_id}'"}
+    customers, neighbors = found
+    ids = pd.Series([m for m, _, _ in neighbors], dtype=object)
+    names = BACKEND.lookup("medicine", ids, ["medicine_name"]) if BACKEND.has("medicine") else None
+    return {
+        "medicine_id": medicine_id,
+        "customers": customers,
+        "metric": metric,
+        "recommendations": [
+            {"medicine_id": m, "medicine_name": None if names is None else names["medicine_name"].iloc[i],
+             "cosine": cosine, "customers_together": together}
+            for i, (m, cosine, together) in enumerate(neighbors)
+        ],
+    }
+
+# --- Dashboard bundle ---
+# Every chart in one streamed response (NDJSON lines, or server-sent events with
+# format=sse), each sent as soon as it's ready. Charts share the response cache
+# with their own endpoints; the ones not cached are rendered grouped by table.
+DASHBOARD_CHARTS = {f.__name__: f for f in (
+    sales_over_time, payment_mode_status, customer_age_dist, purchase_cost_dist, supplier_qty,
+    stock_box, sales_corr_heatmap, top_doctors, prescription_trend, discount_vs_price, top_meds,
+    shop_ratings_box, shop_ratings_hist)}
+CHART_PATHS = {route.endpoint: route.path for route in app.routes
+               if getattr(route, "endpoint", None) in DASHBOARD_CHARTS.values()}
+DASHBOARD_PARAMS = ("charts", "format")
+
+def _chart_kwargs(endpoint, query_params):
+    """The query parameters `endpoint` takes besides the filters, typed as its own route would."""
+    kwargs = {}
+    for name, param in inspect.signature(inspect.unwrap(endpoint)).parameters.items():
+        if name == "flt" or name not in query_params:
+            continue
+        value = query_params[name]
+        if param.annotation in (int, float):
+            try:
+                value = param.annotation(value)
+            except ValueError:
+                raise HTTPException(status_code=422, detail=f"'{name}' must be a number")
+        kwargs[name] = value
+    return kwargs
+
+def _dashboard_frames(entries, flt, fmt, chart_kwargs):
+    slices = {}
+    for name, endpoint, key, entry in dashboard.plan(entries):
+        status = "HIT"
+        if entry is None:
+            status = "MISS"
+            token = DASHBOARD_SLICES.set(slices)
+            try:
+                # Rendered with the chart's own parameters, since it's stored under its key
+                body = render_json(inspect.unwrap(endpoint)(flt=flt, **chart_kwargs[name]))
+                entry = RESPONSE_CACHE.store(key, body)
+            except Exception as e:
+                # One broken chart shouldn't cut off the rest of the stream
+                status, entry = "ERROR", (dumps({"error": str(e)}), None)
+            finally:
+                DASHBOARD_SLICES.reset(token)
+        yield dashboard.frame(fmt, name, status, entry[0])
+    yield dashboard.end_frame(fmt, len(entries))
+
+@app.get("/api/dashboard")
+def dashboard_bundle(request: Request, charts: Optional[str] = None, format: str = "ndjson",
+                     flt: RowFilter = Depends(row_filter)):
+    names = [c.strip() for c in charts.split(",") if c.strip()] if charts else list(DASHBOARD_CHARTS)
+    unknown = [n for n in names if n not in DASHBOARD_CHARTS]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown charts {unknown}; available: {list(DASHBOARD_CHARTS)}")
+    if format not in dashboard.MEDIA_TYPES:
+        raise HTTPException(status_code=422, detail=f"format must be one of {list(dashboard.MEDIA_TYPES)}")
+
+    # The same key each chart's own endpoint uses for these filters
+    params = [(k, v) for k, v in request.query_params.multi_items() if k not in DASHBOARD_PARAMS]
+    entries, chart_kwargs = [], {}
+    for name in names:
+        endpoint = DASHBOARD_CHARTS[name]
+        # Bad chart parameters fail the request up front, as they would on the chart's route
+        chart_kwargs[name] = _chart_kwargs(endpoint, request.query_params)
+        key = cache_key(CHART_PATHS[endpoint], params, data_version(endpoint.cache_tables))
+        entries.append((name, endpoint, key, RESPONSE_CACHE.get(key)))
+
+    frames = _dashboard_frames(entries, flt, format, chart_kwargs)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        frames = dashboard.gzip_frames(frames)
+        headers.update({"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+    return StreamingResponse(frames, media_type=dashboard.MEDIA_TYPES[format], headers=headers)
+
+# Raw table access. format=json returns one page (offset/limit or cursor);
+# ndjson/csv/arrow stream the selected rows in chunks instead of building them in memory.
 @app.get("/api/data/{dataset}")
-def get_dataset(dataset: str):
-    if dataset not in DATA:
+def get_dataset(dataset: str, offset: int = Query(0, ge=0),
+                limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                cursor: Optional[str] = None, columns: Optional[str] = None,
+                format: str = "json", flt: RowFilter = Depends(row_filter)):
+    if dataset not in BACKEND.tables():
         return {"error": "Dataset not found"}
-    df = DATA[dataset]
-    return df.to_dict(orient="records")
+    if format != "json" and format not in data_export.EXPORTERS:
+        return {"error": f"Unknown format '{format}'. Use json, ndjson, csv or arrow."}
+    if format == "arrow" and data_export.pa is None:
+        return {"error": "Arrow output requires pyarrow"}
+
+    cols = None
+    if columns:
+        cols = [c.strip() for c in columns.split(",") if c.strip()]
+        unknown = [c for c in cols if c not in BACKEND.columns(dataset)]
+        if unknown:
+            return {"error": f"Unknown columns: {unknown}"}
+
+    if cursor is not None:
+        offset = data_export.decode_cursor(cursor)
+        if offset is None:
+            return {"error": "Invalid cursor"}
+    offset = max(offset, 0)
+    with stage("slice"):
+        total = BACKEND.count(dataset, flt)
+
+    if format == "json":
+        limit = DEFAULT_PAGE_SIZE if limit is None else limit
+        with stage("slice"):
+            page = pd.concat(list(BACKEND.iter_rows(dataset, flt, cols, offset, limit)))
+        body = data_export.page_body(dataset, page, offset, limit, total)
+        return Response(content=body, media_type="application/json")
+
+    return StreamingResponse(
+        data_export.EXPORTERS[format](BACKEND.iter_rows(dataset, flt, cols, offset, limit)),
+        media_type=data_export.MEDIA_TYPES[format],
+        headers={"X-Total-Count": str(total)},
+    )
+
+# Append validated rows to a table without reloading everything
+@app.post("/api/ingest/{table}")
+async def ingest(table: str, request: Request):
+    if READ_ONLY:
+        raise HTTPException(status_code=409, detail="Ingest is disabled while serving a shared snapshot")
+    if table not in BACKEND.tables() or table not in SCHEMAS:
+        raise HTTPException(status_code=404, detail=f"Unknown table '{table}'")
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Body must be JSON records")
+    records = json_records(payload)
+    if not records:
+        return {"table": table, "inserted": 0, "version": DATA_VERSIONS[table], "rows": BACKEND.count(table)}
+
+    try:
+        batch, errors = await run_in_threadpool(ingest_rows, table, pd.DataFrame.from_records(records))
+    except (TypeError, ValueError) as e:
+        # Values pandas can't hold in a column (nested objects and the like)
+        raise HTTPException(status_code=422, detail=f"Invalid records: {e}")
+    if batch is None:
+        raise HTTPException(status_code=422, detail=errors)
+    return {"table": table, "inserted": len(batch), "version": DATA_VERSIONS[table], "rows": BACKEND.count(table)}
 
 @app.get("/api/summary")
 def get_summary():
     summary = {}
-    for name, df in DATA.items():
+    for name in BACKEND.tables():
+        rows, columns = BACKEND.count(name), BACKEND.columns(name)
         summary[name] = {
-            "shape": df.shape,
-            "columns": list(df.columns),
-            "empty": df.empty
+            "shape": (rows, len(columns)),
+            "columns": columns,
+            "empty": rows == 0
         }
     return summary
 
+@app.get("/api/cache/stats")
+def cache_stats():
+    return {"responses": RESPONSE_CACHE.stats(), "versions": DATA_VERSIONS, "backend": BACKEND.name}
+
+@app.get("/api/memory")
+def memory():
+    """Bytes per table and column, before and after entity ID encoding."""
+    return BACKEND.memory()
+
+# Prometheus text exposition of the request, stage and model metrics
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+# Liveness: the process is up and serving (answers as soon as it listens)
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+# Readiness: 503 until the warm-up has imported the heavy libraries, so a load
+# balancer holds traffic back from a worker whose first chart would be slow
+@app.get("/health/ready")
+def health_ready():
+    if not STARTUP.ready:
+        raise HTTPException(status_code=503, detail="Warming up")
+    return {"status": "ready", "models": TRAINING_JOB.state}
+
+@app.get("/api/startup")
+def startup_report():
+    """Seconds per startup phase and per lazily imported module."""
+    return STARTUP.report()
+
+STARTUP.mark("app")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app:app", host="127.0.0.1", port=8000, reload=True)
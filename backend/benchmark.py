@@ -0,0 +1,243 @@
+"""
+Benchmark suite for the API and PharmacyML.
+
+Times load_data (cold CSV parse and warm columnar cache), every chart endpoint
+and the /api/dashboard bundle (in-process through a TestClient), prepare_regression_data and the training
+routine on synthetic data scaled from the CSVs in data/. Each scale runs in its
+own process so imports, caches and memory start fresh.
+
+    python benchmark.py --scales 1 10 100 --out bench.json
+    python benchmark.py --compare before.json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+CHART_ENDPOINTS = [
+    "/sales_over_time",
+    "/payment_mode_status",
+    "/customer_age_dist",
+    "/purchase_cost_dist",
+    "/supplier_qty",
+    "/stock_box",
+    "/sales_corr_heatmap",
+    "/top_doctors",
+    "/prescription_trend",
+    "/discount_vs_price",
+    "/top_meds",
+    "/shop_ratings_box",
+    "/shop_ratings_hist",
+]
+
+
+def _stats(samples):
+    ms = [s * 1000 for s in samples]
+    return {
+        "median_ms": round(statistics.median(ms), 3),
+        "min_ms": round(min(ms), 3),
+        "max_ms": round(max(ms), 3),
+        "n": len(ms),
+    }
+
+
+def _time(fn, repeat=1, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return _stats(samples)
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def run_scale(scale, repeat, train):
+    """Benchmark one scale in this process; PHARMACY_DATA_DIR must already be set."""
+    timings = {}
+
+    start = time.perf_counter()
+    import app
+    timings["import_app"] = _stats([time.perf_counter() - start])
+
+    import pandas as pd
+    from fastapi.testclient import TestClient
+    from fact_table import FACT_TABLES, build_sales_fact
+    from ml_models import PharmacyML
+
+    def load():
+        app.load_data().close()
+
+    # Close the app's backend first: DuckDB reuses an open database in-process
+    app.BACKEND.close()
+    shutil.rmtree(os.path.join(app.DATA_DIR, ".cache"), ignore_errors=True)
+    timings["load_data/cold"] = _time(load)
+    timings["load_data/warm"] = _time(load, repeat)
+    app.BACKEND = app.load_data()
+    app.DATA, app.DATA_VERSIONS = app.BACKEND.data, app.BACKEND.versions
+
+    # Not used as a context manager: startup hooks (model training, CSV tailing) stay off
+    client = TestClient(app.app)
+    for path in CHART_ENDPOINTS:
+        name = path.strip("/")
+
+        def call():
+            r = client.get(path)
+            r.raise_for_status()
+
+        app.RESPONSE_CACHE.clear()
+        timings[f"endpoint/{name}/first"] = _time(call)
+        timings[f"endpoint/{name}/compute"] = _time(call, repeat, setup=app.RESPONSE_CACHE.clear)
+        timings[f"endpoint/{name}/cached"] = _time(call, repeat)
+
+    # Every chart in one streamed request, as the dashboard loads them
+    def bundle():
+        r = client.get("/api/dashboard")
+        r.raise_for_status()
+
+    timings["dashboard/compute"] = _time(bundle, repeat, setup=app.RESPONSE_CACHE.clear)
+    timings["dashboard/cached"] = _time(bundle, repeat)
+
+    # Demand forecast of every shop x medicine series, without the per-version plan cache
+    timings["forecast/reorder_plan"] = _time(
+        lambda: app.reorder_plan(("bench",), 14, 7, 0.95), repeat, setup=app.reorder_plan.cache_clear)
+
+    timings["ml/build_sales_fact"] = _time(
+        lambda: build_sales_fact(app.BACKEND.frames(FACT_TABLES)), repeat)
+    ml = PharmacyML(app.ml_inputs(), train=False)
+    timings["ml/prepare_regression_data"] = _time(ml.prepare_regression_data, repeat)
+    if train:
+        # All models at once, as the API trains them (process pool, CV folds)
+        timings["ml/train"] = _time(ml.train)
+    if "Random Forest" in ml.compiled:
+        # One point-of-sale lookup, through the sklearn pipeline and the compiled model
+        record = ml.parity_rows["Random Forest"][0]
+        timings["ml/predict_one/pipeline"] = _time(
+            lambda: ml.predict_batch("Random Forest", ml.validate_features("Random Forest", pd.DataFrame([record]))[0]),
+            repeat)
+        timings["ml/predict_one/compiled"] = _time(lambda: ml.predict_records("Random Forest", [record]), repeat)
+
+    return {
+        "scale": scale,
+        "backend": app.BACKEND.name,
+        "rows": {name: app.BACKEND.count(name) for name in app.BACKEND.tables()},
+        "peak_rss_mb": _peak_rss_mb(),
+        "timings": timings,
+    }
+
+
+def generate(scales, work_dir, seed):
+    # The source tables are whatever the API itself loads (data/ unless PHARMACY_DATA_DIR is set)
+    import app
+    from synthetic import scale_tables, write_tables
+
+    dirs = {}
+    for scale in scales:
+        out_dir = os.path.join(work_dir, f"x{scale}")
+        start = time.perf_counter()
+        source = app.BACKEND.frames(app.BACKEND.tables())
+        write_tables(scale_tables(source, scale, seed), out_dir, app.DATA_FILES)
+        print(f"generated x{scale} in {time.perf_counter() - start:.1f}s -> {out_dir}", file=sys.stderr)
+        dirs[scale] = out_dir
+    return dirs
+
+
+def run_all(args):
+    work_dir = args.data_dir or tempfile.mkdtemp(prefix="pharmacy-bench-")
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "backend": args.backend or os.environ.get("PHARMACY_BACKEND", "pandas"),
+        "runs": [],
+    }
+    try:
+        dirs = generate(args.scales, work_dir, args.seed)
+        for scale in args.scales:
+            train = args.train_max_scale is None or scale <= args.train_max_scale
+            out_file = os.path.join(work_dir, f"result-x{scale}.json")
+            cmd = [sys.executable, os.path.abspath(__file__), "--worker", str(scale),
+                   "--repeat", str(args.repeat), "--result", out_file]
+            if not train:
+                cmd.append("--no-train")
+            env = dict(os.environ, PHARMACY_DATA_DIR=dirs[scale])
+            if args.backend:
+                env["PHARMACY_BACKEND"] = args.backend
+            print(f"running x{scale}{'' if train else ' (no training)'}", file=sys.stderr)
+            subprocess.run(cmd, cwd=HERE, env=env, check=True)
+            with open(out_file) as f:
+                results["runs"].append(json.load(f))
+    finally:
+        if not args.data_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"wrote {args.out}", file=sys.stderr)
+
+
+def compare(before_path, after_path):
+    """Print median timings of two result files side by side, per scale."""
+    with open(before_path) as f:
+        before = {run["scale"]: run["timings"] for run in json.load(f)["runs"]}
+    with open(after_path) as f:
+        after = {run["scale"]: run["timings"] for run in json.load(f)["runs"]}
+
+    for scale in sorted(set(before) & set(after)):
+        print(f"\nx{scale}")
+        print(f"{'metric':<45} {'before ms':>12} {'after ms':>12} {'ratio':>8}")
+        for key in sorted(set(before[scale]) | set(after[scale])):
+            a = before[scale].get(key, {}).get("median_ms")
+            b = after[scale].get(key, {}).get("median_ms")
+            ratio = f"{b / a:.2f}" if a and b is not None else "-"
+            print(f"{key:<45} {a if a is not None else '-':>12} {b if b is not None else '-':>12} {ratio:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=5, help="timed repetitions per warm measurement")
+    parser.add_argument("--train-max-scale", type=int, default=10,
+                        help="skip the training routines above this scale (training is the slowest step)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=["pandas", "duckdb"], help="data backend to benchmark (PHARMACY_BACKEND)")
+    parser.add_argument("--data-dir", help="keep generated CSVs here instead of a temp dir")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    parser.add_argument("--no-train", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    elif args.worker is not None:
+        result = run_scale(args.worker, args.repeat, not args.no_train)
+        with open(args.result, "w") as f:
+            json.dump(result, f)
+    else:
+        run_all(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import math
+
+import numpy as np
+
+
+class NotCompilable(Exception):
+    """A fitted pipeline uses a step the compiled path doesn't implement."""
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+class CompiledPreprocessor:
+    """
+    A fitted ColumnTransformer (median/constant imputers, StandardScaler, one-hot
+    encoder) as plain arrays and dicts, applied to a list of records with no
+    pandas. Same output as transform() on the validated frame.
+    """
+
+    def __init__(self, transformer):
+        self.width = max(s.stop for s in transformer.output_indices_.values())
+        self.numeric = []      # (columns, output slice, fill values, mean, scale)
+        self.categorical = []  # (column, fill value, {category: output index})
+        for name, pipeline, columns in transformer.transformers_:
+            if isinstance(pipeline, str):
+                if pipeline != "drop" and len(columns):
+                    raise NotCompilable(f"{pipeline} columns")
+                continue
+            out = transformer.output_indices_[name]
+            steps = dict(pipeline.steps) if hasattr(pipeline, "steps") else {type(pipeline).__name__: pipeline}
+            kinds = {type(step).__name__: step for step in steps.values()}
+            if "OneHotEncoder" in kinds:
+                self._add_categorical(list(columns), out, kinds)
+            elif set(kinds) <= {"SimpleImputer", "StandardScaler"}:
+                self._add_numeric(list(columns), out, kinds)
+            else:
+                raise NotCompilable(f"steps {sorted(kinds)}")
+
+    def _add_numeric(self, columns, out, kinds):
+        n = len(columns)
+        imputer = kinds.get("SimpleImputer")
+        fill = np.full(n, np.nan) if imputer is None else np.asarray(imputer.statistics_, dtype=np.float64)
+        if imputer is not None and np.isnan(fill).any():
+            # The imputer drops all-missing columns, which shifts the output
+            raise NotCompilable("imputer with an all-missing column")
+        scaler = kinds.get("StandardScaler")
+        mean = scaler.mean_ if scaler is not None and scaler.with_mean else np.zeros(n)
+        scale = scaler.scale_ if scaler is not None and scaler.with_std else np.ones(n)
+        self.numeric.append((columns, out, fill, mean, scale))
+
+    def _add_categorical(self, columns, out, kinds):
+        encoder = kinds["OneHotEncoder"]
+        if encoder.handle_unknown != "ignore" or encoder.drop_idx_ is not None:
+            raise NotCompilable("one-hot encoder must ignore unknowns and drop nothing")
+        imputer = kinds.get("SimpleImputer")
+        offset = out.start
+        for i, column in enumerate(columns):
+            fill = None if imputer is None else imputer.statistics_[i]
+            categories = encoder.categories_[i]
+            self.categorical.append((column, fill, {c: offset + j for j, c in enumerate(categories)}))
+            offset += len(categories)
+
+    def columns(self):
+        return [c for cols, *_ in self.numeric for c in cols] + [c for c, _, _ in self.categorical]
+
+    def transform(self, records):
+        """(matrix, errors) for a list of dicts; matrix is None when a record is unusable."""
+        present = set().union(*records) if records else set()
+        missing = [c for c in self.columns() if c not in present]
+        if missing:
+            return None, [f"missing feature columns: {missing}"]
+
+        X = np.zeros((len(records), self.width))
+        errors = []
+        for columns, out, fill, mean, scale in self.numeric:
+            block = np.empty((len(records), len(columns)))
+            for j, column in enumerate(columns):
+                bad = []
+                for i, record in enumerate(records):
+                    value = record.get(column)
+                    if _is_missing(value):
+                        block[i, j] = np.nan
+                        continue
+                    try:
+                        block[i, j] = float(value)
+                    except (TypeError, ValueError):
+                        bad.append(i)
+                        continue
+                    # A value given as "nan" isn't a missing value; the frame path rejects it too
+                    if math.isnan(block[i, j]):
+                        bad.append(i)
+                if bad:
+                    errors.append(f"non-numeric values in '{column}' at rows {bad[:10]}")
+            block = np.where(np.isnan(block), fill, block)
+            block -= mean
+            block /= scale
+            X[:, out] = block
+        if errors:
+            return None, errors
+
+        for column, fill, index in self.categorical:
+            for i, record in enumerate(records):
+                value = record.get(column)
+                if _is_missing(value):
+                    value = fill
+                try:
+                    j = index.get(value)
+                except TypeError:
+                    return None, [f"unhashable value in '{column}' at row {i}"]
+                if j is not None:
+                    X[i, j] = 1.0
+        return X, []
+
+
+class TreeEnsemble:
+    """
+    Fitted sklearn trees flattened into one set of node arrays, evaluated for all
+    rows and trees at once: one vectorized step per tree level. Leaves point to
+    themselves, so every path can take max-depth steps.
+    """
+
+    def __init__(self, trees, classes=False):
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        self.depth = 0
+        for tree in trees:
+            t = tree.tree_
+            n = t.node_count
+            leaf = t.children_left < 0
+            own = np.arange(offset, offset + n)
+            roots.append(offset)
+            features.append(np.where(leaf, 0, t.feature))
+            thresholds.append(t.threshold)
+            lefts.append(np.where(leaf, own, t.children_left + offset))
+            rights.append(np.where(leaf, own, t.children_right + offset))
+            value = t.value[:, 0, :]
+            if classes:
+                total = value.sum(axis=1, keepdims=True)
+                value = value / np.where(total == 0, 1, total)
+            else:
+                value = value[:, 0]
+            values.append(value)
+            self.depth = max(self.depth, t.max_depth)
+            offset += n
+        # int32 node indices: a 200-tree forest has about a million nodes
+        self.feature = np.concatenate(features).astype(np.int32)
+        self.threshold = np.concatenate(thresholds)
+        self.left = np.concatenate(lefts).astype(np.int32)
+        self.right = np.concatenate(rights).astype(np.int32)
+        self.value = np.concatenate(values)
+        self.roots = np.asarray(roots, dtype=np.int32)
+
+    def leaves(self, X):
+        # sklearn compares float32 features against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def values(self, X):
+        """Leaf value per (row, tree); (row, tree, class) for classifiers."""
+        return self.value[self.leaves(X)]
+
+
+def _compile_estimator(estimator):
+    """Predict function (matrix -> predictions) for a fitted estimator."""
+    kind = type(estimator).__name__
+    if kind == "LinearRegression":
+        coef = np.ravel(estimator.coef_)
+        intercept = float(np.ravel(estimator.intercept_)[0])
+        return lambda X: X @ coef + intercept
+    if kind in ("DecisionTreeRegressor", "RandomForestRegressor"):
+        trees = [estimator] if kind == "DecisionTreeRegressor" else estimator.estimators_
+        ensemble = TreeEnsemble(trees)
+        return lambda X: ensemble.values(X).sum(axis=1) / len(trees)
+    if kind == "GradientBoostingRegressor":
+        init = getattr(estimator.init_, "constant_", None)
+        if init is None or estimator.estimators_.shape[1] != 1:
+            raise NotCompilable("gradient boosting needs the default init and one output")
+        ensemble = TreeEnsemble(estimator.estimators_[:, 0])
+        start, rate = float(np.ravel(init)[0]), estimator.learning_rate
+        return lambda X: start + (rate * ensemble.values(X)).sum(axis=1)
+    if kind == "RandomForestClassifier":
+        ensemble = TreeEnsemble(estimator.estimators_, classes=True)
+        classes = estimator.classes_
+        return lambda X: classes[ensemble.values(X).mean(axis=1).argmax(axis=1)]
+    raise NotCompilable(kind)
+
+
+class CompiledModel:
+    """
+    A fitted preprocessor + estimator pipeline compiled to NumPy arrays, for
+    scoring single records or small batches without pandas or sklearn's
+    per-call validation. Build it with compile_pipeline().
+    """
+
+    def __init__(self, preprocessor, predict):
+        self.preprocessor = preprocessor
+        self._predict = predict
+
+    def predict(self, records):
+        """(predictions, errors) for a list of dicts; predictions is None on bad input."""
+        X, errors = self.preprocessor.transform(records)
+        if X is None:
+            return None, errors
+        return self._predict(X), []
+
+
+def compile_pipeline(pipeline):
+    """CompiledModel for a fitted Pipeline([preprocessor, estimator]); raises NotCompilable."""
+    if len(pipeline.steps) != 2:
+        raise NotCompilable(f"{len(pipeline.steps)} pipeline steps")
+    (_, transformer), (_, estimator) = pipeline.steps
+    if type(transformer).__name__ != "ColumnTransformer":
+        raise NotCompilable(type(transformer).__name__)
+    return CompiledModel(CompiledPreprocessor(transformer), _compile_estimator(estimator))
+
+
+def parity_error(expected, actual):
+    """
+    None if compiled predictions match the pipeline's, else a description. Sums
+    may be ordered differently, so regressors compare with a tight tolerance.
+    """
+    expected, actual = np.asarray(expected), np.asarray(actual)
+    if expected.shape != actual.shape:
+        return f"shape {actual.shape} != {expected.shape}"
+    if expected.dtype.kind in "fc":
+        if not np.allclose(actual, expected, rtol=1e-9, atol=1e-9):
+            return f"max difference {np.max(np.abs(actual - expected)):.3g}"
+        return None
+    mismatched = int((expected != actual).sum())
+    return f"{mismatched} of {len(expected)} labels differ" if mismatched else None
@@ -0,0 +1,140 @@
+import threading
+import pandas as pd
+
+from data_cache import concat_aligned
+from indexes import TableIndex
+
+# Base cuboid per fact table: the finest grain the chart endpoints need, with
+# additive measures only (sums and row counts) so any coarser rollup can be
+# derived from it - and new rows can be folded in - without touching raw rows.
+CUBE_SPECS = {
+    "sales": {
+        "table": "sales_bills",
+        "dims": ["sale_date", "shop_id", "medicine_id", "payment_mode", "status"],
+        "measures": ["final_price", "quantity"],
+    },
+    "purchases": {
+        "table": "purchases",
+        "dims": ["purchase_date", "shop_id", "medicine_id", "supplier_name"],
+        "measures": ["quantity", "cost_price"],
+    },
+    "prescriptions": {
+        "table": "prescriptions",
+        "dims": ["date", "doctor_name", "medicine_id"],
+        "measures": [],
+    },
+}
+
+
+def aggregate(df, dims, measures):
+    """Group `df` by `dims`, summing `measures` and counting rows into 'count'."""
+    agg = {m: (m, "sum") for m in measures}
+    agg["count"] = (dims[0], "size")
+    return df.groupby(dims, observed=True, dropna=False, sort=False).agg(**agg).reset_index()
+
+
+class AggregateCube:
+    """
+    Pre-aggregated rollups over SalesBills / Purchases / Prescriptions.
+
+    `base[name]` holds the finest-grain cuboid; `rollup(name, by)` derives and
+    memoizes coarser views from it, so endpoint cost scales with the number of
+    groups rather than the number of raw rows.
+    """
+
+    def __init__(self, data, specs=CUBE_SPECS):
+        self.specs = specs
+        self.base = {}
+        self._rollups = {}
+        self._indexes = {}
+        self._lock = threading.Lock()
+        for name in specs:
+            self.rebuild(name, data)
+
+    def rebuild(self, name, data):
+        spec = self.specs[name]
+        df = data.get(spec["table"], pd.DataFrame())
+        base = None
+        if not df.empty and all(c in df.columns for c in spec["dims"] + spec["measures"]):
+            base = aggregate(df, spec["dims"], spec["measures"])
+        with self._lock:
+            self.base[name] = base
+            self._invalidate(name)
+
+    def _invalidate(self, name):
+        for key in [k for k in self._rollups if k[0] == name]:
+            del self._rollups[key]
+
+    def has(self, name):
+        return self.base.get(name) is not None
+
+    def measures(self, name):
+        return self.specs[name]["measures"] + ["count"]
+
+    def _index(self, name, base):
+        """Row-position index over a cuboid, rebuilt lazily whenever the cuboid changes."""
+        with self._lock:
+            entry = self._indexes.get(name)
+        if entry is not None and entry[0] is base:
+            return entry[1]
+        dims = self.specs[name]["dims"]
+        index = TableIndex(base, dims[0], dims[1:])
+        with self._lock:
+            if self.base.get(name) is base:
+                self._indexes[name] = (base, index)
+        return index
+
+    def describe_filter(self, name, row_filter):
+        dims = self.specs[name]["dims"]
+        return row_filter.describe(dims[0], dims[1:]) if row_filter is not None else None
+
+    def rollup(self, name, by, row_filter=None):
+        """
+        Sum of every measure grouped by `by` (a subset of the cuboid's dims).
+        With an active RowFilter only the matching cuboid rows are grouped (not memoized).
+        """
+        if row_filter is not None and row_filter.active:
+            base = self.base.get(name)
+            if base is None:
+                return None
+            rows, _ = row_filter.apply(base, self._index(name, base))
+            return rows.groupby(list(by), observed=True, sort=False)[self.measures(name)].sum().reset_index()
+
+        key = (name, tuple(by))
+        with self._lock:
+            cached = self._rollups.get(key)
+            base = self.base.get(name)
+        if cached is not None:
+            return cached
+        if base is None:
+            return None
+
+        out = base.groupby(list(by), observed=True, sort=False)[self.measures(name)].sum().reset_index()
+        with self._lock:
+            # Only keep it if the base wasn't replaced while we were computing
+            if self.base.get(name) is base:
+                self._rollups[key] = out
+        return out
+
+    def append(self, table, rows):
+        """
+        Fold newly ingested raw rows of `table` into its cuboid and into every
+        memoized rollup. Work is proportional to the new rows plus existing groups.
+        """
+        for name, spec in self.specs.items():
+            if spec["table"] != table or rows.empty:
+                continue
+            dims, measures = spec["dims"], self.measures(name)
+            delta = aggregate(rows, dims, spec["measures"])
+            with self._lock:
+                base = self.base.get(name)
+                self.base[name] = delta if base is None else _merge(base, delta, dims, measures)
+                for key in [k for k in self._rollups if k[0] == name]:
+                    by = list(key[1])
+                    part = delta.groupby(by, observed=True, sort=False)[measures].sum().reset_index()
+                    self._rollups[key] = _merge(self._rollups[key], part, by, measures)
+
+
+def _merge(current, delta, dims, measures):
+    combined = concat_aligned(current, delta)
+    return combined.groupby(dims, observed=True, dropna=False, sort=False)[measures].sum().reset_index()
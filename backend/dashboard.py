@@ -0,0 +1,43 @@
+import zlib
+
+# Stream formats for /api/dashboard
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+
+def plan(entries):
+    """
+    Order in which to send charts: (name, endpoint, cache key, cached entry or None).
+    Cached charts go first since they're ready now. The rest are grouped by the
+    table they read first, so charts sharing a table run back to back and reuse
+    its filtered slice.
+    """
+    ready = [e for e in entries if e[3] is not None]
+    pending = [e for e in entries if e[3] is None]
+    pending.sort(key=lambda e: e[1].cache_tables[0])
+    return ready + pending
+
+
+def frame(fmt, chart, cache, body):
+    """One chart as a stream frame. `body` is the chart's serialized JSON, embedded as is."""
+    line = b'{"chart":"%s","cache":"%s","payload":%s}' % (chart.encode(), cache.encode(), body)
+    if fmt == "sse":
+        return b"event: chart\nid: %s\ndata: %s\n\n" % (chart.encode(), line)
+    return line + b"\n"
+
+
+def end_frame(fmt, count):
+    line = b'{"done":true,"charts":%d}' % count
+    if fmt == "sse":
+        return b"event: done\ndata: %s\n\n" % line
+    return line + b"\n"
+
+
+def gzip_frames(frames, level=6):
+    """
+    Gzip a frame stream, flushing after every frame so the client can decode each
+    chart as it arrives (GZipMiddleware would hold back the tail of each one).
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for f in frames:
+        yield compressor.compress(f) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
@@ -0,0 +1,490 @@
+import os
+import json
+import hashlib
+import threading
+import pandas as pd
+
+from data_cache import SCHEMAS, CACHE_DIRNAME, apply_schema, concat_aligned, load_table
+from cube import AggregateCube, CUBE_SPECS
+from fact_table import FACT_DIMENSIONS, FACT_TABLES, DimensionIndex, append_sales_fact, build_sales_fact
+from id_codes import IdDictionary, memory_report
+from indexes import FILTER_COLUMNS, TableIndex
+from ingest import prepare_batch
+from model_registry import data_fingerprint
+from shared_snapshot import mapped_bytes, open_snapshot, snapshot_fact
+from sketches import SUMMARY_SPECS, SummaryStore, summarize_frame
+
+# DuckDB is optional - only needed for PHARMACY_BACKEND=duckdb
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+
+def _filter_columns(table):
+    spec = FILTER_COLUMNS.get(table, {"date": None, "keys": []})
+    return spec["date"], spec["keys"]
+
+
+class PandasBackend:
+    """
+    Every table held in memory as a typed DataFrame (loaded through the Arrow cache).
+    Charts read groupbys from the AggregateCube and distributions from the
+    SummaryStore, and filter through TableIndex.
+
+    With `snapshot` (a directory written by shared_snapshot.write_snapshot) the
+    tables are mapped read-only from it instead, shared with every other process
+    mapping the same snapshot.
+    """
+
+    name = "pandas"
+
+    def __init__(self, data_dir, files, snapshot=None):
+        self.snapshot = snapshot
+        attached = None
+        if snapshot is not None:
+            self.data, attached, _ = open_snapshot(snapshot)
+        else:
+            self.data = {}
+            for name, fname in files.items():
+                try:
+                    self.data[name] = load_table(data_dir, name, fname)
+                except Exception as e:
+                    self.data[name] = pd.DataFrame()
+                    print(f"Warning: couldn't load {fname}: {e}")
+        # Entity IDs share one dictionary per column, so joins and groupbys run on int codes
+        self.ids = IdDictionary(self.data)
+        self.versions = {name: 0 for name in self.data}
+        self.cube = AggregateCube(self.data)
+        self.summaries = SummaryStore(self.data)
+        self.indexes = {name: TableIndex(self.data[name], spec["date"], spec["keys"])
+                        for name, spec in FILTER_COLUMNS.items() if name in self.data}
+        # Appends go through append() so the table, its version, indexes and aggregates move together
+        self.lock = threading.Lock()
+        # Dimension lookups (code -> row) and the denormalized sales table, built once here
+        self._dimensions = {}
+        if attached is not None:
+            self._fact = snapshot_fact(self.data["sales_bills"], attached, self.ids)
+        else:
+            self._fact = build_sales_fact(self.data, self._fact_dimensions())
+
+    def tables(self):
+        return list(self.data)
+
+    def has(self, table):
+        return not self.data.get(table, pd.DataFrame()).empty
+
+    def columns(self, table):
+        return list(self.data.get(table, pd.DataFrame()).columns)
+
+    def count(self, table, flt=None):
+        if flt is None or not flt.active:
+            return len(self.data.get(table, pd.DataFrame()))
+        return len(self.rows(table, flt)[0])
+
+    def head(self, table, n=5):
+        return self.data.get(table, pd.DataFrame()).head(n)
+
+    def has_rollup(self, cube):
+        return self.cube.has(cube)
+
+    def rollup(self, cube, by, flt=None):
+        return self.cube.rollup(cube, by, flt)
+
+    def describe_rollup(self, cube, flt):
+        return self.cube.describe_filter(cube, flt)
+
+    def has_summary(self, name):
+        return self.summaries.has(name)
+
+    def summarize(self, name, by, flt=None):
+        """
+        {group key tuple: Summary} of a SUMMARY_SPECS column grouped by `by`, plus
+        which filters were applied/ignored. Merged from the stored groups when the
+        filter allows, otherwise summarized from the matching rows.
+        """
+        spec = SUMMARY_SPECS[name]
+        if self.summaries.can_serve(name, flt):
+            note = flt.describe(*_filter_columns(spec["table"])) if flt is not None else None
+            return self.summaries.summarize(name, by, flt), note
+        df, note = self.rows(spec["table"], flt, [spec["column"]] + list(by))
+        return summarize_frame(df, spec, by), note
+
+    def rows(self, table, flt=None, columns=None):
+        """Rows of `table` matching the filter, plus which filters were applied/ignored."""
+        with self.lock:
+            df = self.data.get(table, pd.DataFrame())
+            index = self.indexes.get(table)
+            if index is None:
+                note = flt.describe(None, []) if flt is not None else None
+                positions = None
+            else:
+                positions = index.select(flt) if flt is not None and flt.active else None
+                note = flt.describe(index.date_col, index.key_cols) if flt is not None else None
+        if positions is not None:
+            df = df.iloc[positions]
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
+        return df, note
+
+    def iter_rows(self, table, flt=None, columns=None, offset=0, limit=None):
+        df, _ = self.rows(table, flt, columns)
+        yield df.iloc[offset:offset + limit] if limit is not None else df.iloc[offset:]
+
+    def corr(self, table, cols, flt=None):
+        df, note = self.rows(table, flt, cols)
+        return (None if df.empty else df.corr()), note
+
+    def frames(self, tables):
+        return {t: self.data.get(t, pd.DataFrame()) for t in tables}
+
+    def dimension(self, table):
+        """DimensionIndex over a table's primary key, rebuilt whenever the table is replaced."""
+        df = self.data[table]
+        index = self._dimensions.get(table)
+        if index is None or index.df is not df:
+            index = self._dimensions[table] = DimensionIndex(df, SCHEMAS[table]["key"])
+        return index
+
+    def _fact_dimensions(self):
+        return {t: self.dimension(t) for t, _, _ in FACT_DIMENSIONS if self.has(t)}
+
+    def lookup(self, table, keys, columns):
+        """Attributes of the `keys` entities (aligned with keys), by positional lookup."""
+        with self.lock:
+            index = self.dimension(table)
+        return index.take(keys, columns)
+
+    def sales_fact(self):
+        """SalesBills with dimension attributes attached (fact_table.py); treat as read-only."""
+        with self.lock:
+            if self._fact is None and self.has("sales_bills"):
+                self._fact = build_sales_fact(self.data, self._fact_dimensions())
+            return self._fact
+
+    def fingerprint(self, tables, salt=""):
+        return data_fingerprint(self.data, tables, salt=salt)
+
+    def append(self, table, df, skip_existing=False):
+        """Validate and append raw records (see prepare_batch). Returns (typed batch, errors)."""
+        with self.lock:
+            batch, errors = prepare_batch(table, df, self.data[table], skip_existing)
+            if batch is None or batch.empty:
+                return batch, errors
+            grown = self.ids.extend(batch)
+            if grown:
+                self.ids.recode(self.data, grown)
+            batch = self.ids.encode(batch)
+            self.data[table] = concat_aligned(self.data[table], batch)
+            if table == "sales_bills" and self._fact is not None:
+                self._fact = append_sales_fact(self._fact, batch, self.data, self._fact_dimensions())
+            elif table in FACT_TABLES:
+                # New dimension rows can resolve existing sales; rebuild on next use
+                self._fact = None
+            if table in self.indexes:
+                self.indexes[table].append(batch)
+            self.cube.append(table, batch)
+            self.summaries.append(table, batch)
+            self.versions[table] += 1
+        return batch, []
+
+    def memory(self):
+        report = dict(memory_report(self.data, self.ids), backend=self.name)
+        fact = self._fact
+        if fact is not None:
+            # Its SalesBills columns are shared with the table; only the attached ones cost extra
+            attached = [c for c in fact.columns if c not in self.data["sales_bills"].columns]
+            size = int(fact[attached].memory_usage(index=False, deep=True).sum())
+            report["sales_fact"] = {"rows": len(fact), "attached_columns": attached, "bytes": size}
+            report["total"]["bytes"] += size
+        if self.snapshot is not None:
+            # The table columns above live in the mapped files, counted once for all workers
+            report["snapshot"] = {"path": self.snapshot, "mapped_bytes": mapped_bytes(self.snapshot)}
+        return report
+
+    def close(self):
+        pass
+
+
+# pandas schema dtype -> DuckDB column type
+_SQL_TYPES = {
+    "string": "VARCHAR", "category": "VARCHAR", "id": "VARCHAR",
+    "int16": "SMALLINT", "int32": "INTEGER", "int64": "BIGINT",
+    "float32": "FLOAT", "float64": "DOUBLE",
+}
+
+
+def _q(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class DuckDBBackend:
+    """
+    Tables live in a file-local DuckDB database (<data_dir>/.cache/tables.duckdb).
+    Groupbys, correlations and filters run inside DuckDB, which streams and spills
+    to disk, so only aggregated or explicitly requested rows reach pandas.
+
+    A table is re-imported from its CSV when the file's mtime/size or the schema
+    changes. Rows appended through `append` are written to the database and kept
+    until that happens.
+    """
+
+    name = "duckdb"
+
+    def __init__(self, data_dir, files, path=None, memory_limit=None):
+        cache_dir = os.path.join(data_dir, CACHE_DIRNAME)
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = path or os.path.join(cache_dir, "tables.duckdb")
+        self.con = duckdb.connect(self.path)
+        self.con.execute(f"SET temp_directory = '{os.path.join(cache_dir, 'duckdb_tmp')}'")
+        if memory_limit:
+            self.con.execute(f"SET memory_limit = '{memory_limit}'")
+        self.con.execute("CREATE TABLE IF NOT EXISTS _sources (name VARCHAR PRIMARY KEY, stamp VARCHAR)")
+
+        self.lock = threading.Lock()
+        self._tables = []
+        for name, fname in files.items():
+            try:
+                self._sync(name, os.path.join(data_dir, fname))
+                self._tables.append(name)
+            except Exception as e:
+                print(f"Warning: couldn't load {fname}: {e}")
+        self.versions = {name: 0 for name in files}
+        self._columns = {name: [r[0] for r in self._query(f"DESCRIBE {_q(name)}").fetchall()]
+                         for name in self._tables}
+        # Nothing is held in memory; callers go through rows()/rollup()/frames()
+        self.data = {}
+
+    def _query(self, sql, params=None):
+        # A cursor is a separate connection to the same database, safe to use per thread
+        return self.con.cursor().execute(sql, params or [])
+
+    def _sync(self, name, src):
+        st = os.stat(src)
+        stamp = json.dumps({"mtime_ns": st.st_mtime_ns, "size": st.st_size,
+                            "schema": SCHEMAS.get(name, {})}, sort_keys=True)
+        row = self.con.execute("SELECT stamp FROM _sources WHERE name = ?", [name]).fetchone()
+        exists = self.con.execute(
+            "SELECT count(*) FROM information_schema.tables WHERE table_name = ?", [name]).fetchone()[0]
+        if row is not None and row[0] == stamp and exists:
+            return
+
+        schema = SCHEMAS.get(name, {"dtypes": {}, "dates": []})
+        header = [r[0] for r in self.con.execute(
+            "DESCRIBE SELECT * FROM read_csv(?, header=true, all_varchar=true)", [src]).fetchall()]
+        selects = []
+        for col in header:
+            # Blank header cells (dangling commas) come through as columnN
+            if col.startswith("column") and col[6:].isdigit():
+                continue
+            if col in schema["dates"]:
+                selects.append(f"TRY_CAST({_q(col)} AS TIMESTAMP) AS {_q(col)}")
+            elif schema["dtypes"].get(col, "string") in _SQL_TYPES:
+                sql_type = _SQL_TYPES[schema["dtypes"].get(col, "string")]
+                selects.append(f"TRY_CAST({_q(col)} AS {sql_type}) AS {_q(col)}")
+        self.con.execute(
+            f"CREATE OR REPLACE TABLE {_q(name)} AS SELECT {', '.join(selects)} "
+            f"FROM read_csv(?, header=true, all_varchar=true)", [src])
+        self.con.execute("INSERT OR REPLACE INTO _sources VALUES (?, ?)", [name, stamp])
+
+    def _typed(self, df, table, columns=None):
+        """Cast query results to the pandas schema (only `columns`, e.g. group keys, if given)."""
+        if columns is not None:
+            typed = self._typed(df[list(columns)].copy(), table)
+            for col in columns:
+                df[col] = typed[col]
+            return df
+        df = apply_schema(df, table)
+        for col in df.columns:
+            if df[col].dtype.kind == "M" and df[col].dtype != "datetime64[ns]":
+                df[col] = df[col].astype("datetime64[ns]")
+        return df
+
+    def _where(self, flt, date_col, key_cols, extra=()):
+        clauses, params = list(extra), []
+        if flt is not None and flt.active:
+            if date_col and flt.start is not None:
+                clauses.append(f"{_q(date_col)} >= ?")
+                params.append(flt.start.to_pydatetime())
+            if date_col and flt.end is not None:
+                clauses.append(f"{_q(date_col)} < ?")
+                params.append(flt.end_exclusive.to_pydatetime())
+            for col, values in flt.keys.items():
+                if col in key_cols:
+                    clauses.append(f"{_q(col)} IN ({', '.join('?' * len(values))})")
+                    params.extend(values)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def tables(self):
+        return list(self._tables)
+
+    def has(self, table):
+        return table in self._tables and self.count(table) > 0
+
+    def columns(self, table):
+        return list(self._columns.get(table, []))
+
+    def count(self, table, flt=None):
+        if table not in self._tables:
+            return 0
+        where, params = self._where(flt, *_filter_columns(table))
+        return self._query(f"SELECT count(*) FROM {_q(table)}{where}", params).fetchone()[0]
+
+    def head(self, table, n=5):
+        if table not in self._tables:
+            return pd.DataFrame()
+        return self._typed(self._query(f"SELECT * FROM {_q(table)} LIMIT {int(n)}").df(), table)
+
+    def has_rollup(self, cube):
+        spec = CUBE_SPECS[cube]
+        cols = self.columns(spec["table"])
+        return self.has(spec["table"]) and all(c in cols for c in spec["dims"] + spec["measures"])
+
+    def rollup(self, cube, by, flt=None):
+        """Same frame as AggregateCube.rollup, computed with one GROUP BY over the raw table."""
+        spec = CUBE_SPECS[cube]
+        if not self.has_rollup(cube):
+            return None
+        dims = spec["dims"]
+        dtypes = SCHEMAS.get(spec["table"], {}).get("dtypes", {})
+        sums = []
+        for m in spec["measures"]:
+            sql_type = "BIGINT" if dtypes.get(m, "").startswith("int") else "DOUBLE"
+            sums.append(f"CAST(COALESCE(SUM({_q(m)}), 0) AS {sql_type}) AS {_q(m)}")
+        keys = ", ".join(_q(c) for c in by)
+        where, params = self._where(flt, dims[0], dims[1:], [f"{_q(c)} IS NOT NULL" for c in by])
+        sql = (f"SELECT {keys}, {', '.join(sums + ['count(*) AS count'])} "
+               f"FROM {_q(spec['table'])}{where} GROUP BY {keys}")
+        # Measures keep their summed BIGINT/DOUBLE types; only the keys get the schema
+        return self._typed(self._query(sql, params).df(), spec["table"], by)
+
+    def describe_rollup(self, cube, flt):
+        dims = CUBE_SPECS[cube]["dims"]
+        return flt.describe(dims[0], dims[1:]) if flt is not None else None
+
+    def has_summary(self, name):
+        spec = SUMMARY_SPECS[name]
+        cols = self.columns(spec["table"])
+        return self.has(spec["table"]) and all(c in cols for c in [spec["column"]] + spec["keys"])
+
+    def summarize(self, name, by, flt=None):
+        """Same as PandasBackend.summarize, built from just the value and `by` columns of the matching rows."""
+        spec = SUMMARY_SPECS[name]
+        df, note = self.rows(spec["table"], flt, [spec["column"]] + list(by))
+        return summarize_frame(df, spec, by), note
+
+    def _select(self, table, flt, columns):
+        date_col, key_cols = _filter_columns(table)
+        cols = self.columns(table) if columns is None else [c for c in columns if c in self.columns(table)]
+        where, params = self._where(flt, date_col, key_cols)
+        note = flt.describe(date_col, key_cols) if flt is not None else None
+        return f"SELECT {', '.join(_q(c) for c in cols)} FROM {_q(table)}{where}", params, note
+
+    def rows(self, table, flt=None, columns=None):
+        if table not in self._tables:
+            return pd.DataFrame(), None
+        sql, params, note = self._select(table, flt, columns)
+        return self._typed(self._query(sql, params).df(), table), note
+
+    def iter_rows(self, table, flt=None, columns=None, offset=0, limit=None, chunk_rows=100000):
+        """Matching rows as a stream of frames, fetched from DuckDB in batches."""
+        sql, params, _ = self._select(table, flt, columns)
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        if offset:
+            sql += f" OFFSET {int(offset)}"
+        reader = self._query(sql, params).fetch_record_batch(chunk_rows)
+        empty = True
+        for batch in reader:
+            empty = False
+            yield self._typed(batch.to_pandas(), table)
+        if empty:
+            yield self._typed(self._query(sql + " LIMIT 0", params).df(), table)
+
+    def corr(self, table, cols, flt=None):
+        """Pearson correlation matrix computed in SQL (pairwise-complete, like pandas)."""
+        date_col, key_cols = _filter_columns(table)
+        where, params = self._where(flt, date_col, key_cols)
+        note = flt.describe(date_col, key_cols) if flt is not None else None
+        pairs = [(a, b) for i, a in enumerate(cols) for b in cols[i + 1:]]
+        exprs = ["count(*)"] + [f"corr({_q(a)}, {_q(b)})" for a, b in pairs]
+        values = self._query(f"SELECT {', '.join(exprs)} FROM {_q(table)}{where}", params).fetchone()
+        if not values[0]:
+            return None, note
+        out = pd.DataFrame(1.0, index=cols, columns=cols)
+        for (a, b), v in zip(pairs, values[1:]):
+            out.loc[a, b] = out.loc[b, a] = float("nan") if v is None else v
+        return out, note
+
+    def frames(self, tables):
+        """Materialize whole tables (model training); the one place RAM scales with rows."""
+        return {t: self.rows(t)[0] for t in tables}
+
+    def lookup(self, table, keys, columns):
+        key = SCHEMAS[table]["key"]
+        wanted = pd.Series(keys).dropna().astype(str).unique().tolist()
+        cols = ", ".join(_q(c) for c in [key] + [c for c in columns if c != key])
+        df = self._query(f"SELECT {cols} FROM {_q(table)} WHERE {_q(key)} IN (SELECT unnest(?::VARCHAR[]))",
+                         [wanted]).df()
+        return DimensionIndex(self._typed(df, table), key).take(keys, columns)
+
+    def sales_fact(self):
+        """Built on demand from materialized tables (not kept, so memory stays flat)."""
+        return build_sales_fact(self.frames([t for t in FACT_TABLES if t in self._tables]))
+
+    def fingerprint(self, tables, salt=""):
+        h = hashlib.sha1(salt.encode())
+        for name in tables:
+            h.update(name.encode())
+            if name in self._tables:
+                info = self._query(f"SELECT count(*), sum(hash(t)) FROM {_q(name)} t").fetchone()
+                h.update(json.dumps([self.columns(name), str(info)]).encode())
+        return h.hexdigest()[:16]
+
+    def append(self, table, df, skip_existing=False):
+        with self.lock:
+            # Only the incoming keys that already exist are needed for the duplicate check
+            key = SCHEMAS[table]["key"]
+            keys = df[key].dropna().astype(str).unique().tolist() if key in df.columns else []
+            existing = self._query(
+                f"SELECT {_q(key)} FROM {_q(table)} WHERE {_q(key)} IN (SELECT unnest(?::VARCHAR[]))",
+                [keys]).df()
+            batch, errors = prepare_batch(table, df, existing, skip_existing)
+            if batch is None or batch.empty:
+                return batch, errors
+            cols = [c for c in self.columns(table) if c in batch.columns]
+            cur = self.con.cursor()
+            cur.register("_batch", batch[cols])
+            cur.execute(f"INSERT INTO {_q(table)} BY NAME SELECT * FROM _batch")
+            cur.unregister("_batch")
+            self.versions[table] += 1
+        return batch, []
+
+    def memory(self):
+        """Tables live in DuckDB's own compressed storage; report its sizes instead."""
+        size = self._query("CALL pragma_database_size()").df()
+        tables = self._query(
+            "SELECT table_name, estimated_size AS rows, column_count FROM duckdb_tables() "
+            "WHERE NOT starts_with(table_name, '_')").df()
+        return {
+            "backend": self.name,
+            "database": size.to_dict("records"),
+            "tables": {r["table_name"]: {"rows": int(r["rows"]), "columns": int(r["column_count"])}
+                       for r in tables.to_dict("records")},
+        }
+
+    def close(self):
+        self.con.close()
+
+
+def create_backend(name, data_dir, files, duckdb_memory_limit=None, snapshot=None):
+    if snapshot is not None:
+        # Shared snapshots are pandas frames over mapped Arrow files
+        return PandasBackend(data_dir, files, snapshot=snapshot)
+    if name == "duckdb":
+        if duckdb is not None:
+            return DuckDBBackend(data_dir, files, memory_limit=duckdb_memory_limit)
+        print("Warning: PHARMACY_BACKEND=duckdb but duckdb isn't installed; using pandas")
+    elif name != "pandas":
+        print(f"Warning: unknown data backend '{name}'; using pandas")
+    return PandasBackend(data_dir, files)
@@ -0,0 +1,205 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+# Arrow is optional - without it we still get typed CSV parsing, just no cache
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+CACHE_DIRNAME = ".cache"
+
+# Table name -> CSV file in the data directory
+DATA_FILES = {
+    "customers": "Customers.csv",
+    "medicine": "Medicine.csv",
+    "pharmacy": "PharmacyShops.csv",
+    "prescriptions": "Prescriptions.csv",
+    "purchases": "Purchases.csv",
+    "sales_bills": "SalesBills.csv",
+    "stocks": "Stocks.csv",
+    "med_type": "TypesofMedicine.csv"
+}
+
+# Explicit per-table schemas. "key" is the row identifier, "dates" are parsed once here so endpoints get
+# datetime64 columns, "category" columns are dictionary-encoded, "id" columns are
+# entity IDs dictionary-encoded with one category set shared across tables (see
+# id_codes.py), and numeric columns are downcast. Floats holding non-integral values (final_price, discount,
+# rating) stay float64 so they aren't served back with float32 rounding noise.
+SCHEMAS = {
+    "customers": {
+        "key": "customer_id",
+        "dtypes": {"customer_id": "id", "full_name": "string", "email": "string",
+                   "phone": "float64", "city": "category", "age": "float32"},
+        "dates": [],
+    },
+    "medicine": {
+        "key": "medicine_id",
+        "dtypes": {"medicine_id": "id", "medicine_name": "string", "type_id": "id",
+                   "price": "float32", "brand": "category"},
+        "dates": [],
+    },
+    "pharmacy": {
+        "key": "shop_id",
+        "dtypes": {"shop_id": "id", "location": "category", "manager_name": "string",
+                   "rating": "float64"},
+        "dates": [],
+    },
+    "prescriptions": {
+        "key": "prescription_id",
+        "dtypes": {"prescription_id": "string", "customer_id": "id", "doctor_name": "string",
+                   "medicine_id": "id", "dosage": "category"},
+        "dates": ["date"],
+    },
+    "purchases": {
+        "key": "purchase_id",
+        "dtypes": {"purchase_id": "string", "medicine_id": "id", "shop_id": "id",
+                   "supplier_name": "category", "quantity": "int16", "cost_price": "int16"},
+        "dates": ["purchase_date"],
+    },
+    "sales_bills": {
+        "key": "sale_id",
+        "dtypes": {"sale_id": "string", "customer_id": "id", "medicine_id": "id",
+                   "shop_id": "id", "quantity": "int16", "discount": "float64",
+                   "final_price": "float64", "payment_mode": "category", "status": "category"},
+        "dates": ["sale_date"],
+    },
+    "stocks": {
+        "key": "stock_id",
+        "dtypes": {"stock_id": "string", "shop_id": "id", "medicine_id": "id",
+                   "available_units": "float32"},
+        "dates": ["last_updated"],
+    },
+    "med_type": {
+        "key": "type_id",
+        "dtypes": {"type_id": "id", "type_name": "category", "category": "category"},
+        "dates": [],
+    },
+}
+
+
+def _schema_hash(name):
+    """Changing a schema must invalidate the cached file built from the old one."""
+    raw = json.dumps(SCHEMAS.get(name, {}), sort_keys=True)
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+
+def read_typed_csv(path, name):
+    """
+    Parse a CSV with the table's explicit schema.
+    Trailing "Unnamed: N" columns (from dangling commas in the exports) are dropped.
+    """
+    df = pd.read_csv(path, usecols=lambda c: not c.startswith("Unnamed:"))
+    return apply_schema(df, name)
+
+
+def fits_int(values, dtype):
+    """
+    Mask of values that `dtype` (an integer dtype) holds exactly: whole numbers in
+    its range. Missing values count as fitting. astype() would wrap or truncate the rest.
+    """
+    info = np.iinfo(dtype)
+    numeric = pd.to_numeric(pd.Series(values), errors="coerce").astype(np.float64)
+    whole = (numeric % 1 == 0) & (numeric >= info.min) & (numeric <= info.max)
+    return whole | numeric.isna()
+
+
+def apply_schema(df, name):
+    """Cast a raw frame (CSV rows or ingested records) to the table's schema in place."""
+    schema = SCHEMAS.get(name, {"dtypes": {}, "dates": []})
+    for col in schema["dates"]:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+
+    for col, dtype in schema["dtypes"].items():
+        if col not in df.columns:
+            continue
+        try:
+            if dtype == "string":
+                # Plain object strings: keeps merges/joins behaving as before
+                df[col] = df[col].astype(object)
+            elif dtype == "id":
+                # Always string IDs, even when ingested JSON sends numbers
+                values = df[col].astype(object)
+                df[col] = values.where(values.isna(), values.astype(str)).astype("category")
+            elif dtype.startswith("int") and df[col].isna().any():
+                # Integers with holes can't be narrowed without a nullable type
+                df[col] = pd.to_numeric(df[col], downcast="float")
+            elif dtype.startswith("int") and not fits_int(df[col], dtype).all():
+                # Keep values the schema's width can't hold instead of wrapping them
+                wider = "int64" if fits_int(df[col], "int64").all() else "float64"
+                print(f"Warning: {name}.{col} has values outside {dtype}; keeping it as {wider}")
+                df[col] = pd.to_numeric(df[col]).astype(wider)
+            else:
+                df[col] = df[col].astype(dtype)
+        except (ValueError, TypeError) as e:
+            print(f"Warning: couldn't cast {name}.{col} to {dtype}: {e}")
+    return df
+
+
+def _source_stamp(path):
+    st = os.stat(path)
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+def load_table(data_dir, name, fname):
+    """
+    Load one table, going through the columnar cache when pyarrow is available.
+
+    The cache lives in <data_dir>/.cache as an uncompressed Arrow IPC (Feather v2)
+    file plus a small JSON manifest holding the source file's mtime/size and the
+    schema hash. If those still match, the Arrow file is memory-mapped instead of
+    re-parsing the CSV.
+    """
+    src = os.path.join(data_dir, fname)
+    if feather is None:
+        return read_typed_csv(src, name)
+
+    cache_dir = os.path.join(data_dir, CACHE_DIRNAME)
+    arrow_path = os.path.join(cache_dir, f"{name}.arrow")
+    meta_path = os.path.join(cache_dir, f"{name}.json")
+
+    stamp = _source_stamp(src)
+    stamp["schema"] = _schema_hash(name)
+
+    try:
+        with open(meta_path) as f:
+            cached = json.load(f)
+        if cached == stamp and os.path.exists(arrow_path):
+            return feather.read_feather(arrow_path, memory_map=True)
+    except (OSError, ValueError):
+        pass
+
+    df = read_typed_csv(src, name)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = arrow_path + ".tmp"
+        feather.write_feather(df, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, arrow_path)
+        with open(meta_path, "w") as f:
+            json.dump(stamp, f)
+    except Exception as e:
+        print(f"Warning: couldn't write cache for {fname}: {e}")
+    return df
+
+
+def concat_aligned(a, b):
+    """
+    Append `b` to `a`, widening categorical columns to the union of both category
+    sets first (a plain concat would silently fall back to object dtype).
+    """
+    if a.empty:
+        return b.reset_index(drop=True)
+    b = b.reindex(columns=a.columns)
+    a = a.copy(deep=False)
+    for col in a.columns:
+        if isinstance(a[col].dtype, pd.CategoricalDtype):
+            values = b[col].astype(object)
+            new = pd.Index(values.dropna().unique()).difference(a[col].cat.categories)
+            dtype = pd.CategoricalDtype(a[col].cat.categories.append(new)) if len(new) else a[col].dtype
+            a[col] = a[col].astype(dtype)
+            b[col] = values.astype(dtype)
+    return pd.concat([a, b], ignore_index=True)
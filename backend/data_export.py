@@ -0,0 +1,112 @@
+import io
+import json
+import base64
+import itertools
+import pandas as pd
+
+from id_codes import ID_COLUMNS
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+EXPORT_CHUNK_ROWS = 5000
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def encode_cursor(offset):
+    """Opaque pagination cursor - clients should pass it back verbatim."""
+    raw = json.dumps({"o": int(offset)}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded))["o"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def records_json(df):
+    """Records as a JSON string; pandas maps NaN to null and dates to ISO strings."""
+    return df.to_json(orient="records", date_format="iso")
+
+
+def page_body(dataset, df, offset, limit, total):
+    next_offset = offset + len(df)
+    envelope = {
+        "dataset": dataset,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "columns": list(df.columns),
+        "next_cursor": encode_cursor(next_offset) if next_offset < total else None,
+    }
+    # Splice the records in as-is rather than round-tripping them through json.loads
+    head = json.dumps(envelope)[:-1]
+    return f'{head}, "data": {records_json(df)}}}'
+
+
+def _frames(source):
+    """Exporters take a DataFrame or an iterable of DataFrames (streamed from a backend)."""
+    return iter([source]) if isinstance(source, pd.DataFrame) else iter(source)
+
+
+def _chunks(frames, chunk_rows):
+    for df in frames:
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+
+
+def iter_ndjson(source, chunk_rows=EXPORT_CHUNK_ROWS):
+    for chunk in _chunks(_frames(source), chunk_rows):
+        text = chunk.to_json(orient="records", lines=True, date_format="iso")
+        yield text if text.endswith("\n") else text + "\n"
+
+
+def iter_csv(source, chunk_rows=EXPORT_CHUNK_ROWS):
+    frames = _frames(source)
+    first = next(frames, pd.DataFrame())
+    header = True
+    for chunk in _chunks(itertools.chain([first], frames), chunk_rows):
+        yield chunk.to_csv(index=False, header=header)
+        header = False
+    if header:
+        yield ",".join(first.columns) + "\n"
+
+
+def _decode_ids(df):
+    # Encoded ID columns carry the dictionary of every entity, not just this slice's
+    ids = [c for c in ID_COLUMNS if c in df.columns and isinstance(df[c].dtype, pd.CategoricalDtype)]
+    return df.astype({c: object for c in ids}) if ids else df
+
+
+def iter_arrow(source, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Arrow IPC stream: schema message first, then one record batch per chunk."""
+    frames = map(_decode_ids, _frames(source))
+    first = next(frames, pd.DataFrame())
+    schema = pa.Schema.from_pandas(first, preserve_index=False)
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, schema)
+
+    def drain():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    for chunk in _chunks(itertools.chain([first], frames), chunk_rows):
+        writer.write_batch(pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False))
+        yield drain()
+    writer.close()
+    yield drain()
+
+
+EXPORTERS = {"ndjson": iter_ndjson, "csv": iter_csv, "arrow": iter_arrow}
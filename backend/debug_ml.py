@@ -37,11 +37,15 @@ print("\nInitializing PharmacyML...")
 ml = PharmacyML(data)
 
 print("\nMetrics:")
-print(ml.get_metrics())
+print(ml.get_regression_metrics())
+print(ml.get_classification_metrics())
 
-print("\nTesting Linear Prediction:")
+print("\nTesting Price Prediction:")
 try:
-    pred = ml.predict_linear(1, 0)
-    print("Prediction:", pred)
+    X, y = ml.prepare_regression_data()
+    sample = X.iloc[0].to_dict()
+    pred = ml.predict_price("Random Forest", sample)
+    print("Input:", sample)
+    print("Prediction:", pred, "Actual:", y.iloc[0])
 except Exception as e:
     print("Prediction Error:", e)
@@ -5,7 +5,8 @@ from app import load_data
 
 def debug():
     print("Loading data...")
-    data = load_data()
+    backend = load_data()
+    data = backend.frames(backend.tables())
     
     print("Initializing ML System...")
     ml = PharmacyML(data)
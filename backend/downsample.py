@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+# Per-trace array attributes that must be sliced together with x/y
+_POINT_ATTRS = ("customdata", "text", "hovertext", "ids")
+_MARKER_ATTRS = ("size", "color", "symbol", "opacity")
+
+
+def _as_float(values):
+    """Numeric view of an axis (datetimes become int64 nanoseconds)."""
+    arr = np.asarray(values)
+    if arr.dtype.kind in "iufb":
+        return arr.astype(np.float64)
+    return pd.to_datetime(arr).asi8.astype(np.float64)
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: keeps the first and last points and, per bucket,
+    the point forming the largest triangle with the previously kept point and the
+    next bucket's centroid. Preserves peaks and troughs of a line at n_out points.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = _as_float(x)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        nxt_start, nxt_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        cx = x[nxt_start:nxt_end].mean()
+        cy = y[nxt_start:nxt_end].mean()
+        area = np.abs((x[prev] - cx) * (y[start:end] - y[prev])
+                      - (x[prev] - x[start:end]) * (cy - y[prev]))
+        prev = start + int(np.argmax(area))
+        out[i + 1] = prev
+    return out
+
+
+def grid_sample_indices(x, y, n_out):
+    """
+    Stratified 2D sample for scatters: bin points on a grid of roughly n_out cells
+    and keep one point per occupied cell, so sparse regions and outliers survive
+    while dense clusters are thinned. Tops up with evenly spaced points if the
+    grid leaves budget unused.
+    """
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+
+    xf = _as_float(x)
+    yf = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(np.isfinite(xf) & np.isfinite(yf))
+    side = max(int(np.sqrt(n_out)), 1)
+
+    def cell(v):
+        lo, hi = v.min(), v.max()
+        scale = (hi - lo) or 1.0
+        return np.minimum(((v - lo) / scale * side).astype(np.int64), side - 1)
+
+    cells = cell(xf[valid]) * side + cell(yf[valid])
+    _, first = np.unique(cells, return_index=True)
+    keep = valid[first]
+
+    if len(keep) < n_out:
+        rest = np.setdiff1d(np.arange(n), keep, assume_unique=True)
+        extra = rest[np.linspace(0, len(rest) - 1, min(n_out - len(keep), len(rest))).astype(np.int64)]
+        keep = np.concatenate([keep, extra])
+    elif len(keep) > n_out:
+        keep = keep[np.linspace(0, len(keep) - 1, n_out).astype(np.int64)]
+    return np.sort(keep)
+
+
+def _slice(value, idx, n):
+    if value is None or isinstance(value, (str, bytes)):
+        return value
+    arr = np.asarray(value)
+    if arr.ndim == 0 or arr.shape[0] != n:
+        return value
+    return arr[idx]
+
+
+def downsample_figure(fig, max_points):
+    """
+    Bound the number of points a figure ships. The budget is split across traces in
+    proportion to their size; line traces use LTTB, marker traces use grid sampling.
+    Returns (original_points, kept_points).
+    """
+    sizes = [len(t.x) if getattr(t, "x", None) is not None and getattr(t, "y", None) is not None else 0
+             for t in fig.data]
+    total = sum(sizes)
+    if not max_points or total <= max_points:
+        return total, total
+
+    kept = 0
+    for trace, n in zip(fig.data, sizes):
+        budget = max(int(max_points * n / total), 3)
+        if n <= budget:
+            kept += n
+            continue
+
+        if "lines" in (getattr(trace, "mode", None) or ""):
+            idx = lttb_indices(trace.x, trace.y, budget)
+        else:
+            idx = grid_sample_indices(trace.x, trace.y, budget)
+
+        updates = {"x": np.asarray(trace.x)[idx], "y": np.asarray(trace.y)[idx]}
+        for attr in _POINT_ATTRS:
+            if getattr(trace, attr, None) is not None:
+                updates[attr] = _slice(getattr(trace, attr), idx, n)
+        marker = getattr(trace, "marker", None)
+        if marker is not None:
+            updates["marker"] = {attr: _slice(getattr(marker, attr), idx, n)
+                                 for attr in _MARKER_ATTRS if getattr(marker, attr, None) is not None}
+        trace.update(updates)
+        kept += len(idx)
+    return total, kept
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+from data_cache import concat_aligned
+
+# Dimension attributes attached to every SalesBills row: (dimension table, key, columns).
+# A later entry may key on a column an earlier one attached (med_type via medicine.type_id).
+FACT_DIMENSIONS = [
+    ("medicine", "medicine_id", ["medicine_name", "type_id", "price", "brand"]),
+    ("med_type", "type_id", ["type_name", "category"]),
+    ("customers", "customer_id", ["age", "city"]),
+    ("pharmacy", "shop_id", ["location"]),
+]
+
+# Tables the sales fact table is built from
+FACT_TABLES = ("sales_bills",) + tuple(dict.fromkeys(t for t, _, _ in FACT_DIMENSIONS))
+
+
+def _codes(values, dtype):
+    if values.dtype == dtype:
+        return values.cat.codes.to_numpy()
+    return pd.Categorical(values, dtype=dtype).codes
+
+
+def _take(values, rows):
+    """`values` at positions `rows`; -1 gives a missing value (NaN/None/NaT)."""
+    allow_fill = bool((rows < 0).any())
+    if isinstance(values.dtype, pd.api.extensions.ExtensionDtype):
+        return values.array.take(rows, allow_fill=allow_fill)
+    return pd.api.extensions.take(values.to_numpy(), rows, allow_fill=allow_fill)
+
+
+class DimensionIndex:
+    """
+    Row position of each entity in a dimension table, as a dense array indexed by
+    the entity's ID code. Looking up attributes for N keys is then one array gather
+    per column instead of a hash merge. Keys are the table's primary key (unique).
+    """
+
+    def __init__(self, df, key):
+        self.df = df
+        self.key = key
+        values = df[key]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            self.dtype = values.dtype
+        else:
+            self.dtype = pd.CategoricalDtype(pd.Index(values.dropna().unique()))
+        codes = _codes(values, self.dtype)
+        self.pos = np.full(len(self.dtype.categories), -1, dtype=np.int64)
+        valid = codes >= 0
+        self.pos[codes[valid]] = np.flatnonzero(valid)
+
+    def positions(self, keys):
+        """Row of each key in the dimension table, -1 where it has none."""
+        codes = _codes(keys, self.dtype)
+        return np.where(codes >= 0, self.pos[codes], -1)
+
+    def take(self, keys, columns):
+        rows = self.positions(keys)
+        return pd.DataFrame({c: _take(self.df[c], rows) for c in columns if c in self.df.columns},
+                            index=keys.index)
+
+
+def build_sales_fact(data, dimensions=None):
+    """
+    SalesBills with the FACT_DIMENSIONS attributes attached by positional lookup.
+
+    The sales columns are shared with `data["sales_bills"]`, not copied. Callers
+    treat the result as read-only. `dimensions` may pass prebuilt DimensionIndexes
+    by table name.
+    """
+    sales = data.get("sales_bills", pd.DataFrame())
+    if sales.empty:
+        return None
+    dimensions = dimensions or {}
+    columns = {c: sales[c] for c in sales.columns}
+    for table, key, attrs in FACT_DIMENSIONS:
+        dim = data.get(table, pd.DataFrame())
+        if dim.empty or key not in dim.columns or key not in columns:
+            continue
+        index = dimensions.get(table) or DimensionIndex(dim, key)
+        rows = index.positions(columns[key])
+        for col in attrs:
+            if col in dim.columns and col not in columns:
+                columns[col] = pd.Series(_take(dim[col], rows), index=sales.index, name=col)
+    return pd.DataFrame(columns, copy=False)
+
+
+def append_sales_fact(fact, rows, data, dimensions=None):
+    """Extend a fact table with newly ingested SalesBills rows."""
+    delta = build_sales_fact(dict(data, sales_bills=rows), dimensions)
+    if fact is None or delta is None:
+        return delta if fact is None else fact
+    return concat_aligned(fact, delta)
@@ -0,0 +1,149 @@
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+# Statuses that count as demand (cancelled sales never left the shelf)
+DEMAND_STATUSES = ("Completed", "Pending")
+PAIR = ["shop_id", "medicine_id"]
+
+
+def demand_tensor(daily, stocks, start, days):
+    """
+    Daily demand of every shop x medicine series as one (series, days) matrix.
+    Series are the pairs with a stock record or a sale in the window; pairs that
+    neither stock nor sell a medicine would only be rows of zeros. `daily` has
+    shop_id, medicine_id, sale_date and quantity (already summed per day is fine).
+    """
+    keys = pd.concat([daily[PAIR], stocks[PAIR]], ignore_index=True).astype(str)
+    pairs = pd.MultiIndex.from_frame(keys).unique()
+    rows = pairs.get_indexer(pd.MultiIndex.from_frame(daily[PAIR].astype(str)))
+    day = ((daily["sale_date"] - start) // pd.Timedelta(days=1)).to_numpy(dtype=np.int64)
+    keep = (day >= 0) & (day < days)
+    flat = np.bincount(rows[keep] * days + day[keep],
+                       weights=daily["quantity"].to_numpy(dtype=np.float64)[keep],
+                       minlength=len(pairs) * days)
+    return pairs, flat.reshape(len(pairs), days)
+
+
+def weekday_factors(Y, weekdays, shrink=1.0):
+    """
+    Multiplicative day-of-week factors per series, shrunk towards 1 so a series
+    with a handful of sales doesn't get a factor of 7 on one weekday.
+    """
+    onehot = weekdays[:, None] == np.arange(7)
+    totals = Y @ onehot                          # (series, 7)
+    per_day = totals / np.maximum(onehot.sum(axis=0), 1)
+    mean = Y.mean(axis=1, keepdims=True)
+    raw = np.divide(per_day, mean, out=np.ones_like(per_day), where=mean > 0)
+    return (raw + shrink) / (1 + shrink)
+
+
+def smoothed_level(Y, alpha):
+    """
+    Simple exponential smoothing level after the last day, for every row at once:
+    the closed form sum(alpha * (1 - alpha)^k * y[T-1-k]) plus the initial level
+    (the row mean) weighted by (1 - alpha)^T, instead of a loop over days.
+    """
+    T = Y.shape[1]
+    weights = alpha * (1 - alpha) ** np.arange(T - 1, -1, -1)
+    return Y @ weights + (1 - alpha) ** T * Y.mean(axis=1)
+
+
+def moving_average(Y, window):
+    return Y[:, -window:].mean(axis=1)
+
+
+def _fit(Y, weekdays, alpha, window):
+    """Deseasonalized level per model: {name: (series,) level}, plus the weekday factors."""
+    factors = weekday_factors(Y, weekdays)
+    deseason = Y / factors[:, weekdays]
+    return {"ses": smoothed_level(deseason, alpha), "moving_average": moving_average(deseason, window)}, factors
+
+
+def forecast_series(Y, start_weekday, horizon, alpha=0.1, window=28, holdout=28):
+    """
+    Daily forecasts for the next `horizon` days of every row of Y (series, days).
+    Both models (exponential smoothing and a moving average, each on weekday-
+    adjusted demand) are scored on the last `holdout` days, and each series keeps
+    the one with the lower error, then both are refitted on the full history.
+    Returns (forecast (series, horizon), chosen model name per series, holdout MAE per series).
+    """
+    T = Y.shape[1]
+    weekdays = (start_weekday + np.arange(T + horizon)) % 7
+    names = ["ses", "moving_average"]
+
+    holdout = min(holdout, T // 2)
+    if holdout:
+        levels, factors = _fit(Y[:, :-holdout], weekdays[:T - holdout], alpha, window)
+        future = factors[:, weekdays[T - holdout:T]]
+        errors = np.stack([np.abs(levels[n][:, None] * future - Y[:, -holdout:]).mean(axis=1)
+                           for n in names])
+    else:
+        errors = np.zeros((len(names), len(Y)))
+    best = errors.argmin(axis=0)
+
+    levels, factors = _fit(Y, weekdays[:T], alpha, window)
+    level = np.choose(best, [levels[n] for n in names])
+    forecast = level[:, None] * factors[:, weekdays[T:]]
+    return forecast, np.asarray(names)[best], errors[best, np.arange(len(Y))]
+
+
+def current_stock(stocks):
+    """Latest available_units per shop x medicine (by last_updated)."""
+    latest = stocks.sort_values("last_updated", kind="stable").drop_duplicates(PAIR, keep="last")
+    return pd.Series(latest["available_units"].to_numpy(dtype=np.float64),
+                     index=pd.MultiIndex.from_frame(latest[PAIR].astype(str)))
+
+
+def reorder_plan(daily, stocks, origin, history_days=364, horizon=14, lead_time=7,
+                 service_level=0.95, alpha=0.1, window=28):
+    """
+    Forecast demand of every shop x medicine and compare it with current stock.
+    `origin` is the last day of history (the latest sale). Per series:
+
+    - forecast: mean daily demand over the next `horizon` days
+    - days_of_cover: current stock / forecast
+    - reorder_point: forecast * lead_time + safety stock, where safety stock is
+      z(service_level) * std(daily demand) * sqrt(lead_time)
+    - order_qty: enough to get back to reorder point + `horizon` days of demand
+
+    Returns one row per series, most urgent first, and the model summary.
+    """
+    start = origin - pd.Timedelta(days=history_days - 1)
+    pairs, Y = demand_tensor(daily, stocks, start, history_days)
+    forecast, model, holdout_mae = forecast_series(Y, start.dayofweek, horizon, alpha, window)
+    demand = forecast.mean(axis=1)
+
+    stock = current_stock(stocks).reindex(pairs).to_numpy()
+    z = NormalDist().inv_cdf(service_level)
+    safety = z * Y.std(axis=1) * np.sqrt(lead_time)
+    reorder_point = demand * lead_time + safety
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cover = np.where(demand > 0, stock / demand, np.inf)
+    order_qty = np.ceil(np.maximum(reorder_point + demand * horizon - stock, 0))
+
+    status = np.full(len(pairs), "ok", dtype=object)
+    needs = (demand > 0) & (stock <= reorder_point)
+    status[needs] = "reorder"
+    status[needs & (stock <= 0)] = "stockout"
+    status[np.isnan(stock)] = "untracked"
+    order_qty = np.where(np.isin(status, ["reorder", "stockout"]), order_qty, 0)
+
+    plan = pd.DataFrame({
+        "shop_id": pairs.get_level_values(0), "medicine_id": pairs.get_level_values(1),
+        "stock": stock, "forecast_daily": demand.round(4),
+        "forecast_total": forecast.sum(axis=1).round(2),
+        "days_of_cover": np.round(cover, 1), "reorder_point": np.ceil(reorder_point),
+        "order_qty": order_qty, "status": status, "model": model,
+        "holdout_mae": holdout_mae.round(4), "sales_days": (Y > 0).sum(axis=1),
+    })
+    plan = plan.sort_values(["days_of_cover", "forecast_daily"], ascending=[True, False], kind="stable")
+    summary = {
+        "series": len(pairs), "history_days": history_days,
+        "history_start": start.strftime("%Y-%m-%d"), "origin": origin.strftime("%Y-%m-%d"),
+        "models": pd.Series(model).value_counts().to_dict(),
+        "holdout_mae": round(float(holdout_mae.mean()), 4) if len(pairs) else None,
+        "status": plan["status"].value_counts().to_dict(),
+    }
+    return plan.reset_index(drop=True), summary
@@ -0,0 +1,149 @@
+import sys
+import numpy as np
+import pandas as pd
+
+from data_cache import SCHEMAS
+
+# Entity ID columns (schema dtype "id"). Each gets one category set shared by every
+# table holding it, so customer_id has the same integer code in customers,
+# sales_bills and prescriptions.
+ID_COLUMNS = sorted({col for schema in SCHEMAS.values()
+                     for col, dtype in schema["dtypes"].items() if dtype == "id"})
+
+
+def _ids(values):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.categories
+    return pd.Index(values.dropna().astype(str).unique())
+
+
+def _shares(values, dtype):
+    # Equal categories aren't enough: tables read from separate Arrow files each
+    # carry their own copy of the dictionary. Point them all at the one object.
+    return values.dtype == dtype and values.cat.categories is dtype.categories
+
+
+class IdDictionary:
+    """
+    Dictionary encoding for entity IDs, shared across tables.
+
+    Every table's copy of an ID column is a Categorical over the same categories, so
+    the codes are dense integer IDs meaning the same entity everywhere. Merges and
+    groupbys on them compare integers; strings only come back when a frame is
+    serialized. New IDs are appended, so existing codes never change.
+    """
+
+    def __init__(self, data=None):
+        self.dtypes = {}
+        if data is not None:
+            self.build(data)
+
+    def build(self, data):
+        """Create the dictionaries from every table in `data` and re-encode them in place."""
+        for col in ID_COLUMNS:
+            parts = [_ids(df[col]) for df in data.values() if col in df.columns]
+            if parts:
+                self.dtypes[col] = pd.CategoricalDtype(parts[0].append(parts[1:]).unique().sort_values())
+        for name, df in data.items():
+            data[name] = self.encode(df)
+
+    def extend(self, df):
+        """Add IDs in `df` that aren't known yet. Returns the columns whose dictionary grew."""
+        grown = []
+        for col in ID_COLUMNS:
+            if col not in df.columns:
+                continue
+            ids = _ids(df[col])
+            dtype = self.dtypes.get(col)
+            if dtype is None:
+                self.dtypes[col] = pd.CategoricalDtype(ids.unique().sort_values())
+                grown.append(col)
+                continue
+            new = ids.difference(dtype.categories)
+            if len(new):
+                self.dtypes[col] = pd.CategoricalDtype(dtype.categories.append(new))
+                grown.append(col)
+        return grown
+
+    def encode(self, df):
+        """`df` with its ID columns on the shared dtypes (unseen IDs are added first)."""
+        cols = [c for c in ID_COLUMNS if c in df.columns]
+        self.extend(df)
+        # assign() copies the whole frame, so skip it when the column is already shared
+        cols = [c for c in cols if not _shares(df[c], self.dtypes[c])]
+        if not cols:
+            return df
+        return df.assign(**{c: self._recode(df[c], self.dtypes[c]) for c in cols})
+
+    def encode_column(self, values):
+        """One Series on its shared dtype, if it's a known ID column."""
+        dtype = self.dtypes.get(values.name)
+        return values if dtype is None else self._recode(values, dtype)
+
+    def recode(self, data, columns):
+        """Move tables' `columns` onto the current (grown) dtypes, e.g. after an ingest."""
+        for name, df in data.items():
+            cols = [c for c in columns if c in df.columns and not _shares(df[c], self.dtypes[c])]
+            if cols:
+                data[name] = df.assign(**{c: self._recode(df[c], self.dtypes[c]) for c in cols})
+
+    @staticmethod
+    def _recode(values, dtype):
+        if _shares(values, dtype):
+            return values
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            cats = values.cat.categories
+            # Categories only ever get appended, so the old codes are still valid
+            if len(cats) <= len(dtype.categories) and cats.equals(dtype.categories[:len(cats)]):
+                codes = values.cat.codes.to_numpy()
+                return pd.Series(pd.Categorical.from_codes(codes, dtype=dtype, validate=False),
+                                 index=values.index, name=values.name)
+        return values.astype(dtype)
+
+
+def _unencoded_bytes(values):
+    """What a dictionary-encoded column would take as one Python string object per row."""
+    codes = values.cat.codes.to_numpy()
+    sizes = np.fromiter((sys.getsizeof(v) for v in values.cat.categories), dtype=np.int64,
+                        count=len(values.cat.categories))
+    counts = np.bincount(codes[codes >= 0], minlength=len(sizes))
+    nulls = int((codes < 0).sum())
+    return 8 * len(codes) + int(counts @ sizes) + nulls * sys.getsizeof(float("nan"))
+
+
+def memory_report(data, ids):
+    """
+    Bytes per table and column as stored, next to what the entity ID columns would
+    take as object strings. Each shared ID dictionary is counted once, under
+    "dictionaries", instead of in every column that uses it.
+    """
+    tables = {}
+    total = total_unencoded = 0
+    for name, df in data.items():
+        columns = {}
+        for col in df.columns:
+            values = df[col]
+            if col in ids.dtypes and values.dtype == ids.dtypes[col]:
+                dtype = f"{values.cat.codes.dtype} codes"
+                used = values.cat.codes.nbytes
+                unencoded = _unencoded_bytes(values)
+            else:
+                dtype = str(values.dtype)
+                used = unencoded = int(values.memory_usage(index=False, deep=True))
+            columns[col] = {"dtype": dtype, "bytes": int(used), "bytes_unencoded": int(unencoded)}
+        size = sum(c["bytes"] for c in columns.values())
+        size_unencoded = sum(c["bytes_unencoded"] for c in columns.values())
+        tables[name] = {"rows": len(df), "bytes": size, "bytes_unencoded": size_unencoded, "columns": columns}
+        total += size
+        total_unencoded += size_unencoded
+
+    dictionaries = {col: {"ids": len(dtype.categories),
+                          "bytes": int(dtype.categories.memory_usage(deep=True))}
+                    for col, dtype in ids.dtypes.items()}
+    total += sum(d["bytes"] for d in dictionaries.values())
+    return {
+        "tables": tables,
+        "dictionaries": dictionaries,
+        "total": {"bytes": total, "bytes_unencoded": total_unencoded,
+                  "saved_pct": round(100.0 * (1 - total / total_unencoded), 1) if total_unencoded else 0.0},
+    }
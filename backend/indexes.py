@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+_EMPTY = np.empty(0, dtype=np.int64)
+
+# Columns each table can be filtered on: a date column for range slicing and
+# key columns with per-value row-position maps.
+FILTER_COLUMNS = {
+    "sales_bills": {"date": "sale_date", "keys": ["shop_id", "medicine_id", "customer_id", "payment_mode"]},
+    "purchases": {"date": "purchase_date", "keys": ["shop_id", "medicine_id"]},
+    "prescriptions": {"date": "date", "keys": ["medicine_id", "customer_id"]},
+    "stocks": {"date": "last_updated", "keys": ["shop_id", "medicine_id"]},
+    "pharmacy": {"date": None, "keys": ["shop_id"]},
+    "medicine": {"date": None, "keys": ["medicine_id"]},
+    "customers": {"date": None, "keys": ["customer_id"]},
+}
+
+FILTER_KEYS = ("shop_id", "medicine_id", "customer_id", "payment_mode")
+
+
+def _intersect(small, big):
+    """Sorted intersection in O(len(small) * log(len(big)))."""
+    if len(small) == 0 or len(big) == 0:
+        return _EMPTY
+    pos = np.searchsorted(big, small)
+    pos[pos == len(big)] = len(big) - 1
+    return small[big[pos] == small]
+
+
+class TableIndex:
+    """
+    Row-position indexes over one frame: dates kept sorted (with the matching row
+    positions) for binary-search range slicing, and a value -> positions map per
+    key column. A lookup costs time proportional to the rows it returns.
+    """
+
+    def __init__(self, df, date_col=None, key_cols=()):
+        self.date_col = date_col if date_col in df.columns else None
+        self.key_cols = [c for c in key_cols if c in df.columns]
+        self.n = 0
+        self._dates = np.empty(0, dtype=np.int64)
+        self._order = _EMPTY
+        self._keys = {c: {} for c in self.key_cols}
+        self.append(df)
+
+    def append(self, rows):
+        """Index rows appended at the end of the frame (positions continue from n)."""
+        positions = np.arange(self.n, self.n + len(rows), dtype=np.int64)
+        if self.date_col:
+            stamps = pd.to_datetime(rows[self.date_col]).to_numpy(dtype="datetime64[ns]")
+            valid = ~np.isnat(stamps)
+            values, pos = stamps[valid].view(np.int64), positions[valid]
+            order = np.argsort(values, kind="stable")
+            values, pos = values[order], pos[order]
+            at = np.searchsorted(self._dates, values, side="right")
+            self._dates = np.insert(self._dates, at, values)
+            self._order = np.insert(self._order, at, pos)
+        for col in self.key_cols:
+            groups = rows.groupby(col, observed=True, sort=False).indices
+            index = self._keys[col]
+            for value, idx in groups.items():
+                found = positions[idx]
+                index[value] = np.concatenate([index[value], found]) if value in index else found
+        self.n += len(rows)
+
+    def date_range(self, start=None, end=None):
+        """Sorted positions with start <= date < end (either bound may be None)."""
+        lo = 0 if start is None else np.searchsorted(self._dates, pd.Timestamp(start).value, "left")
+        hi = len(self._dates) if end is None else np.searchsorted(self._dates, pd.Timestamp(end).value, "left")
+        return np.sort(self._order[lo:hi])
+
+    def lookup(self, col, values):
+        arrays = [self._keys[col].get(v, _EMPTY) for v in values]
+        if len(arrays) == 1:
+            return arrays[0]
+        return np.sort(np.concatenate(arrays))
+
+    def select(self, row_filter):
+        """Positions matching the filter's applicable parts, or None for 'all rows'."""
+        candidates = []
+        if self.date_col and (row_filter.start is not None or row_filter.end is not None):
+            candidates.append(self.date_range(row_filter.start, row_filter.end_exclusive))
+        for col, values in row_filter.keys.items():
+            if col in self._keys:
+                candidates.append(self.lookup(col, values))
+        if not candidates:
+            return None
+        candidates.sort(key=len)
+        out = candidates[0]
+        for other in candidates[1:]:
+            out = _intersect(out, other)
+        return out
+
+
+class RowFilter:
+    """
+    The common start/end/shop/medicine/payment-mode query filters.
+    Key filters accept comma-separated lists; `end` is inclusive of that day.
+    """
+
+    def __init__(self, start=None, end=None, **keys):
+        self.start = pd.Timestamp(start) if start is not None else None
+        self.end = pd.Timestamp(end) if end is not None else None
+        self.keys = {}
+        for col, raw in keys.items():
+            if raw:
+                values = [v.strip() for v in str(raw).split(",") if v.strip()]
+                if values:
+                    self.keys[col] = values
+
+    @property
+    def end_exclusive(self):
+        return None if self.end is None else self.end + pd.Timedelta(days=1)
+
+    @property
+    def active(self):
+        return self.start is not None or self.end is not None or bool(self.keys)
+
+    def describe(self, date_col, key_cols):
+        """Which of the requested filters a table/cuboid could honour (None when inactive)."""
+        if not self.active:
+            return None
+        applied, ignored = [], []
+        for name, present in (("start", self.start is not None), ("end", self.end is not None)):
+            if present:
+                (applied if date_col else ignored).append(name)
+        for col in self.keys:
+            (applied if col in key_cols else ignored).append(col)
+        return {"applied": applied, "ignored": ignored}
+
+    def apply(self, df, index):
+        """Return (matching rows, description) using a prebuilt TableIndex."""
+        note = self.describe(index.date_col, index.key_cols)
+        if note is None:
+            return df, None
+        positions = index.select(self)
+        return (df if positions is None else df.iloc[positions]), note
@@ -0,0 +1,151 @@
+import io
+import os
+import threading
+import pandas as pd
+
+from data_cache import SCHEMAS, apply_schema, fits_int
+
+
+def prepare_batch(name, df, existing, skip_existing=False):
+    """
+    Validate raw records for `name` against its schema and the rows already loaded.
+    Returns (typed frame, errors); the frame is None when anything is wrong.
+    With `skip_existing`, records whose key is already loaded are dropped instead
+    of rejected as duplicates.
+    """
+    schema = SCHEMAS[name]
+    df = df[[c for c in df.columns if not str(c).startswith("Unnamed:")]].copy()
+    errors = []
+
+    required = list(schema["dtypes"]) + schema["dates"]
+    missing = [c for c in required if c not in df.columns]
+    if missing:
+        return None, [f"missing columns: {missing}"]
+    key = schema["key"]
+    if skip_existing and key in existing.columns:
+        loaded = df[key].notna() & df[key].astype(str).isin(existing[key].astype(str))
+        df = df[~loaded].reset_index(drop=True)
+
+    def bad_rows(mask):
+        return mask.to_numpy().nonzero()[0][:10].tolist()
+
+    for col in schema["dates"]:
+        parsed = pd.to_datetime(df[col], errors="coerce")
+        bad = parsed.isna() & df[col].notna()
+        if bad.any():
+            errors.append(f"unparseable dates in '{col}' at rows {bad_rows(bad)}")
+    for col, dtype in schema["dtypes"].items():
+        if dtype.startswith(("int", "float")):
+            parsed = pd.to_numeric(df[col], errors="coerce")
+            bad = parsed.isna() & df[col].notna()
+            if bad.any():
+                errors.append(f"non-numeric values in '{col}' at rows {bad_rows(bad)}")
+            if dtype.startswith("int"):
+                # The loaded column's width (wider than the schema's if its data needed it)
+                width = dtype
+                if col in existing.columns:
+                    loaded = existing[col].dtype
+                    width = str(loaded) if pd.api.types.is_integer_dtype(loaded) else "int64"
+                bad = ~fits_int(parsed, width)
+                if bad.any():
+                    errors.append(f"values in '{col}' that aren't whole numbers within {width} at rows {bad_rows(bad)}")
+            df[col] = parsed
+
+    keys = df[key].astype(object)
+    if keys.isna().any():
+        errors.append(f"missing '{key}' at rows {bad_rows(keys.isna())}")
+    dupes = keys.duplicated() & keys.notna()
+    if key in existing.columns:
+        dupes |= keys.isin(existing[key])
+    if dupes.any():
+        errors.append(f"duplicate '{key}' values: {keys[dupes].head(10).tolist()}")
+
+    if errors:
+        return None, errors
+    df = apply_schema(df, name)
+    if not existing.empty:
+        df = df[[c for c in existing.columns if c in df.columns]]
+    return df.reset_index(drop=True), []
+
+
+class CsvTailer:
+    """
+    Polls the source CSVs and feeds rows appended since the last check to `on_rows`.
+    Only complete lines are consumed; a file that shrinks was rewritten rather than
+    appended to, so tailing stops for it until the next full reload.
+    """
+
+    def __init__(self, data_dir, files, on_rows, interval=5.0):
+        self.data_dir = data_dir
+        self.files = files
+        self.on_rows = on_rows
+        self.interval = interval
+        self.offsets = {}
+        self.headers = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _path(self, name):
+        return os.path.join(self.data_dir, self.files[name])
+
+    def mark(self):
+        """
+        Start tailing from the current end of every file. Call it before loading, so
+        rows appended during the load aren't missed; `on_rows` should skip the ones
+        the load already picked up.
+        """
+        for name in self.files:
+            path = self._path(name)
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8-sig") as f:
+                header = f.readline().rstrip("\r\n").split(",")
+            self.headers[name] = [c or f"Unnamed: {i}" for i, c in enumerate(header)]
+            self.offsets[name] = os.path.getsize(path)
+
+    def poll(self):
+        for name, offset in list(self.offsets.items()):
+            path = self._path(name)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            if size < offset:
+                print(f"Warning: {self.files[name]} shrank; tailing stopped for it")
+                del self.offsets[name]
+                continue
+            if size == offset:
+                continue
+
+            with open(path, "rb") as f:
+                f.seek(offset)
+                chunk = f.read(size - offset)
+            end = chunk.rfind(b"\n")
+            if end < 0:
+                continue
+            self.offsets[name] = offset + end + 1
+            lines = chunk[:end + 1]
+            if not lines.strip():
+                continue
+            try:
+                rows = pd.read_csv(io.BytesIO(lines), header=None, names=self.headers[name])
+                batch, errors = self.on_rows(name, rows)
+            except Exception as e:
+                print(f"Warning: couldn't ingest rows tailed from {self.files[name]}: {e}")
+                continue
+            if batch is None:
+                print(f"Warning: rejected {len(rows)} rows tailed from {self.files[name]}: {'; '.join(errors)}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Warning: tailing the CSVs failed: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="csv-tailer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,349 @@
+import bisect
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from starlette.routing import Match
+
+from profiler import SamplingProfiler
+
+# Query parameter that turns a single request into a profiling report
+PROFILE_PARAM = "profile"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+        return child
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._children.items())
+        for key, child in sorted(items):
+            yield from child.samples(self.name, self.labelnames, key)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def samples(self, name, labelnames, key):
+        yield f"{name}{_format_labels(labelnames, key)} {_format_value(self.value)}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def samples(self, name, labelnames, key):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            labels = _format_labels(labelnames, key, [("le", _format_value(float(bound)))])
+            yield f"{name}_bucket{labels} {cumulative}"
+        yield f"{name}_sum{_format_labels(labelnames, key)} {_format_value(total)}"
+        yield f"{name}_count{_format_labels(labelnames, key)} {cumulative}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+
+class MetricsRegistry:
+    """In-process metric store rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        return "\n".join(m.render() for m in self._metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "pharmacy_http_request_duration_seconds", "Request latency by route.",
+    ["method", "route", "status"])
+RESPONSE_BYTES = REGISTRY.histogram(
+    "pharmacy_http_response_size_bytes", "Response body size as sent (after compression).",
+    ["method", "route"], buckets=SIZE_BUCKETS)
+IN_FLIGHT = REGISTRY.gauge(
+    "pharmacy_http_requests_in_flight", "Requests currently being handled.", ["route"])
+ERRORS = REGISTRY.counter(
+    "pharmacy_http_errors_total", "Responses with status >= 400 and unhandled exceptions.",
+    ["method", "route", "status"])
+STAGE_SECONDS = REGISTRY.histogram(
+    "pharmacy_stage_duration_seconds",
+    "Time spent in handler stages (slice, aggregate, figure, downsample, serialize).", ["stage"])
+ML_STAGE_SECONDS = REGISTRY.histogram(
+    "pharmacy_ml_stage_duration_seconds",
+    "Time spent in PharmacyML stages (fact, preprocess, fit, cv_fit, predict, confusion_matrix, plot).", ["stage", "model"])
+RENDER_PENDING = REGISTRY.gauge(
+    "pharmacy_render_pending", "Chart computations queued or running in the render pool.")
+RENDER_COALESCED = REGISTRY.counter(
+    "pharmacy_render_coalesced_total", "Requests that shared an identical in-progress computation.")
+RENDER_REJECTED = REGISTRY.counter(
+    "pharmacy_render_rejected_total", "Requests turned away with 503 because the render pool was full.")
+RENDER_TIMEOUTS = REGISTRY.counter(
+    "pharmacy_render_timeouts_total", "Requests that gave up waiting for a computation (504).")
+
+# Per-request {stage: seconds}, set by the middleware. Sync handlers run in the
+# threadpool with a copy of the context, so they add to the same dict.
+_REQUEST_STAGES = contextvars.ContextVar("request_stages", default=None)
+# Whether the current request is being profiled (asked for and allowed)
+_PROFILING = contextvars.ContextVar("profiling", default=False)
+
+
+def _record(name, elapsed):
+    stages = _REQUEST_STAGES.get()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + elapsed
+
+
+@contextmanager
+def stage(name):
+    """Time a block of handler work under `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage=name).observe(elapsed)
+        _record(name, elapsed)
+
+
+def record_stage(name, elapsed):
+    """Record a handler stage timed elsewhere (e.g. in a render process)."""
+    STAGE_SECONDS.labels(stage=name).observe(elapsed)
+    _record(name, elapsed)
+
+
+@contextmanager
+def collect_stages():
+    """Gather the stage timings of a block that runs outside any request."""
+    stages = {}
+    token = _REQUEST_STAGES.set(stages)
+    try:
+        yield stages
+    finally:
+        _REQUEST_STAGES.reset(token)
+
+
+def record_ml_stage(name, model, elapsed):
+    """Record PharmacyML work timed elsewhere (e.g. fits run in worker processes)."""
+    ML_STAGE_SECONDS.labels(stage=name, model=model).observe(elapsed)
+    _record(f"ml_{name}", elapsed)
+
+
+@contextmanager
+def ml_stage(name, model):
+    """Time a block of PharmacyML work for one model."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_ml_stage(name, model, time.perf_counter() - start)
+
+
+def _match_route(app, scope):
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route
+    return None
+
+
+def _server_timing(stages, total):
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route latency, response size, in-flight and error
+    metrics, and adding a Server-Timing header with the request's stage timings.
+
+    With `?profile=1` (and profiling allowed) the request runs under a sampling
+    profiler and the response is replaced by a JSON report.
+    """
+
+    def __init__(self, app, allow_profile=False, profile_interval=0.001):
+        self.app = app
+        self.allow_profile = allow_profile
+        self.profile_interval = profile_interval
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        matched = _match_route(scope["app"], scope)
+        # Label by path template (not the raw path) so cardinality stays bounded
+        route = getattr(matched, "path", "unmatched")
+        stages = {}
+        token = _REQUEST_STAGES.set(stages)
+        profiling = self.allow_profile and _wants_profile(scope)
+        profiling_token = _PROFILING.set(profiling)
+        state = {"status": 500, "bytes": 0}
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(stages, time.perf_counter() - start).encode()))
+                message = dict(message, headers=headers)
+            elif message["type"] == "http.response.body":
+                state["bytes"] += len(message.get("body", b""))
+            if not profiling:
+                await send(message)
+
+        IN_FLIGHT.labels(route=route).inc()
+        profiler = SamplingProfiler(self.profile_interval) if profiling else None
+        try:
+            if profiler is not None:
+                profiler.start()
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            ERRORS.labels(method=method, route=route, status="exception").inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                profiler.stop()
+            IN_FLIGHT.labels(route=route).dec()
+            _REQUEST_STAGES.reset(token)
+            _PROFILING.reset(profiling_token)
+            status = state["status"]
+            REQUEST_SECONDS.labels(method=method, route=route, status=status).observe(elapsed)
+            RESPONSE_BYTES.labels(method=method, route=route).observe(state["bytes"])
+            if status >= 400:
+                ERRORS.labels(method=method, route=route, status=status).inc()
+
+        if profiler is not None:
+            report = {
+                "route": route,
+                "status": state["status"],
+                "duration_ms": round(elapsed * 1000, 3),
+                "response_bytes": state["bytes"],
+                "stages_ms": {k: round(v * 1000, 3) for k, v in stages.items()},
+                "profile": profiler.report(endpoint=getattr(matched, "endpoint", None)),
+            }
+            body = json.dumps(report).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode())],
+            })
+            await send({"type": "http.response.body", "body": body})
+
+
+def profiling():
+    """True inside a request the middleware is profiling."""
+    return _PROFILING.get()
+
+
+def profile_requested(value):
+    return value is not None and value not in ("", "0", "false")
+
+
+def _wants_profile(scope):
+    query = scope.get("query_string", b"").decode("latin-1")
+    for part in query.split("&"):
+        key, _, value = part.partition("=")
+        if key == PROFILE_PARAM and profile_requested(value):
+            return True
+    return False
@@ -1,209 +1,836 @@
+import itertools
+import multiprocessing as mp
+import os
+import tempfile
+import threading
+import time
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LinearRegression
-from sklearn.tree import DecisionTreeRegressor
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, RandomForestClassifier
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
-from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
-from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error, confusion_matrix, accuracy_score
-import plotly.express as px
-import json
+
+from compiled_models import NotCompilable, compile_pipeline, parity_error
+from fact_table import FACT_TABLES, build_sales_fact
+from metrics import ml_stage, record_ml_stage
+from model_monitor import LiveStats, bin_counts, feature_baseline, psi
+from serialization import figure_payload
+from startup import LazyModule
+
+# scikit-learn and plotly take over a second to import, so they load on first
+# use (training, prediction, a restored model) rather than when the API starts
+px = LazyModule("plotly.express")
+HEAVY_MODULES = ("sklearn.ensemble", "sklearn.compose", "sklearn.pipeline", "sklearn.metrics",
+                 "sklearn.model_selection", "plotly.express")
+
+
+def _make_preprocessor(numeric_features, categorical_features):
+    from sklearn.compose import ColumnTransformer
+    from sklearn.impute import SimpleImputer
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+    return ColumnTransformer(
+        transformers=[
+            ("num", Pipeline(steps=[
+                ("imputer", SimpleImputer(strategy="median")),
+                ("scaler", StandardScaler())
+            ]), numeric_features),
+            ("cat", Pipeline(steps=[
+                ("imputer", SimpleImputer(strategy="constant", fill_value="missing")),
+                ("encoder", OneHotEncoder(handle_unknown="ignore"))
+            ]), categorical_features),
+        ]
+    )
+
+
+def _cv_columns(label, scores):
+    if not scores:
+        return {}
+    return {f"CV {label}": round(float(np.mean(scores)), 4), f"CV {label} Std": round(float(np.std(scores)), 4)}
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _parity_rows(X, rows, n=200):
+    """
+    Raw holdout records a compiled model must score exactly like its pipeline,
+    plus one all-missing record and one with unseen categories.
+    """
+    sample = X.iloc[rows[:n]].astype(object)
+    records = sample.where(sample.notna(), None).to_dict("records")
+    if records:
+        categorical = X.select_dtypes(include=["object", "category"]).columns
+        records.append({c: None for c in X.columns})
+        records.append(dict(records[0], **{c: "__unseen__" for c in categorical}))
+    return records
+
+
+def rows_digest(rows):
+    """
+    Order-independent digest of a frame's rows: the sum of their hashes mod 2**64,
+    so the digest of appended rows adds onto the digest of the rows before them.
+    """
+    hashes = pd.util.hash_pandas_object(rows, index=False).to_numpy()
+    return int(hashes.sum(dtype=np.uint64))
+
+
+def _timing_columns(result):
+    _, _, fit_s, predict_s = result
+    return {"Fit Time (s)": round(fit_s, 3), "Predict Time (ms)": round(predict_s * 1000, 2)}
+
+
+class _TrainingSpec:
+    """A preprocessed dataset, its holdout/CV splits and the estimators to fit on it."""
+
+    def __init__(self, key, X, y, train_idx, test_idx, estimators, preprocessor, features,
+                 finish, stratify=False, parity_rows=None):
+        self.key = key
+        self.X = X
+        self.y = y
+        self.train_idx = train_idx
+        self.test_idx = test_idx
+        self.estimators = estimators
+        self.preprocessor = preprocessor
+        self.features = features
+        self.finish = finish
+        self.stratify = stratify
+        self.parity_rows = parity_rows or []
+        self.splits = {}
+
+    def split(self, folds):
+        from sklearn.model_selection import KFold, StratifiedKFold
+
+        # "final" is the model that gets served; the folds only score it
+        self.splits = {"final": (self.train_idx, self.test_idx)}
+        if folds and folds > 1:
+            kfold = (StratifiedKFold if self.stratify else KFold)(folds, shuffle=True, random_state=42)
+            for i, (a, b) in enumerate(kfold.split(self.train_idx, self.y[self.train_idx])):
+                self.splits[f"fold{i}"] = (self.train_idx[a], self.train_idx[b])
+
+
+# Transformed training matrices of the current run, set once per worker process
+_TASK_DATA = {}
+# Pool workers map the matrices from files here (RAM-backed where available)
+_SHARED_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def _init_worker(datasets):
+    _TASK_DATA.clear()
+    _TASK_DATA.update(datasets)
+
+
+def _share_datasets(datasets, directory):
+    """Write each (X, y) to `directory`; returns the paths _load_worker maps them from."""
+    from scipy import sparse
+
+    paths = {}
+    for i, (key, (X, y)) in enumerate(datasets.items()):
+        files = []
+        for name, a in (("X", X), ("y", y)):
+            path = os.path.join(directory, f"{i}_{name}")
+            if sparse.issparse(a):
+                path += ".npz"
+                sparse.save_npz(path, a, compressed=False)
+            else:
+                a = np.asarray(a)
+                # Object arrays (string labels) are pickled and can't be memory-mapped
+                path += ".pkl.npy" if a.dtype == object else ".npy"
+                np.save(path, a, allow_pickle=a.dtype == object)
+            files.append(path)
+        paths[key] = tuple(files)
+    return paths
+
+
+def _load_array(path):
+    if path.endswith(".npz"):
+        from scipy import sparse
+        return sparse.load_npz(path)
+    if path.endswith(".pkl.npy"):
+        return np.load(path, allow_pickle=True)
+    # Read-only mapping: every worker shares the same pages
+    return np.load(path, mmap_mode="r")
+
+
+def _load_worker(paths):
+    _init_worker({key: tuple(_load_array(p) for p in files) for key, files in paths.items()})
+
+
+def _fit_task(key, estimator, train_idx, test_idx, keep_model):
+    X, y = _TASK_DATA[key]
+    start = time.perf_counter()
+    estimator.fit(X[train_idx], y[train_idx])
+    fit_s = time.perf_counter() - start
+    start = time.perf_counter()
+    y_pred = estimator.predict(X[test_idx])
+    predict_s = time.perf_counter() - start
+    return (estimator if keep_model else None), y_pred, fit_s, predict_s
+
+
+def _pool_context():
+    # Training runs on a background thread of the API process, and forking a
+    # threaded process can copy a lock some other thread holds. forkserver forks
+    # workers from a clean single-threaded server that has scikit-learn preloaded;
+    # spawn where forkserver is missing (Windows)
+    if "forkserver" in mp.get_all_start_methods():
+        ctx = mp.get_context("forkserver")
+        ctx.set_forkserver_preload([__name__, *HEAVY_MODULES])
+        return ctx
+    return mp.get_context("spawn")
+
+
+def run_training_tasks(datasets, tasks, n_jobs=1, budget=None):
+    """
+    Run fit tasks `(model, task_id, dataset_key, estimator, train_idx, test_idx, keep_model)`
+    in order, up to `n_jobs` at a time in worker processes (in-process when n_jobs is 1).
+
+    `budget(model)` is how many seconds the model's fits may run in total (None =
+    unlimited); time spent queued doesn't count. A model that overruns is cancelled:
+    its queued fits are dropped and running ones killed. In-process, a fit can't be
+    interrupted, so the budget is only checked between fits.
+
+    Returns ({model: {task_id: (estimator or None, predictions, fit_s, predict_s)}},
+    {model: reason}) for the models that finished and the ones that didn't.
+    """
+    results, failures = {}, {}
+    used = dict.fromkeys((t[0] for t in tasks), 0.0)
+
+    def over_budget(name, extra=0.0):
+        limit = budget(name) if budget is not None else None
+        return limit is not None and used[name] + extra > limit
+
+    def collect(name, task, fn):
+        try:
+            results.setdefault(name, {})[task] = fn()
+        except Exception as e:
+            failures[name] = f"failed: {e}"
+
+    if n_jobs <= 1 or len(tasks) <= 1:
+        _init_worker(datasets)
+        try:
+            for name, task, *args in tasks:
+                if name in failures:
+                    continue
+                start = time.monotonic()
+                collect(name, task, lambda: _fit_task(*args))
+                used[name] += time.monotonic() - start
+                if name not in failures and over_budget(name):
+                    failures[name] = "timed out"
+        finally:
+            _TASK_DATA.clear()
+    else:
+        ctx, size = _pool_context(), min(n_jobs, len(tasks))
+        # Workers map the matrices from files rather than each unpickling a copy
+        shared = tempfile.TemporaryDirectory(prefix="pharmacy-train-", dir=_SHARED_DIR)
+        paths = _share_datasets(datasets, shared.name)
+
+        def new_pool():
+            return ctx.Pool(size, initializer=_load_worker, initargs=(paths,))
+
+        queue = list(tasks)
+        running = {}  # (model, task) -> (AsyncResult, dispatched at, task)
+        pool = new_pool()
+        try:
+            while queue or running:
+                # Keep at most one fit per worker in flight, so dispatch time = start time
+                while queue and len(running) < size:
+                    t = queue.pop(0)
+                    if t[0] not in failures:
+                        running[t[0], t[1]] = (pool.apply_async(_fit_task, t[2:]), time.monotonic(), t)
+                time.sleep(0.02)
+
+                now = time.monotonic()
+                for (name, task), (res, started, _) in list(running.items()):
+                    if res.ready():
+                        del running[name, task]
+                        used[name] += now - started
+                        collect(name, task, res.get)
+                for name in {key[0] for key in running}:
+                    elapsed = sum(now - started for key, (_, started, _) in running.items() if key[0] == name)
+                    if name not in failures and over_budget(name, elapsed):
+                        failures[name] = "timed out"
+
+                stragglers = [key for key in running if key[0] in failures]
+                if stragglers:
+                    # A pool can't stop a single fit: replace it and re-dispatch the
+                    # other models' in-flight fits (their time so far still counts)
+                    pool.terminate()
+                    pool.join()
+                    pool = new_pool()
+                    for key in stragglers:
+                        del running[key]
+                    for (name, _), (_, started, _) in running.items():
+                        used[name] += now - started
+                    queue = [t for _, _, t in running.values()] + queue
+                    running = {}
+        finally:
+            pool.terminate()
+            pool.join()
+            shared.cleanup()
+
+    for name in failures:
+        results.pop(name, None)
+    return results, failures
+
 
 class PharmacyML:
-    def __init__(self, data_dict):
+    # Bump when training code changes so stale registry entries aren't reused
+    VERSION = 7
+    # Tables the models are trained on (used for the registry fingerprint)
+    SOURCE_TABLES = FACT_TABLES
+    # Price models compared in get_regression_metrics
+    REGRESSORS = ("Linear Regression", "Decision Tree", "Random Forest", "Gradient Boosting")
+    CV_FOLDS = 5
+    # Seconds a model's final fit + CV folds may run in total before it's cancelled
+    TIME_BUDGET = 900
+
+    def __init__(self, data_dict, train=True, state=None, n_jobs=None, cv_folds=None, time_budget=None):
+        """
+        n_jobs: worker processes for training (default: one per CPU; 1 trains in-process).
+        cv_folds: k for k-fold CV on the training split (1 disables CV).
+        time_budget: seconds per model, or {model name: seconds}.
+        """
         self.data = data_dict
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self.cv_folds = cv_folds or self.CV_FOLDS
+        self.time_budget = self.TIME_BUDGET if time_budget is None else time_budget
         self.models = {}
         self.metrics = {}
         self.confusion_matrices = {}
         self.regression_plots = {}
-        
-        # Train models
-        self.train_classification_model()
-        self.train_regression_models()
+        # Input schema per model: {"numeric": [...], "categorical": [...]}
+        self.features = {}
+        # Outcome per model: {"status": "ok" | "timed out" | "failed: ...", ...}
+        self.training = {}
+        # Raw holdout records per model, and the compiled form of each model that
+        # reproduces its pipeline on them (see compile_models)
+        self.parity_rows = {}
+        self.compiled = {}
+        # Per model: "compiled", or "pipeline: <why not>"
+        self.inference = {}
+        # Monitoring of rows that arrive after fitting (model_monitor.ModelMonitor):
+        # sales fact rows already used or scored, the training distribution of the
+        # drift features, bin counts of the rows scored since, live error per model
+        self.seen_rows = 0
+        # rows_digest of those rows, to tell appended data from replaced data
+        self.seen_digest = None
+        self.baseline = {}
+        self.drift_counts = {}
+        self.live = {}
+        self.refreshes = []
+        # The monitor thread folds rows into the state above while request threads
+        # report or export it
+        self._monitor_lock = threading.RLock()
+
+        if state is not None:
+            self.load_state(state)
+        elif train:
+            self.train()
 
-    def prepare_regression_data(self):
+    @staticmethod
+    def make_regressors():
+        """Fresh, unfitted estimators for REGRESSORS."""
+        from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+        from sklearn.linear_model import LinearRegression
+        from sklearn.tree import DecisionTreeRegressor
+
+        return {
+            "Linear Regression": LinearRegression(),
+            "Decision Tree": DecisionTreeRegressor(max_depth=12, random_state=42),
+            "Random Forest": RandomForestRegressor(n_estimators=200, max_depth=15, random_state=42),
+            "Gradient Boosting": GradientBoostingRegressor(random_state=42),
+        }
+
+    def train(self):
+        # Classifier and regressors share one pool, so all of them train concurrently
+        specs = []
+        try:
+            specs.append(self._classification_job())
+        except Exception as e:
+            print(f"Error training Classification Model: {e}")
+        specs.append(self._regression_job())
+        self._run(specs)
+        self._reset_monitoring(self.sales_fact())
+
+    def export_state(self):
+        """Everything needed to restore a trained instance without refitting."""
+        with self._monitor_lock:
+            return {
+                "models": self.models,
+                "metrics": dict(self.metrics),
+                "confusion_matrices": dict(self.confusion_matrices),
+                "regression_plots": self.regression_plots,
+                "features": self.features,
+                "training": self.training,
+                "parity_rows": self.parity_rows,
+                "monitor": {
+                    "seen_rows": self.seen_rows,
+                    "seen_digest": self.seen_digest,
+                    "baseline": self.baseline,
+                    "drift_counts": {k: v.tolist() for k, v in self.drift_counts.items()},
+                    "live": {k: v.to_state() for k, v in self.live.items()},
+                    "refreshes": list(self.refreshes),
+                },
+            }
+
+    def load_state(self, state):
+        self.models = state["models"]
+        self.metrics = state["metrics"]
+        self.confusion_matrices = state["confusion_matrices"]
+        self.regression_plots = state["regression_plots"]
+        self.features = state["features"]
+        self.training = state.get("training", {})
+        self.parity_rows = state.get("parity_rows", {})
+        monitor = state.get("monitor", {})
+        self.seen_rows = monitor.get("seen_rows", 0)
+        self.seen_digest = monitor.get("seen_digest")
+        self.baseline = monitor.get("baseline", {})
+        self.drift_counts = {k: np.asarray(v) for k, v in monitor.get("drift_counts", {}).items()}
+        self.live = {k: LiveStats.from_state(v) for k, v in monitor.get("live", {}).items()}
+        self.refreshes = monitor.get("refreshes", [])
+        self.compile_models()
+
+    def sales_fact(self):
+        """
+        SalesBills with medicine, type, customer and shop attributes attached: passed in
+        prebuilt as data["sales_fact"] (shared, read-only), or built from the raw tables.
         """
-        Joins Sales, Medicine, and Customers to create a rich dataset for Price Prediction.
+        fact = self.data.get("sales_fact")
+        if fact is None:
+            with ml_stage("fact", "regression"):
+                fact = build_sales_fact(self.data)
+            self.data = dict(self.data, sales_fact=fact)
+        return fact
+
+    def prepare_regression_data(self, df=None):
+        """
+        Price Prediction dataset from the denormalized sales table (or the fact rows `df`).
         Target: final_price
         Features: quantity, discount, price (unit), category, age, gender, payment_mode
         """
-        sales = self.data.get("sales_bills", pd.DataFrame()).copy()
-        meds = self.data.get("medicine", pd.DataFrame()).copy()
-        cust = self.data.get("customers", pd.DataFrame()).copy()
-
-        if sales.empty or meds.empty or cust.empty:
+        if df is None:
+            df = self.sales_fact()
+        if df is None:
             return None
 
-        # Merge Sales + Medicine
-        df = sales.merge(meds, on="medicine_id", how="left")
-        
-        # Merge + Customers
-        if "customer_id" in df.columns:
-             df = df.merge(cust, on="customer_id", how="left")
-        
         required_cols = ["final_price", "quantity", "discount", "price", "payment_mode"]
         if not all(col in df.columns for col in required_cols):
             return None
 
-        # Drop NaNs
-        df = df.dropna(subset=required_cols)
-        
-        # Feature Engineering: Interaction Term for Linear Models
-        # final_price ~ quantity * price * (1 - discount/100)
-        # Linear Regression needs 'quantity * price' as a feature to model this well.
-        df["expected_amount"] = df["quantity"] * df["price"]
-        
         # Define Features
         features = ["quantity", "discount", "price", "expected_amount", "payment_mode"]
         if "category" in df.columns: features.append("category")
         if "age" in df.columns: features.append("age")
         if "gender" in df.columns: features.append("gender")
 
+        # Only the columns used are copied out of the shared fact table; drop NaNs
+        df = df[[c for c in features if c != "expected_amount"] + ["final_price"]].dropna(subset=required_cols)
+        
+        # Feature Engineering: Interaction Term for Linear Models
+        # final_price ~ quantity * price * (1 - discount/100)
+        # Linear Regression needs 'quantity * price' as a feature to model this well.
+        df["expected_amount"] = df["quantity"] * df["price"]
+
         X = df[features]
         y = df["final_price"]
         
         return X, y
 
-    def train_regression_models(self):
+    def _regression_job(self):
+        from sklearn.model_selection import train_test_split
+
         data = self.prepare_regression_data()
         if data is None:
             print("Insufficient data for regression models.")
-            return
+            return None
 
         X, y = data
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-        # Preprocessing
-        numeric_features = X.select_dtypes(include=["int64", "float64"]).columns.tolist()
-        categorical_features = X.select_dtypes(include=["object"]).columns.tolist()
-
-        from sklearn.impute import SimpleImputer
-
-        preprocessor = ColumnTransformer(
-            transformers=[
-                ("num", Pipeline(steps=[
-                    ("imputer", SimpleImputer(strategy="median")),
-                    ("scaler", StandardScaler())
-                ]), numeric_features),
-                ("cat", Pipeline(steps=[
-                    ("imputer", SimpleImputer(strategy="constant", fill_value="missing")),
-                    ("encoder", OneHotEncoder(handle_unknown="ignore"))
-                ]), categorical_features),
-            ]
+        train_idx, test_idx = train_test_split(np.arange(len(X)), test_size=0.2, random_state=42)
+
+        numeric_features = X.select_dtypes(include=["number"]).columns.tolist()
+        categorical_features = X.select_dtypes(include=["object", "category"]).columns.tolist()
+
+        # One preprocessor, fitted once on the training split, shared by every regressor
+        # (and by the CV folds, which is a negligible leak of imputer/scaler statistics)
+        with ml_stage("preprocess", "regression"):
+            preprocessor = _make_preprocessor(numeric_features, categorical_features)
+            preprocessor.fit(X.iloc[train_idx])
+            Xt = preprocessor.transform(X)
+
+        return _TrainingSpec(
+            "regression", Xt, y.to_numpy(), train_idx, test_idx, self.make_regressors(),
+            preprocessor, {"numeric": numeric_features, "categorical": categorical_features},
+            finish=self._finish_regressor, parity_rows=_parity_rows(X, test_idx),
         )
 
-        regressors = {
-            "Random Forest": RandomForestRegressor(n_estimators=200, max_depth=15, random_state=42)
+    def _finish_regressor(self, spec, name, results):
+        from sklearn.metrics import confusion_matrix, mean_absolute_error, mean_squared_error, r2_score
+        from sklearn.pipeline import Pipeline
+
+        model, y_pred, _, _ = results["final"]
+        y_test = spec.y[spec.test_idx]
+
+        self.models[name] = Pipeline(steps=[("preprocessor", spec.preprocessor), ("regressor", model)])
+        self.features[name] = spec.features
+        cv_scores = [r2_score(spec.y[spec.splits[task][1]], pred)
+                     for task, (_, pred, _, _) in results.items() if task != "final"]
+        mse = mean_squared_error(y_test, y_pred)
+        self.metrics[name] = {
+            "R2 Score": round(r2_score(y_test, y_pred), 4),
+            "MAE": round(mean_absolute_error(y_test, y_pred), 2),
+            "MSE": round(mse, 2),
+            "RMSE": round(np.sqrt(mse), 2),
+            **_cv_columns("R2", cv_scores),
+            **_timing_columns(results["final"]),
         }
 
-        for name, model in regressors.items():
-            try:
-                pipeline = Pipeline(steps=[("preprocessor", preprocessor), ("regressor", model)])
-                pipeline.fit(X_train, y_train)
-                
-                y_pred = pipeline.predict(X_test)
-                
-                # Metrics
-                r2 = r2_score(y_test, y_pred)
-                mae = mean_absolute_error(y_test, y_pred)
-                mse = mean_squared_error(y_test, y_pred)
-                rmse = np.sqrt(mse)
-                
-                self.models[name] = pipeline
-                self.metrics[name] = {
-                    "R2 Score": round(r2, 4),
-                    "MAE": round(mae, 2),
-                    "MSE": round(mse, 2),
-                    "RMSE": round(rmse, 2)
-                }
-                
-                # Generate Binned Confusion Matrix for Regression
-                try:
-                    labels = ["Low", "Medium", "High"]
-                    # robust binning using qcut on the training set target to define edges
-                    # We use the entire y distribution to define "global" low/med/high for consistency
-                    quantiles = y.quantile([0.33, 0.66]).values
-                    bins = [-np.inf, quantiles[0], quantiles[1], np.inf]
-                    
-                    def bin_values(vals):
-                        return np.digitize(vals, bins=bins) - 1
-                    
-                    y_test_binned = bin_values(y_test)
-                    y_pred_binned = bin_values(y_pred)
-                    
-                    cm = confusion_matrix(y_test_binned, y_pred_binned)
-                    self.confusion_matrices[name] = {"matrix": cm.tolist(), "labels": labels}
-                except Exception as e:
-                    print(f"Error generating regression CM for {name}: {e}")
+        # Generate Binned Confusion Matrix for Regression
+        try:
+            labels = ["Low", "Medium", "High"]
+            # We use the entire y distribution to define "global" low/med/high for consistency
+            quantiles = np.quantile(spec.y, [0.33, 0.66])
+            bins = [-np.inf, quantiles[0], quantiles[1], np.inf]
 
-                # Generate Plot Data (Actual vs Predicted)
-                plot_df = pd.DataFrame({"Actual": y_test, "Predicted": y_pred}).sample(min(100, len(y_test)))
-                # Check if statsmodels is installed for trendline
-                try:
-                    import statsmodels
-                    trendline = "ols"
-                except ImportError:
-                    trendline = None
-                
-                fig = px.scatter(plot_df, x="Actual", y="Predicted", title=f"{name}: Actual vs Predicted", 
-                                 trendline=trendline, labels={"Actual": "Actual Price", "Predicted": "Predicted Price"})
-                self.regression_plots[name] = json.loads(fig.to_json())
-                
-            except Exception as e:
-                print(f"Error training {name}: {e}")
+            def bin_values(vals):
+                return np.digitize(vals, bins=bins) - 1
 
-    def train_classification_model(self):
+            with ml_stage("confusion_matrix", name):
+                cm = confusion_matrix(bin_values(y_test), bin_values(y_pred))
+            self.confusion_matrices[name] = {"matrix": cm.tolist(), "labels": labels,
+                                             "bins": quantiles.tolist()}
+        except Exception as e:
+            print(f"Error generating regression CM for {name}: {e}")
+
+        # Generate Plot Data (Actual vs Predicted)
+        plot_df = pd.DataFrame({"Actual": y_test, "Predicted": y_pred}).sample(min(100, len(y_test)))
+        # Check if statsmodels is installed for trendline
+        try:
+            import statsmodels
+            trendline = "ols"
+        except ImportError:
+            trendline = None
+
+        with ml_stage("plot", name):
+            fig = px.scatter(plot_df, x="Actual", y="Predicted", title=f"{name}: Actual vs Predicted",
+                             trendline=trendline, labels={"Actual": "Actual Price", "Predicted": "Predicted Price"})
+            self.regression_plots[name] = figure_payload(fig)
+
+    def prepare_classification_data(self, df=None):
+        """Status dataset from the sales table (or the fact rows `df`): X, y."""
+        if df is None:
+            df = self.sales_fact()
+        if df is None:
+            return None
+        cols = ["status", "final_price", "quantity", "discount", "payment_mode"]
+        df = df[cols].dropna(subset=cols)
+        return df[["final_price", "quantity", "discount", "payment_mode"]], df["status"].astype(str)
+
+    def _classification_job(self):
         """
         Random Forest Classifier for Status Prediction.
         """
-        try:
-            df = self.data.get("sales_bills", pd.DataFrame()).copy()
-            if df.empty: return
-
-            df = df.dropna(subset=["status", "final_price", "quantity", "discount", "payment_mode"])
-            X = df[["final_price", "quantity", "discount", "payment_mode"]]
-            y = df["status"]
-
-            numeric_features = ["final_price", "quantity", "discount"]
-            categorical_features = ["payment_mode"]
-
-            from sklearn.impute import SimpleImputer
-
-            preprocessor = ColumnTransformer(
-                transformers=[
-                    ("num", Pipeline(steps=[
-                        ("imputer", SimpleImputer(strategy="median")),
-                        ("scaler", StandardScaler())
-                    ]), numeric_features),
-                    ("cat", Pipeline(steps=[
-                        ("imputer", SimpleImputer(strategy="constant", fill_value="missing")),
-                        ("encoder", OneHotEncoder(handle_unknown="ignore"))
-                    ]), categorical_features),
-                ]
-            )
-
-            clf = Pipeline(steps=[("preprocessor", preprocessor), ("classifier", RandomForestClassifier(n_estimators=50, random_state=42))])
-            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-            clf.fit(X_train, y_train)
-            
-            y_pred = clf.predict(X_test)
-            acc = accuracy_score(y_test, y_pred)
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.model_selection import train_test_split
+
+        data = self.prepare_classification_data()
+        if data is None:
+            return None
+
+        X, y = data
+        numeric_features = ["final_price", "quantity", "discount"]
+        categorical_features = ["payment_mode"]
+        train_idx, test_idx = train_test_split(np.arange(len(X)), test_size=0.2, random_state=42)
+
+        with ml_stage("preprocess", "Status Classifier"):
+            preprocessor = _make_preprocessor(numeric_features, categorical_features)
+            preprocessor.fit(X.iloc[train_idx])
+            Xt = preprocessor.transform(X)
+
+        return _TrainingSpec(
+            "classification", Xt, y.to_numpy(), train_idx, test_idx,
+            {"Status Classifier": RandomForestClassifier(n_estimators=50, random_state=42)},
+            preprocessor, {"numeric": numeric_features, "categorical": categorical_features},
+            finish=self._finish_classifier, stratify=True, parity_rows=_parity_rows(X, test_idx),
+        )
+
+    def _finish_classifier(self, spec, name, results):
+        from sklearn.metrics import accuracy_score, confusion_matrix
+        from sklearn.pipeline import Pipeline
+
+        model, y_pred, _, _ = results["final"]
+        y_test = spec.y[spec.test_idx]
+        with ml_stage("confusion_matrix", name):
             cm = confusion_matrix(y_test, y_pred)
-            labels = sorted(y.unique())
+        cv_scores = [accuracy_score(spec.y[spec.splits[task][1]], pred)
+                     for task, (_, pred, _, _) in results.items() if task != "final"]
+
+        self.models[name] = Pipeline(steps=[("preprocessor", spec.preprocessor), ("classifier", model)])
+        self.features[name] = spec.features
+        self.metrics[name] = {
+            "Accuracy": round(accuracy_score(y_test, y_pred), 4),
+            **_cv_columns("Accuracy", cv_scores),
+            **_timing_columns(results["final"]),
+        }
+        self.confusion_matrices[name] = {"matrix": cm.tolist(), "labels": sorted(np.unique(spec.y))}
+
+    def _run(self, specs):
+        """
+        Fit every model of `specs` (final fit + k CV folds each) as independent tasks
+        across a process pool, then build metrics, plots and pipelines here.
+        """
+        from sklearn.base import clone
+
+        specs = [s for s in specs if s is not None]
+        per_model = []
+        for spec in specs:
+            spec.split(self.cv_folds)
+            for name, estimator in spec.estimators.items():
+                per_model.append([(name, task, spec.key, clone(estimator), train, test, task == "final")
+                                  for task, (train, test) in spec.splits.items()])
+        # Interleave so every model's final fit starts before anyone's CV folds
+        tasks = [t for group in itertools.zip_longest(*per_model) for t in group if t is not None]
 
-            self.models["Status Classifier"] = clf
-            self.metrics["Status Classifier"] = {"Accuracy": round(acc, 4)}
-            self.confusion_matrices["Status Classifier"] = {"matrix": cm.tolist(), "labels": labels}
+        results, failures = run_training_tasks(
+            {spec.key: (spec.X, spec.y) for spec in specs}, tasks, self.n_jobs, self._budget)
 
+        for spec in specs:
+            for name in spec.estimators:
+                if name in failures:
+                    self.training[name] = {"status": failures[name]}
+                    print(f"Error training {name}: {failures[name]}")
+                    continue
+                for task, (_, _, fit_s, predict_s) in results[name].items():
+                    if task == "final":
+                        record_ml_stage("fit", name, fit_s)
+                        record_ml_stage("predict", name, predict_s)
+                    else:
+                        record_ml_stage("cv_fit", name, fit_s)
+                try:
+                    spec.finish(spec, name, results[name])
+                    self.training[name] = {"status": "ok", "cv_folds": len(results[name]) - 1}
+                    self.parity_rows[name] = spec.parity_rows
+                except Exception as e:
+                    self.training[name] = {"status": f"failed: {e}"}
+                    print(f"Error training {name}: {e}")
+        self.compile_models()
+
+    def compile_models(self):
+        """
+        Compile each model to NumPy arrays for low-latency scoring (compiled_models).
+        A compiled model is only kept if it reproduces pipeline.predict on the
+        model's parity rows; otherwise predictions keep going through the pipeline.
+        """
+        self.compiled = {}
+        self.inference = {}
+        for name, pipeline in self.models.items():
+            rows = self.parity_rows.get(name)
+            if not rows:
+                self.inference[name] = "pipeline: no parity rows"
+                continue
+            try:
+                compiled = compile_pipeline(pipeline)
+            except NotCompilable as e:
+                self.inference[name] = f"pipeline: not compilable ({e})"
+                continue
+            X, errors = self.validate_features(name, pd.DataFrame(rows))
+            preds, compiled_errors = compiled.predict(self._derive_features(name, rows))
+            problem = errors or compiled_errors or parity_error(pipeline.predict(X), preds)
+            if problem:
+                self.inference[name] = f"pipeline: parity check failed ({problem})"
+                print(f"Warning: compiled {name} doesn't match its pipeline: {problem}")
+                continue
+            self.compiled[name] = compiled
+            self.inference[name] = "compiled"
+
+    # Monitoring and incremental refresh
+    def _reset_monitoring(self, fact):
+        """Take `fact` as the data the models now reflect: new baseline, no live stats."""
+        if fact is None:
+            return
+        baseline, digest = feature_baseline(fact), rows_digest(fact)
+        with self._monitor_lock:
+            self.seen_rows = len(fact)
+            self.seen_digest = digest
+            self.baseline = baseline
+            self.drift_counts = {k: np.zeros(len(v["expected"]), dtype=np.int64) for k, v in baseline.items()}
+            self.live = {name: LiveStats("classification" if name == "Status Classifier" else "regression")
+                         for name in self.models}
+            self.metrics = {name: {k: v for k, v in m.items() if not k.startswith(("Live ", "Rolling "))}
+                            for name, m in self.metrics.items()}
+
+    def observe(self, rows):
+        """
+        Score sales fact rows that arrived after fitting with the current models and
+        fold them into the live metrics, confusion matrices and drift counts.
+        """
+        drift = {col: bin_counts(spec, rows[col]) for col, spec in self.baseline.items() if col in rows.columns}
+        digest = rows_digest(rows)
+        scored = []
+        reg = self.prepare_regression_data(rows)
+        if reg is not None and len(reg[1]):
+            scored += [(name, reg) for name in self.REGRESSORS if name in self.models]
+        clf = self.prepare_classification_data(rows)
+        if clf is not None and len(clf[1]) and "Status Classifier" in self.models:
+            scored.append(("Status Classifier", clf))
+        predictions = []
+        for name, (X, y) in scored:
+            X, errors = self.validate_features(name, X)
+            if X is not None:
+                predictions.append((name, y.to_numpy(), self.predict_batch(name, X)))
+
+        # Scoring ran unlocked; only folding the results in excludes readers
+        with self._monitor_lock:
+            for col, counts in drift.items():
+                self.drift_counts[col] = self.drift_counts[col] + counts
+            for name, y_true, y_pred in predictions:
+                self.live.setdefault(name, LiveStats("classification" if name == "Status Classifier"
+                                                     else "regression")).update(y_true, y_pred)
+                self._stream_confusion(name, y_true, y_pred)
+                # Replace rather than mutate: metric endpoints read these dicts unlocked
+                self.metrics[name] = {**self.metrics.get(name, {}), **self.live[name].summary()}
+            self.seen_rows += len(rows)
+            if self.seen_digest is not None:
+                self.seen_digest = (self.seen_digest + digest) % 2 ** 64
+
+    def has_seen(self, fact):
+        """Whether `fact` starts with the rows these models have seen (it only grew since)."""
+        return (self.seen_digest is not None and len(fact) >= self.seen_rows
+                and rows_digest(fact.iloc[:self.seen_rows]) == self.seen_digest)
+
+    def _stream_confusion(self, name, y_true, y_pred):
+        cm = self.confusion_matrices.get(name)
+        if cm is None:
+            return
+        matrix = np.asarray(cm["matrix"])
+        if "bins" in cm:
+            true_idx, pred_idx = np.digitize(y_true, cm["bins"]), np.digitize(y_pred, cm["bins"])
+        else:
+            codes = {label: i for i, label in enumerate(cm["labels"])}
+            true_idx = np.array([codes.get(v, -1) for v in y_true])
+            pred_idx = np.array([codes.get(v, -1) for v in y_pred])
+        known = (true_idx >= 0) & (pred_idx >= 0) & (true_idx < len(matrix)) & (pred_idx < len(matrix))
+        np.add.at(matrix, (true_idx[known], pred_idx[known]), 1)
+        self.confusion_matrices[name] = dict(cm, matrix=matrix.tolist(),
+                                             streamed=cm.get("streamed", 0) + int(known.sum()))
+
+    def drift_report(self):
+        with self._monitor_lock:
+            return {
+                "seen_rows": self.seen_rows,
+                "psi": {col: round(psi(spec["expected"], self.drift_counts[col]), 4)
+                        for col, spec in self.baseline.items() if self.drift_counts[col].sum()},
+                "observed_rows": {col: int(c.sum()) for col, c in self.drift_counts.items()},
+                "live": {name: stats.summary() for name, stats in self.live.items()},
+                "refreshes": self.refreshes,
+            }
+
+    def drift_triggers(self, thresholds):
+        """Reasons to refresh the models given `thresholds` (see ModelMonitor); empty if none."""
+        with self._monitor_lock:
+            triggers = []
+            for col, spec in self.baseline.items():
+                counts = self.drift_counts[col]
+                if counts.sum() >= thresholds["min_rows"]:
+                    value = psi(spec["expected"], counts)
+                    if value > thresholds["psi"]:
+                        triggers.append(f"PSI of {col} is {value:.3f}")
+            for name, stats in self.live.items():
+                summary = stats.summary()
+                if len(stats.recent) < thresholds["min_rows"]:
+                    continue
+                holdout = self.metrics.get(name, {})
+                if "Rolling MAE" in summary and holdout.get("MAE"):
+                    if summary["Rolling MAE"] > holdout["MAE"] * thresholds["error_ratio"]:
+                        triggers.append(f"{name} rolling MAE {summary['Rolling MAE']} vs {holdout['MAE']}")
+                if "Rolling Accuracy" in summary and holdout.get("Accuracy"):
+                    if summary["Rolling Accuracy"] < holdout["Accuracy"] - thresholds["accuracy_drop"]:
+                        triggers.append(f"{name} rolling accuracy {summary['Rolling Accuracy']} "
+                                        f"vs {holdout['Accuracy']}")
+            return triggers
+
+    def warm_refresh(self, data_dict, reason=(), extra_trees=0.25):
+        """
+        Copy of this instance with every model updated on the current data instead
+        of retrained from scratch. The fitted preprocessors are kept. Forests get
+        `extra_trees` x n_estimators new trees fitted on all rows, and as many of
+        their oldest trees are dropped, so the forest keeps its size. Gradient
+        boosting adds as many stages. Models with no warm start (linear, single
+        tree) are refitted; they are the cheap ones. Metrics, plots and confusion
+        matrices carry over; live stats and the drift baseline restart from here.
+        Boosting past twice its original stage count is refitted from scratch.
+        """
+        import copy
+        from sklearn.base import clone
+
+        start = time.perf_counter()
+        fresh = PharmacyML(data_dict, state=self.export_state())
+        fact = fresh.sales_fact()
+        datasets = {name: fresh.prepare_regression_data(fact) for name in self.REGRESSORS}
+        datasets["Status Classifier"] = fresh.prepare_classification_data(fact)
+        bases = self.make_regressors()
+        models = {}
+        for name, pipeline in self.models.items():
+            data = datasets.get(name)
+            if data is None:
+                models[name] = pipeline
+                continue
+            X, y = data
+            (pre_name, preprocessor), (est_name, estimator) = pipeline.steps
+            with ml_stage("refresh", name):
+                Xt = preprocessor.transform(X)
+                base = bases.get(name)
+                if isinstance(getattr(estimator, "estimators_", None), np.ndarray) and base is not None \
+                        and estimator.n_estimators * (1 + extra_trees) > 2 * base.n_estimators:
+                    estimator = clone(base).fit(Xt, y.to_numpy())
+                elif "warm_start" in estimator.get_params() and hasattr(estimator, "estimators_"):
+                    estimator = copy.deepcopy(estimator)
+                    n = estimator.n_estimators
+                    added = max(1, int(n * extra_trees))
+                    estimator.set_params(warm_start=True, n_estimators=n + added)
+                    estimator.fit(Xt, y.to_numpy())
+                    estimator.set_params(warm_start=False)
+                    if isinstance(estimator.estimators_, list):
+                        # Forest: drop the oldest trees to keep the size fixed
+                        estimator.estimators_ = estimator.estimators_[added:]
+                        estimator.n_estimators = n
+                else:
+                    estimator = clone(estimator).fit(Xt, y.to_numpy())
+            models[name] = type(pipeline)(steps=[(pre_name, preprocessor), (est_name, estimator)])
+        fresh.models = models
+        fresh.compile_models()
+        fresh._reset_monitoring(fact)
+        fresh.refreshes = self.refreshes + [{
+            "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "rows": len(fact),
+            "seconds": round(time.perf_counter() - start, 2),
+            "reason": list(reason),
+        }]
+        return fresh
+
+    def _budget(self, name):
+        if isinstance(self.time_budget, dict):
+            return self.time_budget.get(name)
+        return self.time_budget
+
+    @property
+    def complete(self):
+        """True when every model that was attempted trained successfully."""
+        return all(t["status"] == "ok" for t in self.training.values())
+
+    def train_regression_models(self):
+        self._run([self._regression_job()])
+
+    def train_classification_model(self):
+        try:
+            self._run([self._classification_job()])
         except Exception as e:
             print(f"Error training Classification Model: {e}")
 
     def get_regression_metrics(self):
         # Filter metrics for regression models
-        reg_names = ["Linear Regression", "Decision Tree", "Random Forest", "Gradient Boosting"]
-        return {k: v for k, v in self.metrics.items() if k in reg_names}
+        return {k: v for k, v in self.metrics.items() if k in self.REGRESSORS}
 
     def get_regression_plot(self, model_name):
         return self.regression_plots.get(model_name, None)
@@ -214,9 +841,75 @@ class PharmacyML:
     def get_confusion_matrix(self, model_name="Status Classifier"):
         return self.confusion_matrices.get(model_name, None)
 
-    # Prediction methods (simplified for demo)
+    # Prediction methods
+    def validate_features(self, model_name, df):
+        """
+        Check a batch of raw records against the model's feature lists and coerce
+        types. Returns (frame, errors); frame is None when the batch is unusable.
+        """
+        spec = self.features[model_name]
+        df = df.copy()
+        # Derived regression feature - callers only need to send its inputs
+        if "expected_amount" in spec["numeric"] and "expected_amount" not in df.columns \
+                and {"quantity", "price"} <= set(df.columns):
+            df["expected_amount"] = pd.to_numeric(df["quantity"], errors="coerce") * \
+                pd.to_numeric(df["price"], errors="coerce")
+
+        errors = []
+        missing = [c for c in spec["numeric"] + spec["categorical"] if c not in df.columns]
+        if missing:
+            return None, [f"missing feature columns: {missing}"]
+
+        for col in spec["numeric"]:
+            values = pd.to_numeric(df[col], errors="coerce")
+            bad = values.isna() & df[col].notna()
+            if bad.any():
+                rows = np.flatnonzero(bad.to_numpy())[:10].tolist()
+                errors.append(f"non-numeric values in '{col}' at rows {rows}")
+            df[col] = values
+        for col in spec["categorical"]:
+            # The imputer only fills NaN; a None (JSON null) would pass as a category
+            values = df[col].astype(object)
+            df[col] = values.where(values.notna(), np.nan)
+
+        if errors:
+            return None, errors
+        return df[spec["numeric"] + spec["categorical"]], []
+
+    def predict_batch(self, model_name, df):
+        """Score a validated frame in one vectorized pipeline.predict call."""
+        with ml_stage("predict", model_name):
+            return self.models[model_name].predict(df)
+
+    def _derive_features(self, model_name, records):
+        """Add expected_amount to raw records the way validate_features does for a frame."""
+        spec = self.features[model_name]
+        if "expected_amount" not in spec["numeric"] or any("expected_amount" in r for r in records):
+            return records
+        if not (any("quantity" in r for r in records) and any("price" in r for r in records)):
+            return records
+        return [dict(r, expected_amount=_to_float(r.get("quantity")) * _to_float(r.get("price")))
+                for r in records]
+
+    def predict_records(self, model_name, records):
+        """
+        Score a few raw records (dicts) with the compiled model, without pandas:
+        (predictions, errors), predictions None on bad input. None when the model
+        has no compiled form; use validate_features + predict_batch then.
+        """
+        compiled = self.compiled.get(model_name)
+        if compiled is None:
+            return None
+        with ml_stage("predict_compiled", model_name):
+            return compiled.predict(self._derive_features(model_name, records))
+
     def predict_price(self, model_name, input_data):
         if model_name not in self.models: return None
+        result = self.predict_records(model_name, [input_data])
+        if result is not None:
+            preds, _ = result
+            return None if preds is None else preds[0]
         # Input data must be a dict matching feature names
-        df = pd.DataFrame([input_data])
-        return self.models[model_name].predict(df)[0]
+        X, errors = self.validate_features(model_name, pd.DataFrame([input_data]))
+        if X is None: return None
+        return self.predict_batch(model_name, X)[0]
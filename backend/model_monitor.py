@@ -0,0 +1,199 @@
+import collections
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# Sales fact columns whose distribution is compared against the training data
+DRIFT_FEATURES = {
+    "numeric": ["discount", "final_price", "quantity", "price"],
+    "categorical": ["payment_mode", "category"],
+}
+# Conventional PSI reading: < 0.1 stable, 0.1-0.2 moderate shift, > 0.2 significant
+PSI_THRESHOLD = 0.2
+
+
+def feature_baseline(df, bins=10):
+    """
+    Reference distribution of each drift feature in `df`: decile edges (numeric)
+    or category list (categorical), with the fraction of rows per bin.
+    """
+    baseline = {}
+    for col in DRIFT_FEATURES["numeric"]:
+        if col not in df.columns:
+            continue
+        values = pd.to_numeric(df[col], errors="coerce").dropna().to_numpy(dtype=np.float64)
+        if len(values) == 0:
+            continue
+        # Inner edges only; the outer bins are open-ended so new extremes still land somewhere
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)[1:-1]))
+        spec = {"edges": edges.tolist()}
+        baseline[col] = dict(spec, expected=_fractions(bin_counts(spec, values)))
+    for col in DRIFT_FEATURES["categorical"]:
+        if col not in df.columns:
+            continue
+        values = df[col].dropna().astype(str)
+        spec = {"categories": sorted(values.unique().tolist())}
+        baseline[col] = dict(spec, expected=_fractions(bin_counts(spec, values)))
+    return baseline
+
+
+def bin_counts(spec, values):
+    """Rows per bin of a baseline feature; unseen categories share one extra bin."""
+    if "edges" in spec:
+        values = pd.to_numeric(pd.Series(values), errors="coerce").dropna().to_numpy(dtype=np.float64)
+        return np.bincount(np.searchsorted(spec["edges"], values, side="right"),
+                           minlength=len(spec["edges"]) + 1)
+    codes = pd.Categorical(pd.Series(values).dropna().astype(str), categories=spec["categories"]).codes
+    # Code -1 (not a known category) goes to the last bin
+    return np.bincount(np.where(codes < 0, len(spec["categories"]), codes),
+                       minlength=len(spec["categories"]) + 1)
+
+
+def _fractions(counts):
+    total = counts.sum()
+    return (counts / total).tolist() if total else [0.0] * len(counts)
+
+
+def psi(expected, actual_counts, eps=1e-4):
+    """Population stability index of observed bin counts against expected fractions."""
+    e = np.clip(np.asarray(expected, dtype=np.float64), eps, None)
+    a = np.clip(np.asarray(_fractions(np.asarray(actual_counts)), dtype=np.float64), eps, None)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+class LiveStats:
+    """
+    Streaming error statistics of one model on rows it wasn't trained on: totals
+    since the last (re)fit plus a rolling window of the most recent rows.
+    Regressors track absolute/squared errors, classifiers hits.
+    """
+
+    def __init__(self, kind, window=2000):
+        self.kind = kind
+        self.window = window
+        self.count = 0
+        self.sums = {"abs": 0.0, "sq": 0.0, "hit": 0.0}
+        self.recent = collections.deque(maxlen=window)
+
+    def update(self, y_true, y_pred):
+        if self.kind == "regression":
+            err = np.asarray(y_true, dtype=np.float64) - np.asarray(y_pred, dtype=np.float64)
+            rows = np.column_stack([np.abs(err), err * err])
+            self.sums["abs"] += float(rows[:, 0].sum())
+            self.sums["sq"] += float(rows[:, 1].sum())
+        else:
+            rows = (np.asarray(y_true) == np.asarray(y_pred)).astype(np.float64)[:, None]
+            self.sums["hit"] += float(rows.sum())
+        self.count += len(rows)
+        self.recent.extend(rows[-self.window:].tolist())
+
+    def summary(self):
+        if self.count == 0:
+            return {}
+        recent = np.asarray(self.recent)
+        if self.kind == "regression":
+            return {
+                "Live Rows": self.count,
+                "Live MAE": round(self.sums["abs"] / self.count, 2),
+                "Live RMSE": round(float(np.sqrt(self.sums["sq"] / self.count)), 2),
+                "Rolling MAE": round(float(recent[:, 0].mean()), 2),
+            }
+        return {
+            "Live Rows": self.count,
+            "Live Accuracy": round(self.sums["hit"] / self.count, 4),
+            "Rolling Accuracy": round(float(recent[:, 0].mean()), 4),
+        }
+
+    def to_state(self):
+        return {"kind": self.kind, "window": self.window, "count": self.count,
+                "sums": dict(self.sums), "recent": list(self.recent)}
+
+    @classmethod
+    def from_state(cls, state):
+        stats = cls(state["kind"], state["window"])
+        stats.count = state["count"]
+        stats.sums = dict(state["sums"])
+        stats.recent.extend(state["recent"])
+        return stats
+
+
+class ModelMonitor:
+    """
+    Watches SalesBills rows that arrive after the models were fitted. notify()
+    (on ingest, or when new models are published) wakes a background thread that
+    scores the unseen rows of the sales fact table with the current models
+    (PharmacyML.observe) and, when drift or rolling error crosses a threshold,
+    builds warm-started models (PharmacyML.warm_refresh) and hands them to
+    `on_refresh`. Checks coalesce: rows that arrive during one are picked up by
+    the next.
+    """
+
+    def __init__(self, get_ml, fact_fn, on_refresh, rows_fn=None, psi_threshold=PSI_THRESHOLD,
+                 error_ratio=1.25, accuracy_drop=0.05, min_rows=500, enabled=True):
+        self.get_ml = get_ml
+        self.fact_fn = fact_fn
+        # Cheap SalesBills row count, checked before materializing the fact table
+        self.rows_fn = rows_fn
+        self.on_refresh = on_refresh
+        self.thresholds = {"psi": psi_threshold, "error_ratio": error_ratio,
+                           "accuracy_drop": accuracy_drop, "min_rows": min_rows}
+        self.enabled = enabled
+        self.state = "idle"
+        self.error = None
+        self.last_check = None
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def notify(self):
+        if not self.enabled:
+            return
+        self._wake.set()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="model-monitor", daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            ml = self.get_ml()
+            try:
+                refreshed = self.catch_up(ml)
+                if refreshed is not ml:
+                    self.on_refresh(refreshed)
+                self.error = None
+            except Exception as e:
+                self.error = str(e)
+                print(f"Error monitoring ML models: {e}")
+            self.state = "idle"
+
+    def catch_up(self, ml):
+        """
+        Observe the fact rows `ml` hasn't seen; returns `ml`, or a refreshed copy
+        if a threshold was crossed. Runs in the caller's thread.
+        """
+        if ml is None or not ml.models:
+            return ml
+        self.last_check = time.strftime("%Y-%m-%dT%H:%M:%S")
+        if self.rows_fn is not None and self.rows_fn() <= ml.seen_rows:
+            return ml
+        self.state = "scoring"
+        fact = self.fact_fn()
+        if fact is None or len(fact) <= ml.seen_rows:
+            return ml
+        ml.observe(fact.iloc[ml.seen_rows:])
+        triggers = ml.drift_triggers(self.thresholds)
+        if not triggers:
+            return ml
+        self.state = "refreshing"
+        print(f"Refreshing ML models: {'; '.join(triggers)}")
+        return ml.warm_refresh({"sales_fact": fact}, reason=triggers)
+
+    def status(self, ml):
+        report = ml.drift_report() if ml is not None and ml.models else {}
+        return dict(report, state=self.state, enabled=self.enabled, thresholds=self.thresholds,
+                    last_check=self.last_check, error=self.error)
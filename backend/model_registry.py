@@ -0,0 +1,307 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import pandas as pd
+import joblib
+
+from serialization import dumps, loads
+
+
+def data_fingerprint(data, tables, salt=""):
+    """
+    Content hash of the tables a model is trained on.
+    Row hashes come from pandas, so this is a single vectorized pass per table.
+    """
+    h = hashlib.sha1(salt.encode())
+    for name in tables:
+        df = data.get(name, pd.DataFrame())
+        h.update(name.encode())
+        h.update(json.dumps([[c, str(t)] for c, t in df.dtypes.items()]).encode())
+        if not df.empty:
+            h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()[:16]
+
+
+class ModelRegistry:
+    """
+    Local on-disk store of trained PharmacyML artifacts.
+
+    Layout: <root>/<fingerprint>/models.joblib holds the fitted pipelines and
+    <root>/<fingerprint>/manifest.json holds metrics, confusion matrices,
+    regression plots and bookkeeping. <root>/published.json names the entry a
+    multi-worker deployment's workers should serve (see publish()), and
+    <root>/latest.json the newest entry per lineage (see set_latest()).
+    """
+
+    PUBLISHED_FILE = "published.json"
+    LATEST_FILE = "latest.json"
+
+    def __init__(self, root="models"):
+        self.root = root
+
+    def _dir(self, fingerprint):
+        return os.path.join(self.root, fingerprint)
+
+    def load(self, fingerprint):
+        path = self._dir(fingerprint)
+        try:
+            with open(os.path.join(path, "manifest.json"), "rb") as f:
+                manifest = loads(f.read())
+            models = joblib.load(os.path.join(path, "models.joblib"))
+        except (OSError, ValueError, EOFError):
+            return None
+        state = dict(manifest["state"])
+        state["models"] = models
+        return state
+
+    def save(self, fingerprint, state):
+        path = self._dir(fingerprint)
+        os.makedirs(path, exist_ok=True)
+        models = state["models"]
+        manifest = {
+            "fingerprint": fingerprint,
+            "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "models": sorted(models),
+            "state": {k: v for k, v in state.items() if k != "models"},
+        }
+        # Write to temp names first so a crash never leaves a half-written entry
+        joblib.dump(models, os.path.join(path, "models.joblib.tmp"))
+        with open(os.path.join(path, "manifest.json.tmp"), "wb") as f:
+            f.write(dumps(manifest))
+        os.replace(os.path.join(path, "models.joblib.tmp"), os.path.join(path, "models.joblib"))
+        os.replace(os.path.join(path, "manifest.json.tmp"), os.path.join(path, "manifest.json"))
+
+    def remove(self, fingerprint):
+        shutil.rmtree(self._dir(fingerprint), ignore_errors=True)
+
+    def publish(self, key, tag=None):
+        """
+        Point readers at entry `key`. Each publish gets the next version number;
+        `tag` lets readers ignore a pointer left by another deployment.
+        """
+        current = self.published() or {}
+        record = {
+            "key": key,
+            "version": current.get("version", 0) + 1,
+            "tag": tag,
+            "published_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, self.PUBLISHED_FILE)
+        with open(f"{path}.tmp-{os.getpid()}", "w") as f:
+            json.dump(record, f)
+        os.replace(f"{path}.tmp-{os.getpid()}", path)
+        return record
+
+    def set_latest(self, lineage, key):
+        """
+        Record `key` as the newest entry of `lineage` (models trained by the same
+        code and settings), which a later run on changed data can start from.
+        """
+        latest = self._read_json(self.LATEST_FILE) or {}
+        latest[lineage] = key
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, self.LATEST_FILE)
+        with open(f"{path}.tmp-{os.getpid()}", "w") as f:
+            json.dump(latest, f)
+        os.replace(f"{path}.tmp-{os.getpid()}", path)
+
+    def latest(self, lineage):
+        return (self._read_json(self.LATEST_FILE) or {}).get(lineage)
+
+    def _read_json(self, name):
+        try:
+            with open(os.path.join(self.root, name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def published(self):
+        return self._read_json(self.PUBLISHED_FILE)
+
+
+class TrainingJob:
+    """
+    Loads models for the current data from the registry, or trains them in a
+    background thread and stores the result. `status()` backs the readiness endpoint.
+
+    With `publish_tag` set the job is a multi-worker coordinator: the models it ends
+    up with are also published under that tag for ModelSubscribers to pick up.
+
+    With `lineage` and `reuse_fn` set, a registry miss (the data changed) first
+    tries the newest entry of that lineage: reuse_fn(state) returns models brought
+    up to date incrementally, or None when a full retrain is needed.
+    """
+
+    def __init__(self, registry, build_fn, fingerprint_fn, on_ready, publish_tag=None,
+                 lineage=None, reuse_fn=None):
+        self.registry = registry
+        self.build_fn = build_fn
+        self.fingerprint_fn = fingerprint_fn
+        self.on_ready = on_ready
+        self.publish_tag = publish_tag
+        self.lineage = lineage
+        self.reuse_fn = reuse_fn
+        self.state = "idle"
+        self.source = None
+        self.fingerprint = None
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self.state = "running"
+            self.error = None
+            self.started_at = time.time()
+            self.finished_at = None
+            self._thread = threading.Thread(target=self._run, name="model-training", daemon=True)
+            self._thread.start()
+            return True
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            self.fingerprint = key = self.fingerprint_fn()
+            state = self.registry.load(self.fingerprint)
+            if state is not None:
+                self.source = "registry"
+                ml = self.build_fn(state)
+            else:
+                ml = self._reuse()
+                self.source = "refreshed" if ml is not None else "trained"
+                if ml is None:
+                    ml = self.build_fn(None)
+                # Don't pin a run where some model timed out or failed; retry on next start
+                if getattr(ml, "complete", True):
+                    self.registry.save(self.fingerprint, ml.export_state())
+                    if self.lineage is not None:
+                        self.registry.set_latest(self.lineage, self.fingerprint)
+                elif self.publish_tag is not None:
+                    # Workers still need it on disk; a "-partial" key never matches a lookup
+                    key = f"{self.fingerprint}-partial"
+                    self.registry.save(key, ml.export_state())
+            if self.publish_tag is not None:
+                self.registry.publish(key, tag=self.publish_tag)
+            self.on_ready(ml)
+            self.state = "ready"
+        except Exception as e:
+            self.error = str(e)
+            self.state = "failed"
+            print(f"Error preparing ML models: {e}")
+        finally:
+            self.finished_at = time.time()
+
+    def _reuse(self):
+        if self.lineage is None or self.reuse_fn is None:
+            return None
+        key = self.registry.latest(self.lineage)
+        state = self.registry.load(key) if key is not None else None
+        if state is None:
+            return None
+        return self.reuse_fn(state)
+
+    def status(self):
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.finished_at or time.time()) - self.started_at, 3)
+        return {
+            "state": self.state,
+            "ready": self.ready,
+            "source": self.source,
+            "fingerprint": self.fingerprint,
+            "elapsed_seconds": elapsed,
+            "error": self.error,
+        }
+
+
+class ModelSubscriber:
+    """
+    Worker side of a multi-worker deployment: never trains. Polls the registry's
+    published pointer and loads each new version the coordinator publishes under
+    `tag`. Same interface as TrainingJob (ready, state, start(), status()).
+    """
+
+    def __init__(self, registry, build_fn, on_ready, tag, interval=2.0):
+        self.registry = registry
+        self.build_fn = build_fn
+        self.on_ready = on_ready
+        self.tag = tag
+        self.interval = interval
+        self.state = "waiting"
+        self.source = "published"
+        self.fingerprint = None
+        self.version = None
+        self.error = None
+        self.started_at = None
+        self.loaded_at = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.version is not None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._poll, name="model-subscriber", daemon=True)
+            self._thread.start()
+            return True
+
+    def _poll(self):
+        while True:
+            self.check()
+            time.sleep(self.interval)
+
+    def check(self):
+        """Load the published models if there's a new version for our tag. Returns True if loaded."""
+        record = self.registry.published()
+        if record is None or record.get("tag") != self.tag or record["version"] == self.version:
+            return False
+        state = self.registry.load(record["key"])
+        if state is None:
+            self.error = f"published models '{record['key']}' not found"
+            return False
+        try:
+            ml = self.build_fn(state)
+        except Exception as e:
+            self.error = str(e)
+            print(f"Error loading published ML models: {e}")
+            return False
+        self.on_ready(ml)
+        self.fingerprint, self.version = record["key"], record["version"]
+        self.error = None
+        self.loaded_at = time.time()
+        self.state = "ready"
+        return True
+
+    def status(self):
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.loaded_at or time.time()) - self.started_at, 3)
+        return {
+            "state": self.state,
+            "ready": self.ready,
+            "source": self.source,
+            "fingerprint": self.fingerprint,
+            "version": self.version,
+            "elapsed_seconds": elapsed,
+            "error": self.error,
+        }
@@ -0,0 +1,105 @@
+import inspect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Leaf frames of threads that are parked rather than doing work
+_IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("base_events.py", "_run_once"),
+}
+
+
+def _label(code):
+    parts = code.co_filename.replace("\\", "/").split("/")
+    return f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Low-overhead statistical profiler for a single request: a background thread
+    snapshots every thread's Python stack each `interval` seconds.
+
+    `report(endpoint)` keeps the samples that belong to the request - stacks running
+    the endpoint function (sync handlers run in the threadpool) plus non-idle samples
+    of the thread that started the profiler (the event loop).
+    """
+
+    def __init__(self, interval=0.001, max_depth=128):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._samples = Counter()  # (thread id, stack of code objects root->leaf) -> count
+        self._stop = threading.Event()
+        self._thread = None
+        self._owner = None
+        self.started_at = None
+        self.elapsed = 0.0
+
+    def start(self):
+        self._owner = threading.get_ident()
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started_at
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                self._samples[(tid, tuple(reversed(stack)))] += 1
+
+    def _keep(self, tid, stack, target):
+        if not stack:
+            return False
+        if target is not None and target in stack:
+            return True
+        leaf = stack[-1]
+        idle = (os.path.basename(leaf.co_filename), leaf.co_name) in _IDLE_LEAVES
+        return tid == self._owner and not idle
+
+    def report(self, endpoint=None, top=30, top_stacks=15):
+        target = getattr(inspect.unwrap(endpoint), "__code__", None) if endpoint is not None else None
+        own, total, collapsed = Counter(), Counter(), Counter()
+        n = 0
+        for (tid, stack), count in self._samples.items():
+            if not self._keep(tid, stack, target):
+                continue
+            n += count
+            own[stack[-1]] += count
+            for code in set(stack):
+                total[code] += count
+            collapsed[";".join(_label(c) for c in stack)] += count
+
+        def pct(count):
+            return round(100.0 * count / n, 1) if n else 0.0
+
+        functions = [
+            {"function": _label(code), "self": own[code], "total": count,
+             "self_pct": pct(own[code]), "total_pct": pct(count)}
+            for code, count in total.most_common(top)
+        ]
+        return {
+            "interval_ms": self.interval * 1000,
+            "wall_ms": round(self.elapsed * 1000, 3),
+            "samples": n,
+            "functions": functions,
+            "hot_self": [{"function": _label(code), "samples": count, "pct": pct(count)}
+                         for code, count in own.most_common(top)],
+            # Collapsed-stack lines, loadable by flamegraph.pl / speedscope
+            "collapsed": [f"{stack} {count}" for stack, count in collapsed.most_common(top_stacks)],
+        }
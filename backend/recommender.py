@@ -0,0 +1,216 @@
+import importlib.util
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from startup import LazyModule
+
+# SciPy comes with scikit-learn and loads on first use like it; without it
+# /api/recommend reports it's unavailable
+sp = LazyModule("scipy.sparse") if importlib.util.find_spec("scipy") is not None else None
+
+METRICS = ("cosine", "count")
+
+
+class _Vocabulary:
+    """Dense 0..n-1 position per entity ID, growing as new IDs arrive (positions never change)."""
+
+    def __init__(self):
+        self.index = pd.Index([], dtype=object)
+
+    def __len__(self):
+        return len(self.index)
+
+    def positions(self, ids, add=True):
+        ids = pd.Index(pd.Series(ids).astype(str))
+        if add:
+            new = ids.difference(self.index)
+            if len(new):
+                self.index = self.index.append(pd.Index(new.unique(), dtype=object))
+        return self.index.get_indexer(ids)
+
+
+class CoOccurrenceIndex:
+    """
+    "Prescribed together" neighbours per medicine.
+
+    Prescriptions form a sparse binary customer x medicine matrix X; the item-item
+    co-occurrence matrix is C = X.T @ X, whose entry (i, j) is the number of
+    customers prescribed both i and j (the diagonal: customers per medicine).
+    Cosine similarity is C[i, j] / sqrt(C[i, i] * C[j, j]). The top `k`
+    neighbours of each medicine by both measures are kept in a dict, so a lookup
+    is a dict access.
+
+    The first build is one sparse product. After that X is kept as each
+    customer's sorted basket of medicines and C as one sorted (columns, counts)
+    row per medicine, so add() only touches what new prescriptions change: a
+    customer who gets new medicines N on top of a basket B adds 1 to C over
+    N x (B + N) and B x N. Only medicines whose row of C changed, or whose top-k
+    lists hold a medicine with a new customer, get their neighbours re-ranked. X is
+    binary, so rows that are already counted change nothing.
+    """
+
+    def __init__(self, k=20):
+        self.k = k
+        self.customers = _Vocabulary()
+        self.medicines = _Vocabulary()
+        self.baskets = None
+        self.rows = []
+        self.diag = np.zeros(0, dtype=np.int64)
+        self.pairs = 0
+        self.neighbors = {}
+        # Columns in either of each medicine's top-k lists
+        self._listed = {}
+        self.prescriptions = 0
+        self.rebuilds = {"full": 0, "incremental": 0, "reranked": 0}
+        self._lock = threading.RLock()
+
+    @property
+    def ready(self):
+        return self.baskets is not None
+
+    def ensure(self, load):
+        """
+        Build the index from `load()` (every prescription) unless it's built. The
+        rows are read under the lock, so a concurrent add() either waits for the
+        build or finds no index yet and leaves its rows to the build.
+        """
+        if self.baskets is None:
+            with self._lock:
+                if self.baskets is None:
+                    self._build(load())
+                    self.rebuilds["full"] += 1
+        return self
+
+    @contextmanager
+    def appending(self):
+        """
+        Hold while appending prescriptions to the source and passing them to add(),
+        so a build can't load them in between and have add() count them again.
+        """
+        with self._lock:
+            yield
+
+    def add(self, prescriptions):
+        """Fold new prescription rows (customer_id, medicine_id) into a built index."""
+        with self._lock:
+            if self.baskets is None:
+                return
+            self._add(prescriptions)
+            self.rebuilds["incremental"] += 1
+
+    def _positions(self, prescriptions):
+        rows = prescriptions[["customer_id", "medicine_id"]].dropna()
+        self.prescriptions += len(rows)
+        c = self.customers.positions(rows["customer_id"])
+        m = self.medicines.positions(rows["medicine_id"])
+        return c, m
+
+    def _build(self, prescriptions):
+        c, m = self._positions(prescriptions)
+        shape = (len(self.customers), len(self.medicines))
+        X = sp.csr_matrix((np.ones(len(c)), (c, m)), shape=shape)
+        X.sum_duplicates()
+        X.data[:] = 1.0
+        C = (X.T @ X).tocsr()
+        C.sort_indices()
+        self.baskets = np.split(X.indices.astype(np.int64), X.indptr[1:-1])
+        self.rows = list(zip(np.split(C.indices.astype(np.int64), C.indptr[1:-1]),
+                             np.split(C.data.astype(np.int64), C.indptr[1:-1])))
+        self.diag = C.diagonal().astype(np.int64)
+        self.pairs = int(C.nnz)
+        self._rerank(np.arange(shape[1]))
+
+    def _add(self, prescriptions):
+        c, m = self._positions(prescriptions)
+        empty = np.zeros(0, dtype=np.int64)
+        self.baskets.extend(empty for _ in range(len(self.customers) - len(self.baskets)))
+        grown = len(self.medicines) - len(self.rows)
+        self.rows.extend((empty, empty) for _ in range(grown))
+        self.diag = np.concatenate([self.diag, np.zeros(grown, dtype=np.int64)])
+
+        # Entries of C to increment, per row, and the medicines with a new customer
+        updates, grew = {}, set()
+        order = np.argsort(c, kind="stable")
+        c, m = c[order], m[order]
+        bounds = np.flatnonzero(np.diff(c)) + 1
+        for customer, meds in zip(c[np.r_[0, bounds]] if len(c) else [], np.split(m, bounds)):
+            basket = self.baskets[customer]
+            new = np.setdiff1d(meds, basket)
+            if not len(new):
+                continue
+            merged = np.union1d(basket, new)
+            self.baskets[customer] = merged
+            grew.update(new.tolist())
+            for i in new.tolist():
+                updates.setdefault(i, []).append(merged)
+            for i in basket.tolist():
+                updates.setdefault(i, []).append(new)
+        if not grew:
+            return
+
+        for i, parts in updates.items():
+            cols, counts = self.rows[i]
+            add_cols, add_counts = np.unique(np.concatenate(parts), return_counts=True)
+            merged = np.union1d(cols, add_cols)
+            values = np.zeros(len(merged), dtype=np.int64)
+            values[np.searchsorted(merged, cols)] += counts
+            values[np.searchsorted(merged, add_cols)] += add_counts
+            self.pairs += len(merged) - len(cols)
+            self.rows[i] = (merged, values)
+            pos = np.searchsorted(merged, i)
+            if pos < len(merged) and merged[pos] == i:
+                self.diag[i] = values[pos]
+
+        # Rows whose counts changed are re-ranked. Elsewhere only the norm of a
+        # medicine with a new customer changed, which lowers its cosine with the
+        # others: that only matters where it's listed (ranked, or its cosine shown)
+        affected = set(updates)
+        for a in grew:
+            for i in self.rows[a][0].tolist():
+                if i not in affected and a in self._listed.get(i, ()):
+                    affected.add(i)
+        self._rerank(np.fromiter(sorted(affected), dtype=np.int64))
+
+    def _rerank(self, medicines):
+        """Recompute the top-k lists of `medicines` from their rows of C."""
+        norms = np.sqrt(np.maximum(self.diag, 1e-12))
+        for i in medicines.tolist():
+            cols, counts = self.rows[i]
+            other = cols != i
+            cols, counts = cols[other], counts[other]
+            cosine = counts / (norms[i] * norms[cols])
+            self.neighbors[i] = {
+                "customers": int(self.diag[i]),
+                "cosine": _top(cols, cosine, cosine, counts, self.k),
+                "count": _top(cols, counts, cosine, counts, self.k),
+            }
+            self._listed[i] = {j for metric in METRICS for j, _, _ in self.neighbors[i][metric]}
+        self.rebuilds["reranked"] += len(medicines)
+    def recommend(self, medicine_id, n=10, metric="cosine"):
+        """
+        (customers prescribed `medicine_id`, its top `n` neighbours by `metric` as
+        (medicine_id, cosine, customers prescribed both)), or None if it's unknown.
+        """
+        pos = self.medicines.index.get_indexer([str(medicine_id)])[0]
+        entry = self.neighbors.get(pos) if pos >= 0 else None
+        if entry is None:
+            return None
+        ids = self.medicines.index
+        return entry["customers"], [(ids[j], cosine, together) for j, cosine, together in entry[metric][:n]]
+
+    def status(self):
+        return {
+            "ready": self.ready, "k": self.k, "prescriptions": self.prescriptions,
+            "customers": len(self.customers), "medicines": len(self.medicines),
+            "nonzero_pairs": self.pairs,
+            "rebuilds": dict(self.rebuilds),
+        }
+
+
+def _top(cols, score, cosine, counts, k):
+    """(column, cosine, count) of the k highest `score` entries, best first (ties: lower column)."""
+    order = np.lexsort((cols, -score))[:k]
+    return [(int(c), round(float(s), 4), int(n)) for c, s, n in zip(cols[order], cosine[order], counts[order])]
@@ -0,0 +1,130 @@
+import asyncio
+import contextvars
+import functools
+import importlib
+import inspect
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import (RENDER_COALESCED, RENDER_PENDING, RENDER_REJECTED, RENDER_TIMEOUTS,
+                     collect_stages, record_stage, stage)
+from serialization import dumps
+
+
+class Overloaded(Exception):
+    """Every slot of the render pool is taken."""
+
+
+def _init_process():
+    # Render processes import the app like a worker would (mapping the shared
+    # snapshot), but never train models or serve HTTP
+    os.environ["PHARMACY_ROLE"] = "render"
+    importlib.import_module("app").warm_up(background=False)
+
+
+def _call_in_process(module, name, args, kwargs):
+    func = inspect.unwrap(getattr(importlib.import_module(module), name))
+    with collect_stages() as stages:
+        body = _render(func, args, kwargs)
+    return body, stages
+
+
+def render_json(content):
+    """Serialize an endpoint's return value in one pass (numpy arrays included)."""
+    with stage("serialize"):
+        return dumps(content)
+
+
+def _render(func, args, kwargs):
+    return render_json(func(*args, **kwargs))
+
+
+class RenderPool:
+    """
+    Bounded executor for cached chart computations (handler + JSON serialization).
+
+    Identical concurrent requests share one computation (single flight): the
+    first caller starts it, later ones await the same future. At most
+    `max_pending` distinct computations are queued or running; past that,
+    run() raises Overloaded so the caller can shed load instead of queueing.
+    Callers wait at most `timeout` seconds, but the computation itself carries
+    on and hands its result to `done`, so a retry finds it cached.
+
+    Work runs in `threads` threads, or, with `processes` > 0, in a process pool.
+    Process workers import the app themselves, so they only see the same data
+    when it comes from a shared, read-only snapshot (serve.py).
+    """
+
+    def __init__(self, threads=4, processes=0, max_pending=64, timeout=30.0):
+        self.threads = threads
+        self.processes = processes
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._threads = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="render")
+        self._processes = None
+        self._inflight = {}
+
+    def start(self):
+        """Spawn the render processes now rather than on the first request."""
+        if self.processes > 0 and self._processes is None:
+            self._processes = ProcessPoolExecutor(
+                max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process)
+            for _ in range(self.processes):
+                self._processes.submit(os.getpid)
+
+    def shutdown(self):
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+            self._processes = None
+
+    async def run(self, key, func, args=(), kwargs=None, done=None):
+        """
+        Rendered body of func(*args, **kwargs), and whether it was shared with an
+        earlier identical call. Must be called from the event loop.
+        """
+        future = self._inflight.get(key)
+        shared = future is not None
+        if shared:
+            RENDER_COALESCED.labels().inc()
+        else:
+            if len(self._inflight) >= self.max_pending:
+                RENDER_REJECTED.labels().inc()
+                raise Overloaded(f"{len(self._inflight)} computations pending")
+            future = asyncio.ensure_future(self._compute(func, args, kwargs or {}))
+            self._inflight[key] = future
+            RENDER_PENDING.labels().inc()
+            future.add_done_callback(functools.partial(self._finished, key, done))
+        try:
+            # shield: a caller timing out mustn't cancel the work others are waiting on
+            body = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            RENDER_TIMEOUTS.labels().inc()
+            raise
+        return body, shared
+
+    def _finished(self, key, done, future):
+        self._inflight.pop(key, None)
+        RENDER_PENDING.labels().dec()
+        if done is not None and not future.cancelled() and future.exception() is None:
+            done(future.result())
+
+    async def _compute(self, func, args, kwargs):
+        loop = asyncio.get_running_loop()
+        if self.processes > 0:
+            self.start()
+            try:
+                body, stages = await loop.run_in_executor(
+                    self._processes, _call_in_process, func.__module__, func.__name__, args, kwargs)
+            except BrokenProcessPool as e:
+                print(f"Warning: render process died ({e}); restarting the pool")
+                self.shutdown()
+            else:
+                for name, elapsed in stages.items():
+                    record_stage(name, elapsed)
+                return body
+        # The copied context carries the request's stage timings into the thread
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(self._threads, ctx.run, _render, func, args, kwargs)
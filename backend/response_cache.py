@@ -0,0 +1,144 @@
+import hashlib
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+
+import asyncio
+
+from fastapi import HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+
+from metrics import profiling
+from render_pool import Overloaded, render_json
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of rendered endpoint responses.
+    Entries are (body bytes, etag) so a hit skips both the computation and serialization.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def store(self, key, body):
+        """Cache a rendered body (with its ETag) and return the entry."""
+        entry = (body, _etag(body))
+        self.put(key, entry)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def cache_key(path, params, version):
+    """Key of a GET response: path, query parameters in any order, data version."""
+    return (path, tuple(sorted(params)), version)
+
+
+def _etag(body):
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in header.split(",")]
+    return any(tag == etag or tag == "W/" + etag for tag in tags)
+
+
+def cached_endpoint(cache, version_fn, *tables, pool):
+    """
+    Memoize a GET handler keyed by path + query parameters + the versions of `tables`.
+
+    The wrapped handler gets an injected `request` parameter (unless it already takes one)
+    so the key and If-None-Match can be read. Responses carry an ETag and
+    `Cache-Control: no-cache`, so browsers revalidate and get a 304 when nothing changed.
+
+    The wrapper is async: hits are answered on the event loop, misses are computed
+    in `pool` (a RenderPool), coalesced with identical requests already in progress.
+    A full pool answers 503 with Retry-After and a slow computation 504.
+    """
+    def decorator(func):
+        sig = inspect.signature(func)
+        inject_request = "request" not in sig.parameters
+        if inject_request:
+            params = list(sig.parameters.values()) + [
+                inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+            ]
+            sig = sig.replace(parameters=params)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            request = kwargs.pop("request") if inject_request else kwargs["request"]
+            if profiling():
+                # Profiled requests always run the handler (in this process) and stay out of the cache
+                body = await run_in_threadpool(lambda: render_json(func(*args, **kwargs)))
+                return Response(content=body, media_type="application/json")
+            key = cache_key(request.url.path, request.query_params.multi_items(), version_fn(tables))
+
+            entry = cache.get(key)
+            status = "HIT"
+            if entry is None:
+                try:
+                    body, shared = await pool.run(key, func, args, kwargs,
+                                                  done=lambda body: cache.store(key, body))
+                except Overloaded:
+                    raise HTTPException(status_code=503, detail="Server busy, retry shortly",
+                                        headers={"Retry-After": "1"})
+                except asyncio.TimeoutError:
+                    raise HTTPException(status_code=504, detail=f"Timed out after {pool.timeout:g}s; "
+                                                                "the result is cached once it finishes")
+                status = "COALESCED" if shared else "MISS"
+                entry = (body, _etag(body))
+
+            body, etag = entry
+            headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Cache": status}
+            if _etag_matches(request.headers.get("if-none-match"), etag):
+                return Response(status_code=304, headers=headers)
+            return Response(content=body, media_type="application/json", headers=headers)
+
+        wrapper.__signature__ = sig
+        # Lets callers outside a request (e.g. /api/dashboard) build the same cache key
+        wrapper.cache_tables = tables
+        return wrapper
+    return decorator
@@ -0,0 +1,108 @@
+import base64
+import numpy as np
+import pandas as pd
+import orjson
+from fastapi.responses import JSONResponse
+
+from metrics import stage
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+# numpy dtype -> plotly.js typed-array dtype code
+_TYPED_ARRAY_CODES = {
+    "float64": "f8", "float32": "f4",
+    "int32": "i4", "int16": "i2", "int8": "i1",
+    "uint32": "u4", "uint16": "u2", "uint8": "u1",
+}
+
+# Short arrays stay plain JSON lists; base64 only pays off for longer ones
+_MIN_TYPED_LENGTH = 16
+
+
+def _default(obj):
+    """Fallback for values orjson can't encode natively."""
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind == "M":
+            return np.datetime_as_string(obj, unit="s").tolist()
+        return obj.tolist()
+    if isinstance(obj, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(obj).isoformat()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return obj.tolist()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj):
+    """Single-pass JSON encoding with numpy support (NaN/inf become null)."""
+    return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+
+
+def loads(data):
+    return orjson.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """Default response class: renders with `dumps` instead of the stdlib encoder."""
+
+    def render(self, content):
+        with stage("serialize"):
+            return dumps(content)
+
+
+def _narrow(arr):
+    """Smallest plotly.js dtype that holds the values exactly (keeps base64 payloads short)."""
+    if arr.dtype.kind == "f":
+        finite = arr[np.isfinite(arr)]
+        if len(finite) == len(arr) and np.array_equal(finite, np.round(finite)):
+            arr = arr.astype(np.int64)
+        elif np.array_equal(arr.astype(np.float32).astype(arr.dtype), arr, equal_nan=True):
+            return arr.astype(np.float32)
+        else:
+            return arr.astype(np.float64)
+    if arr.dtype.kind in "iu":
+        lo, hi = (int(arr.min()), int(arr.max())) if len(arr) else (0, 0)
+        for dtype in (np.int8, np.int16, np.int32):
+            info = np.iinfo(dtype)
+            if info.min <= lo and hi <= info.max:
+                return arr.astype(dtype)
+        return arr.astype(np.float64)
+    return arr
+
+
+def typed_array(arr):
+    """
+    Encode a numeric array in plotly.js's base64 typed-array form
+    ({"dtype": "f8", "bdata": ...}); returns None when it can't be represented.
+    """
+    if arr.ndim != 1 or len(arr) < _MIN_TYPED_LENGTH or arr.dtype.kind not in "iuf":
+        return None
+    arr = _narrow(arr)
+    code = _TYPED_ARRAY_CODES.get(arr.dtype.name)
+    if code is None:
+        return None
+    data = np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder("<"))
+    return {"dtype": code, "bdata": base64.b64encode(data.tobytes()).decode("ascii")}
+
+
+def _encode_arrays(value):
+    if isinstance(value, np.ndarray):
+        encoded = typed_array(value)
+        return value if encoded is None else encoded
+    if isinstance(value, dict):
+        return {k: _encode_arrays(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode_arrays(v) for v in value]
+    return value
+
+
+def figure_payload(fig):
+    """
+    Plotly figure -> JSON-ready dict without the to_json()/json.loads round trip.
+    Numeric trace arrays are shipped as base64 typed arrays; everything else is left
+    for `dumps` to encode.
+    """
+    spec = fig.to_plotly_json()
+    spec["data"] = [_encode_arrays(trace) for trace in spec["data"]]
+    return spec
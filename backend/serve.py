@@ -0,0 +1,55 @@
+"""
+Multi-worker serving: N API workers sharing one copy of the data, one model owner.
+
+    python serve.py --workers 4 --port 8000
+
+This process is the coordinator. It loads the tables once and writes them as an
+Arrow snapshot under data/.cache/snapshots/<fingerprint>/ (reused while the data
+is unchanged). It then maps that snapshot itself and trains the models, or
+restores them from the registry, and publishes them in models/published.json.
+The uvicorn workers map the same snapshot read-only, so the column buffers sit
+in the page cache once however many workers run. They load the published
+models instead of training their own.
+
+The snapshot is read-only: /api/ingest answers 409 and the CSVs aren't tailed.
+Restart to pick up new data. Only the pandas backend is shared this way. With
+--workers 1 uvicorn serves from this process, which is then also the worker.
+"""
+import argparse
+import gc
+import os
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    from data_backend import create_backend
+    from data_cache import CACHE_DIRNAME, DATA_FILES
+    from shared_snapshot import SNAPSHOT_DIRNAME, write_snapshot
+
+    data_dir = os.environ.get("PHARMACY_DATA_DIR", "data")
+    backend = create_backend("pandas", data_dir, DATA_FILES)
+    snapshot = write_snapshot(backend.data, os.path.join(data_dir, CACHE_DIRNAME, SNAPSHOT_DIRNAME),
+                              fact=backend.sales_fact())
+    # The coordinator keeps only the mapped copy from here on
+    del backend
+    gc.collect()
+    print(f"Serving snapshot {snapshot}")
+
+    os.environ["PHARMACY_SNAPSHOT"] = os.path.abspath(snapshot)
+    os.environ["PHARMACY_ROLE"] = "coordinator"
+    import app
+    app.TRAINING_JOB.start()
+
+    # Workers inherit the environment when uvicorn spawns them
+    os.environ["PHARMACY_ROLE"] = "worker"
+    import uvicorn
+    uvicorn.run("app:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
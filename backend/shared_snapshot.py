@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import shutil
+import pandas as pd
+
+# Arrow is optional for the API, but shared snapshots are Arrow IPC files
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+from model_registry import data_fingerprint
+
+SNAPSHOT_DIRNAME = "snapshots"
+# Bump when the on-disk layout changes
+FORMAT_VERSION = 1
+FACT_FILE = "sales_fact"
+
+# Plain string columns come back Arrow-backed, so they stay in the mapped buffers
+# instead of becoming one Python object per row in every worker
+_TYPES = {} if pa is None else {pa.string(): pd.StringDtype("pyarrow")}
+
+
+def _arrow_table(df):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # from_pandas turns NaN into nulls, and a column with nulls is copied when it's
+    # read back. Stored as plain IEEE NaN the float buffer maps straight to numpy.
+    for i, col in enumerate(df.columns):
+        if df[col].dtype.kind == "f":
+            table = table.set_column(i, table.field(i), pa.array(df[col].to_numpy(), from_pandas=False))
+    return table
+
+
+def _write(table, path):
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _read(path):
+    # Buffers point into the mapping (no read, no copy); split_blocks keeps pandas
+    # from consolidating same-dtype columns into a freshly allocated 2-D block
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    return table.to_pandas(split_blocks=True, types_mapper=_TYPES.get)
+
+
+def write_snapshot(data, root, fact=None):
+    """
+    Write every table as an uncompressed Arrow IPC file under root/<fingerprint>/.
+
+    The fingerprint covers the table contents, so an unchanged dataset reuses the
+    snapshot already on disk. Only the attribute columns of `fact` are written;
+    its SalesBills columns are the sales_bills file. Returns the snapshot directory.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is required for shared snapshots")
+    fingerprint = data_fingerprint(data, sorted(data), salt=f"snapshot-v{FORMAT_VERSION}")
+    path = os.path.join(root, fingerprint)
+    if os.path.exists(os.path.join(path, "manifest.json")):
+        return path
+
+    tmp = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, df in data.items():
+        _write(_arrow_table(df), os.path.join(tmp, f"{name}.arrow"))
+    fact_columns = []
+    if fact is not None:
+        sales = data.get("sales_bills", pd.DataFrame())
+        fact_columns = [c for c in fact.columns if c not in sales.columns]
+        _write(_arrow_table(fact[fact_columns]), os.path.join(tmp, f"{FACT_FILE}.arrow"))
+    manifest = {
+        "fingerprint": fingerprint,
+        "format": FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "tables": {name: len(df) for name, df in data.items()},
+        "fact_columns": fact_columns if fact is not None else None,
+    }
+    with open(os.path.join(tmp, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        # Another process published the same snapshot first
+        shutil.rmtree(tmp, ignore_errors=True)
+    prune_snapshots(root, keep=fingerprint)
+    return path
+
+
+def prune_snapshots(root, keep):
+    """Remove older snapshots. Processes still mapping one keep their pages until they exit."""
+    for entry in os.listdir(root):
+        if entry != keep and ".tmp-" not in entry:
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+
+
+def open_snapshot(path):
+    """
+    Map a snapshot read-only. Returns (tables, the fact's attached columns or None,
+    manifest); snapshot_fact() joins the latter back onto sales_bills.
+
+    Numeric, datetime and dictionary-encoded columns are numpy/Categorical views of
+    the mapped file, so every process opening the same snapshot shares one copy of
+    them through the page cache. Treat the frames as read-only.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is required for shared snapshots")
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    data = {name: _read(os.path.join(path, f"{name}.arrow")) for name in manifest["tables"]}
+    attached = None
+    if manifest["fact_columns"] is not None:
+        attached = _read(os.path.join(path, f"{FACT_FILE}.arrow"))
+    return data, attached, manifest
+
+
+def snapshot_fact(sales, attached, ids):
+    """
+    The sales fact table: `sales` columns plus the snapshot's attached ones, with
+    ID columns moved onto the shared dictionaries. Nothing is copied.
+    """
+    columns = {c: sales[c] for c in sales.columns}
+    columns.update({c: ids.encode_column(attached[c]) for c in attached.columns})
+    return pd.DataFrame(columns, copy=False)
+
+
+def mapped_bytes(path):
+    """Size of the snapshot's column files, i.e. the memory shared between processes."""
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path) if f.endswith(".arrow"))
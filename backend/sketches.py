@@ -0,0 +1,340 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from indexes import FILTER_COLUMNS
+
+# Distribution charts served from per-group summaries instead of raw rows. Each
+# group keeps a quantile sketch (box plots) and fixed-width bin counts
+# (histograms), both mergeable, so a chart merges the groups it needs and ships
+# O(groups) numbers. Groups are the finest grain the filters can select: the key
+# columns plus, for tables with a date, a time slice (`period`, pandas alias).
+SUMMARY_SPECS = {
+    "stock_units": {
+        "table": "stocks", "column": "available_units", "bin_width": 5,
+        "keys": ["shop_id"], "date": "last_updated", "period": "Y",
+    },
+    "purchase_cost": {
+        "table": "purchases", "column": "cost_price", "bin_width": 20,
+        "keys": ["shop_id"], "date": "purchase_date", "period": "Y",
+    },
+    "shop_ratings": {
+        "table": "pharmacy", "column": "rating", "bin_width": 0.2,
+        "keys": ["shop_id", "location"],
+    },
+    "customer_age": {
+        "table": "customers", "column": "age", "bin_width": 5,
+        "keys": [],
+    },
+}
+
+# Group key column holding the start of each row's time slice
+PERIOD = "_period"
+
+
+class QuantileSketch:
+    """
+    KLL-style mergeable quantile sketch. Values enter level 0; a level holding
+    more than `k` items is sorted and every other item moves up a level with
+    twice the weight. Until the first compaction the sketch holds every value and
+    its quantiles are exact (numpy's linear interpolation, as plotly uses for
+    box plots). After that the rank error is roughly 1/k per level.
+    """
+
+    def __init__(self, k=256):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        # Alternates which half a compaction keeps, so results are reproducible
+        self._flip = 0
+
+    @property
+    def exact(self):
+        return len(self.levels) == 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return self
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Fold `other` into this sketch (`other` is left unchanged)."""
+        if other.count == 0:
+            return self
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        for i, items in enumerate(other.levels):
+            if i == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[i] = np.concatenate([self.levels[i], items])
+        self._compress()
+        return self
+
+    @classmethod
+    def merged(cls, sketches, k=256):
+        """One sketch over all of `sketches`, compacting once at the end."""
+        out = cls(k)
+        parts = []
+        for s in sketches:
+            if s.count == 0:
+                continue
+            out.count += s.count
+            out.total += s.total
+            out.min = min(out.min, s.min)
+            out.max = max(out.max, s.max)
+            for i, items in enumerate(s.levels):
+                if i == len(parts):
+                    parts.append([])
+                parts[i].append(items)
+        if parts:
+            out.levels = [np.concatenate(p) for p in parts]
+            out._compress()
+        return out
+
+    def _compress(self):
+        i = 0
+        while i < len(self.levels):
+            items = self.levels[i]
+            if len(items) > self.k:
+                items = np.sort(items)
+                # An odd item out stays at this level so the total weight is unchanged
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                even = items[:len(items) - len(keep)]
+                promoted = even[self._flip::2]
+                self._flip ^= 1
+                self.levels[i] = keep
+                if i + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[i + 1] = np.concatenate([self.levels[i + 1], promoted])
+            i += 1
+
+    def items(self):
+        """Retained values (sorted) and the number of inputs each stands for."""
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2 ** i) for i, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        return values[order], weights[order]
+
+    def quantiles(self, qs):
+        qs = np.asarray(qs, dtype=np.float64)
+        if self.count == 0:
+            return np.full(qs.shape, np.nan)
+        if self.exact:
+            return np.quantile(self.levels[0], qs)
+        values, weights = self.items()
+        # Each retained item sits at the middle of the rank range it stands for
+        ranks = (np.cumsum(weights) - weights / 2) / self.count
+        return np.interp(qs, np.concatenate([[0.0], ranks, [1.0]]),
+                         np.concatenate([[self.min], values, [self.max]]))
+
+    def box(self, max_outliers=50):
+        """Box plot statistics with 1.5 IQR whiskers; outliers are capped to the most extreme."""
+        q1, median, q3 = self.quantiles([0.25, 0.5, 0.75])
+        lo, hi = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+        values, _ = self.items()
+        inside = values[(values >= lo) & (values <= hi)]
+        outliers = values[(values < lo) | (values > hi)]
+        if len(outliers) > max_outliers:
+            order = np.argsort(-np.abs(outliers - median), kind="stable")
+            outliers = np.sort(outliers[order[:max_outliers]])
+        return {
+            "q1": float(q1), "median": float(median), "q3": float(q3),
+            "lowerfence": float(inside.min()) if len(inside) else float(q1),
+            "upperfence": float(inside.max()) if len(inside) else float(q3),
+            "mean": self.total / self.count,
+            "outliers": outliers.tolist(),
+        }
+
+
+class BinCounts:
+    """Histogram over fixed-width bins aligned to multiples of `width`; merging adds counts."""
+
+    def __init__(self, width):
+        self.width = width
+        self.counts = {}
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        # Rounding first keeps 3.2 / 0.2 in bin 16 rather than 15.999...
+        bins, counts = np.unique(np.floor(np.round(values / self.width, 9)).astype(np.int64),
+                                 return_counts=True)
+        for b, c in zip(bins.tolist(), counts.tolist()):
+            self.counts[b] = self.counts.get(b, 0) + c
+        return self
+
+    def merge(self, other):
+        for b, c in other.counts.items():
+            self.counts[b] = self.counts.get(b, 0) + c
+        return self
+
+    def bars(self):
+        """(left edges, counts) of the non-empty bins in order."""
+        bins = sorted(self.counts)
+        return [round(b * self.width, 10) for b in bins], [self.counts[b] for b in bins]
+
+
+class Summary:
+    """Quantile sketch and bin counts of one group's values."""
+
+    def __init__(self, bin_width):
+        self.sketch = QuantileSketch()
+        self.bins = BinCounts(bin_width)
+
+    @property
+    def count(self):
+        return self.sketch.count
+
+    @property
+    def mean(self):
+        return self.sketch.total / self.sketch.count if self.sketch.count else float("nan")
+
+    def update(self, values):
+        self.sketch.update(values)
+        self.bins.update(values)
+        return self
+
+    @classmethod
+    def merged(cls, summaries, bin_width):
+        out = cls(bin_width)
+        out.sketch = QuantileSketch.merged([s.sketch for s in summaries])
+        for s in summaries:
+            out.bins.merge(s.bins)
+        return out
+
+
+def _group_columns(spec):
+    return spec["keys"] + ([PERIOD] if spec.get("period") else [])
+
+
+def summarize_frame(df, spec, by):
+    """{group key tuple: Summary} of `df[spec["column"]]` grouped by `by`; groups with no values are left out."""
+    by = list(by)
+    values = pd.to_numeric(df[spec["column"]], errors="coerce").to_numpy(dtype=np.float64)
+    if not by:
+        summary = Summary(spec["bin_width"]).update(values)
+        return {(): summary} if summary.count else {}
+    keys = df[[c for c in by if c != PERIOD]]
+    if PERIOD in by:
+        keys = keys.assign(**{PERIOD: df[spec["date"]].dt.to_period(spec["period"]).dt.start_time})
+    groups = keys.groupby(by, observed=True, sort=False).indices
+    out = {}
+    for key, positions in groups.items():
+        key = key if isinstance(key, tuple) else (key,)
+        summary = Summary(spec["bin_width"]).update(values[positions])
+        if summary.count:
+            out[key] = summary
+    return out
+
+
+class SummaryStore:
+    """
+    Per-group summaries of the SUMMARY_SPECS columns, built at startup and updated
+    as rows are appended. summarize() answers filters on the key columns, and date
+    ranges on whole time slices, by merging stored groups; anything else is
+    summarized from the matching rows by the backend.
+    """
+
+    def __init__(self, data, specs=SUMMARY_SPECS):
+        self.specs = specs
+        self.groups = {}
+        self._lock = threading.Lock()
+        for name in specs:
+            self.rebuild(name, data)
+
+    def rebuild(self, name, data):
+        spec = self.specs[name]
+        df = data.get(spec["table"], pd.DataFrame())
+        groups = None
+        if not df.empty and all(c in df.columns for c in self.columns(name)):
+            groups = summarize_frame(df, spec, _group_columns(spec))
+        with self._lock:
+            self.groups[name] = groups
+
+    def has(self, name):
+        return self.groups.get(name) is not None
+
+    def columns(self, name):
+        spec = self.specs[name]
+        return [spec["column"]] + spec["keys"] + ([spec["date"]] if spec.get("period") else [])
+
+    def _slice_bounds(self, name, row_filter):
+        """(start, end) of the filter's date range if it covers whole time slices, else False."""
+        spec = self.specs[name]
+        bounds = (row_filter.start, row_filter.end_exclusive)
+        if bounds == (None, None):
+            return bounds
+        if not spec.get("period"):
+            # No date column: the range is ignored, like the table filters do
+            return (None, None)
+        for ts in bounds:
+            if ts is not None and ts.to_period(spec["period"]).start_time != ts:
+                return False
+        return bounds
+
+    def _filter_keys(self, name, row_filter):
+        """The filter's key constraints the table honours (the rest are ignored anyway)."""
+        table_keys = FILTER_COLUMNS.get(self.specs[name]["table"], {}).get("keys", [])
+        return {c: v for c, v in row_filter.keys.items() if c in table_keys}
+
+    def can_serve(self, name, row_filter):
+        if not self.has(name):
+            return False
+        if row_filter is None or not row_filter.active:
+            return True
+        keys = self.specs[name]["keys"]
+        return (self._slice_bounds(name, row_filter) is not False
+                and all(c in keys for c in self._filter_keys(name, row_filter)))
+
+    def summarize(self, name, by, row_filter=None):
+        """{key tuple over `by`: Summary} merged from the stored groups (see can_serve)."""
+        spec = self.specs[name]
+        columns = _group_columns(spec)
+        positions = [columns.index(c) for c in by]
+        wanted = {}
+        start = end = None
+        if row_filter is not None and row_filter.active:
+            wanted = {columns.index(c): set(v) for c, v in self._filter_keys(name, row_filter).items()}
+            start, end = self._slice_bounds(name, row_filter)
+        period = columns.index(PERIOD) if PERIOD in columns else None
+        with self._lock:
+            groups = self.groups.get(name) or {}
+            selected = {}
+            for key, summary in groups.items():
+                if any(str(key[i]) not in values for i, values in wanted.items()):
+                    continue
+                if period is not None and ((start is not None and key[period] < start)
+                                           or (end is not None and key[period] >= end)):
+                    continue
+                selected.setdefault(tuple(key[i] for i in positions), []).append(summary)
+        return {key: Summary.merged(parts, spec["bin_width"]) for key, parts in selected.items()}
+
+    def append(self, table, rows):
+        """Fold newly appended rows into the groups they belong to."""
+        for name, spec in self.specs.items():
+            if spec["table"] != table or not self.has(name) or rows.empty:
+                continue
+            if not all(c in rows.columns for c in self.columns(name)):
+                continue
+            fresh = summarize_frame(rows, spec, _group_columns(spec))
+            with self._lock:
+                groups = dict(self.groups[name])
+                for key, summary in fresh.items():
+                    if key in groups:
+                        summary = Summary.merged([groups[key], summary], spec["bin_width"])
+                    groups[key] = summary
+                self.groups[name] = groups
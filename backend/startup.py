@@ -0,0 +1,187 @@
+"""
+Startup bookkeeping: lazily imported heavy modules, background warm-up and the
+/api/startup report. Also a startup-time check for CI:
+
+    python startup.py --budget 2.5
+
+runs `import app` in a fresh interpreter under `-X importtime`, prints the
+slowest top-level imports and exits 1 if the import took longer than the budget.
+"""
+import argparse
+import importlib
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+_lock = threading.RLock()
+# Seconds each lazily imported module took to load, in import order
+IMPORT_TIMES = {}
+
+
+def import_timed(name):
+    """Import `name`, recording how long it took if this is the first import."""
+    with _lock:
+        module = sys.modules.get(name)
+        if module is not None and name in IMPORT_TIMES:
+            return module
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        IMPORT_TIMES.setdefault(name, round(time.perf_counter() - start, 4))
+        return module
+
+
+class LazyModule:
+    """
+    Stands in for a module that is only imported on first attribute access, so
+    `px = LazyModule("plotly.express")` costs nothing until a chart is drawn.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            module = self._module = import_timed(self._name)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+class StartupReport:
+    """
+    Timings of the startup phases, plus the warm-up that imports the heavy
+    modules in a background thread once the server is listening. The process is
+    ready (for /health/ready) when the warm-up has finished.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # Seconds each phase took, and seconds since start at each milestone
+        self.phases = {}
+        self.marks = {}
+        self.warm_modules = []
+        self.warm_error = None
+        self._warm_thread = None
+        self._warm_hooks = []
+        self._ready = threading.Event()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - start, 4)
+
+    def mark(self, name):
+        """Record the seconds since this report was created as milestone `name`."""
+        self.marks[name] = round(time.perf_counter() - self.started, 4)
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def warm_up(self, modules, hooks=(), background=True):
+        """
+        Import `modules`, then call each of `hooks` (e.g. draw a throwaway chart so
+        plotly loads its validators), in a daemon thread unless background=False.
+        The process is marked ready afterwards.
+        """
+        self.warm_modules = list(modules)
+        self._warm_hooks = list(hooks)
+        if not background:
+            self._warm()
+        elif self._warm_thread is None:
+            self._warm_thread = threading.Thread(target=self._warm, name="warm-up", daemon=True)
+            self._warm_thread.start()
+
+    def _warm(self):
+        try:
+            with self.phase("warm_up"):
+                for name in self.warm_modules:
+                    import_timed(name)
+                for hook in self._warm_hooks:
+                    hook()
+        except Exception as e:
+            # Not fatal: the module is imported again (and fails loudly) on first use
+            self.warm_error = str(e)
+            print(f"Warning: warm-up failed: {e}")
+        self.mark("ready")
+        self._ready.set()
+
+    def report(self):
+        return {
+            "ready": self.ready,
+            "uptime_s": round(time.perf_counter() - self.started, 3),
+            "phases": dict(self.phases),
+            "marks": dict(self.marks),
+            "lazy_imports": dict(IMPORT_TIMES),
+            "warm_modules": self.warm_modules,
+            "warm_error": self.warm_error,
+        }
+
+
+# `-X importtime` lines: "import time: self [us] | cumulative | imported package"
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_breakdown(stderr, module):
+    """
+    Seconds per module imported directly by `module` (cumulative, so a library's
+    own imports count towards it), plus `module`'s own body under "<module> (self)".
+    """
+    top = {}
+    for line in stderr.splitlines():
+        m = _IMPORTTIME.match(line)
+        if not m:
+            continue
+        depth = len(m.group(3))
+        if depth == 1 and m.group(4) == module:
+            top[f"{module} (self)"] = int(m.group(1)) / 1e6
+        elif depth == 3:
+            top[m.group(4)] = top.get(m.group(4), 0) + int(m.group(2)) / 1e6
+    return top
+
+
+def measure(module="app", env=None):
+    """(wall seconds, {module: cumulative seconds}) for importing `module` in a fresh interpreter."""
+    cmd = [sys.executable, "-X", "importtime", "-c",
+           f"import time; t = time.perf_counter(); import {module}; "
+           f"print(time.perf_counter() - t)"]
+    out = subprocess.run(cmd, capture_output=True, text=True, env=env,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    if out.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{out.stderr[-2000:]}")
+    return float(out.stdout.strip().splitlines()[-1]), import_breakdown(out.stderr, module)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=float(os.environ.get("PHARMACY_STARTUP_BUDGET", "3.0")),
+                        help="seconds `import app` may take (default 3.0)")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=3, help="take the fastest of this many runs")
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(max(1, args.runs))]
+    wall, top = min(runs, key=lambda r: r[0])
+    print(f"import {args.module}: {wall:.3f}s (budget {args.budget:.3f}s, best of {len(runs)})")
+    for name, seconds in sorted(top.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"  {seconds * 1000:9.1f} ms  {name}")
+    if wall > args.budget:
+        print(f"FAIL: startup is {wall - args.budget:.3f}s over budget")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
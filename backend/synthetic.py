@@ -0,0 +1,80 @@
+import os
+import numpy as np
+import pandas as pd
+
+from data_cache import SCHEMAS
+
+# Foreign key column -> the dimension table it points into
+FOREIGN_KEYS = {
+    "customer_id": "customers",
+    "medicine_id": "medicine",
+    "shop_id": "pharmacy",
+    "type_id": "med_type",
+}
+
+DIMENSION_TABLES = set(FOREIGN_KEYS.values())
+
+
+def _copy_ids(ids, copy):
+    """IDs for the `copy`-th replica of a dimension table (copy 0 keeps the originals)."""
+    ids = ids.astype(str)
+    return ids if copy == 0 else ids + f"-{copy}"
+
+
+def _remap_keys(values, scale, rng):
+    """Point each foreign key at a random replica of the row it referenced."""
+    keys = pd.Series(values.to_numpy(dtype=object))
+    copies = rng.integers(0, scale, size=len(keys))
+    suffix = pd.Series(copies).astype(str).radd("-").where(copies > 0, "")
+    return (keys.astype(str) + suffix).where(keys.notna(), None).to_numpy(dtype=object)
+
+
+def scale_tables(data, scale, seed=0):
+    """
+    Synthetic copy of the eight tables with `scale` times the rows.
+
+    Dimension tables (customers, medicine, pharmacy, med_type) are replicated with
+    suffixed IDs; fact tables are resampled with replacement and their foreign keys
+    spread across the replicas, so every key that resolved in the source still
+    resolves here. Scale 1 returns the source tables unchanged.
+    """
+    if scale == 1:
+        return {name: df.copy() for name, df in data.items()}
+
+    rng = np.random.default_rng(seed)
+    out = {}
+    for name, df in data.items():
+        if df.empty:
+            out[name] = df.copy()
+            continue
+        key = SCHEMAS.get(name, {}).get("key")
+
+        if name in DIMENSION_TABLES:
+            parts = []
+            for copy in range(scale):
+                part = df.copy()
+                if key in part.columns:
+                    part[key] = _copy_ids(part[key], copy)
+                parts.append(part)
+            scaled = pd.concat(parts, ignore_index=True)
+        else:
+            rows = rng.integers(0, len(df), size=len(df) * scale)
+            scaled = df.iloc[rows].reset_index(drop=True)
+            if key in scaled.columns:
+                prefix = str(df[key].iloc[0]).rstrip("0123456789")
+                scaled[key] = [f"{prefix}{i}" for i in range(len(scaled))]
+
+        for col in FOREIGN_KEYS:
+            if col in scaled.columns and col != key:
+                scaled[col] = _remap_keys(scaled[col], scale, rng)
+        out[name] = scaled
+    return out
+
+
+def write_tables(data, out_dir, files):
+    """Write tables as CSVs named like the originals so `load_data` can read them."""
+    os.makedirs(out_dir, exist_ok=True)
+    for name, fname in files.items():
+        df = data.get(name)
+        if df is not None:
+            df.to_csv(os.path.join(out_dir, fname), index=False)
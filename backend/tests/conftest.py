@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The backend modules are imported flat (`import app`), as run.py and serve.py do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
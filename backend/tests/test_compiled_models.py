@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestClassifier, RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline
+from sklearn.tree import DecisionTreeRegressor
+
+from compiled_models import compile_pipeline, parity_error
+from ml_models import PharmacyML, _make_preprocessor
+
+NUMERIC = ["price", "quantity"]
+CATEGORICAL = ["payment_mode", "brand"]
+
+
+def sales(n, seed):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "price": rng.gamma(2.0, 50.0, n).round(2),
+        "quantity": rng.integers(1, 10, n).astype(float),
+        "payment_mode": rng.choice(["Cash", "Card", "UPI"], n).astype(object),
+        "brand": rng.choice([f"B{i}" for i in range(8)], n).astype(object),
+    })
+    # Holes in every column, filled by the imputers
+    for col in df.columns:
+        df.loc[rng.random(n) < 0.1, col] = np.nan
+    return df
+
+
+def holdout_records():
+    records = sales(60, seed=1).astype(object)
+    records = records.where(records.notna(), None).to_dict("records")
+    # Categories the encoders never saw, and a record with nothing in it
+    records.append(dict(records[0], payment_mode="Crypto", brand="__unseen__"))
+    records.append({c: None for c in NUMERIC + CATEGORICAL})
+    return records
+
+
+def frame(records):
+    """The records as the pipeline path sees them (PharmacyML.validate_features)."""
+    ml = PharmacyML({}, train=False)
+    ml.features["model"] = {"numeric": NUMERIC, "categorical": CATEGORICAL}
+    X, errors = ml.validate_features("model", pd.DataFrame(records))
+    assert errors == []
+    return X
+
+
+@pytest.mark.parametrize("estimator", [
+    LinearRegression(),
+    DecisionTreeRegressor(max_depth=6, random_state=0),
+    RandomForestRegressor(n_estimators=10, max_depth=6, random_state=0),
+    GradientBoostingRegressor(n_estimators=20, random_state=0),
+], ids=lambda e: type(e).__name__)
+def test_compiled_regressors_match_their_pipeline(estimator):
+    train = sales(400, seed=0)
+    y = train["price"].fillna(0) * 1.5 + train["quantity"].fillna(0) * 3 + (train["brand"] == "B1") * 20
+    pipeline = Pipeline([("preprocessor", _make_preprocessor(NUMERIC, CATEGORICAL)), ("regressor", estimator)])
+    pipeline.fit(train, y)
+
+    records = holdout_records()
+    preds, errors = compile_pipeline(pipeline).predict(records)
+    assert errors == []
+    assert parity_error(pipeline.predict(frame(records)), preds) is None
+
+
+def test_compiled_classifier_matches_its_pipeline():
+    train = sales(400, seed=0)
+    y = np.where(train["payment_mode"] == "Cash", "Completed", np.where(train["quantity"] > 5, "Pending", "Cancelled"))
+    pipeline = Pipeline([("preprocessor", _make_preprocessor(NUMERIC, CATEGORICAL)),
+                         ("classifier", RandomForestClassifier(n_estimators=10, random_state=0))])
+    pipeline.fit(train, y)
+
+    records = holdout_records()
+    preds, errors = compile_pipeline(pipeline).predict(records)
+    assert errors == []
+    assert parity_error(pipeline.predict(frame(records)), preds) is None
+
+
+def test_parity_error_reports_differences():
+    assert parity_error(np.array([1.0, 2.0]), np.array([1.0, 2.5])) is not None
+    assert parity_error(np.array(["a", "b"]), np.array(["a", "c"])) == "1 of 2 labels differ"
+
+
+def test_unusable_records_are_rejected():
+    train = sales(100, seed=0)
+    pipeline = Pipeline([("preprocessor", _make_preprocessor(NUMERIC, CATEGORICAL)),
+                         ("regressor", LinearRegression())]).fit(train, np.arange(100.0))
+    compiled = compile_pipeline(pipeline)
+    assert compiled.predict([{"price": 1.0}])[0] is None
+    preds, errors = compiled.predict([{"price": "cheap", "quantity": 1, "payment_mode": "Cash", "brand": "B1"}])
+    assert preds is None and "price" in errors[0]
@@ -0,0 +1,29 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+
+
+@pytest.fixture
+def client():
+    app.RESPONSE_CACHE.clear()
+    yield TestClient(app.app)
+    app.RESPONSE_CACHE.clear()
+
+
+@pytest.mark.parametrize("query", ["max_points=0", "max_points=50", "max_points=50&shop_id=1"])
+def test_bundle_caches_what_the_chart_endpoint_would_return(client, query):
+    direct = client.get(f"/discount_vs_price?{query}")
+    assert direct.headers["x-cache"] == "MISS"
+    app.RESPONSE_CACHE.clear()
+
+    bundle = client.get(f"/api/dashboard?charts=discount_vs_price&{query}")
+    assert bundle.status_code == 200
+    after = client.get(f"/discount_vs_price?{query}")
+    assert after.headers["x-cache"] == "HIT"
+    assert after.content == direct.content
+
+
+def test_bundle_rejects_bad_chart_parameters(client):
+    response = client.get("/api/dashboard?charts=discount_vs_price&max_points=lots")
+    assert response.status_code == 422
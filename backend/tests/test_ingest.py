@@ -0,0 +1,94 @@
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+from data_cache import apply_schema
+from ingest import CsvTailer, prepare_batch
+
+
+def purchase(purchase_id, quantity):
+    return {"purchase_id": purchase_id, "medicine_id": "M1", "shop_id": "S1", "supplier_name": "Acme",
+            "quantity": quantity, "cost_price": 10, "purchase_date": "2024-01-01"}
+
+
+def loaded_purchases():
+    return apply_schema(pd.DataFrame([purchase("P0", 5)]), "purchases")
+
+
+@pytest.mark.parametrize("quantity", [40000, 99999, -40000])
+def test_out_of_range_integers_are_rejected(quantity):
+    batch, errors = prepare_batch("purchases", pd.DataFrame([purchase("P1", 3), purchase("P2", quantity)]),
+                                  loaded_purchases())
+    assert batch is None
+    assert errors == ["values in 'quantity' that aren't whole numbers within int16 at rows [1]"]
+
+
+def test_fractional_integers_are_rejected():
+    batch, errors = prepare_batch("purchases", pd.DataFrame([purchase("P1", 2.7)]), loaded_purchases())
+    assert batch is None
+    assert "quantity" in errors[0] and "rows [0]" in errors[0]
+
+
+def test_width_follows_a_widened_column():
+    existing = loaded_purchases().astype({"quantity": "int64"})
+    batch, errors = prepare_batch("purchases", pd.DataFrame([purchase("P1", 40000), purchase("P2", 3.0)]),
+                                  existing)
+    assert errors == []
+    assert batch["quantity"].tolist() == [40000, 3]
+
+
+@pytest.mark.parametrize("body", [{"foo": 1}, 5, [1, 2], "x", {"records": [1]}])
+def test_malformed_payloads_are_rejected(body):
+    response = TestClient(app.app).post("/api/ingest/purchases", json=body)
+    assert response.status_code == 422
+
+
+def test_already_loaded_rows_can_be_skipped():
+    rows = pd.DataFrame([purchase("P0", 5), purchase("P1", 3)])
+    batch, errors = prepare_batch("purchases", rows, loaded_purchases())
+    assert batch is None and "duplicate" in errors[0]
+    batch, errors = prepare_batch("purchases", rows, loaded_purchases(), skip_existing=True)
+    assert errors == []
+    assert batch["purchase_id"].tolist() == ["P1"]
+
+
+@pytest.fixture
+def tailed(tmp_path):
+    path = tmp_path / "purchases.csv"
+    path.write_text("purchase_id,quantity\nP0,5\n")
+    received, results = [], []
+
+    def on_rows(name, rows):
+        received.append(rows)
+        return results.pop(0) if results else (rows, [])
+
+    tailer = CsvTailer(str(tmp_path), {"purchases": "purchases.csv"}, on_rows)
+    tailer.mark()
+    return path, tailer, received, results
+
+
+def append(path, text):
+    with open(path, "a") as f:
+        f.write(text)
+
+
+def test_tailing_survives_a_malformed_line(tailed, capsys):
+    path, tailer, received, _ = tailed
+    append(path, 'P1,"unterminated\n')
+    tailer.poll()
+    assert received == []
+    assert "couldn't ingest" in capsys.readouterr().out
+
+    append(path, "P2,7\n")
+    tailer.poll()
+    assert [r["purchase_id"].tolist() for r in received] == [["P2"]]
+
+
+def test_rejected_tailed_rows_are_logged(tailed, capsys):
+    path, tailer, received, results = tailed
+    results.append((None, ["values in 'quantity' that aren't whole numbers within int16 at rows [0]"]))
+    append(path, "P1,99999\n")
+    tailer.poll()
+    assert len(received) == 1
+    assert "rejected 1 rows" in capsys.readouterr().out
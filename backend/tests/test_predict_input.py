@@ -0,0 +1,42 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+
+
+class _StubML:
+    """Just enough of PharmacyML for requests that fail before reaching a model."""
+    models = {"Random Forest": None}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app.TRAINING_JOB, "state", "ready")
+    monkeypatch.setattr(app, "ML_SYSTEM", _StubML())
+    return TestClient(app.app)
+
+
+URL = "/api/ml/predict/Random Forest"
+
+
+@pytest.mark.parametrize("body", [{"foo": 1}, 5, [1, 2], "x", {"records": 5}, {"records": [1]}])
+def test_malformed_json_is_rejected(client, body):
+    response = client.post(URL, json=body)
+    assert response.status_code == 422
+
+
+def test_invalid_json_is_rejected(client):
+    response = client.post(URL, content=b"{not json", headers={"content-type": "application/json"})
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("body", [b"", b"a,b\n1,2\n3,4,5,6\n"])
+def test_malformed_csv_is_rejected(client, body):
+    response = client.post(URL, content=body, headers={"content-type": "text/csv"})
+    assert response.status_code == 422
+    assert "CSV" in response.json()["detail"]
+
+
+def test_upload_without_file_is_rejected(client):
+    response = client.post(URL, data={"other": "x"})
+    assert response.status_code == 422
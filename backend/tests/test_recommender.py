@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import recommender
+from recommender import CoOccurrenceIndex
+
+pytestmark = pytest.mark.skipif(recommender.sp is None, reason="needs scipy")
+
+
+def prescriptions(n, customers=200, medicines=60, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"customer_id": [f"C{i}" for i in rng.integers(0, customers, n)],
+                         "medicine_id": [f"M{i}" for i in rng.integers(0, medicines, n)]})
+
+
+def neighbours(index):
+    ids = index.medicines.index
+    return {ids[i]: {metric: [(ids[j], cos, n) for j, cos, n in entry[metric]] for metric in ("cosine", "count")}
+            for i, entry in index.neighbors.items()}
+
+
+def test_matches_brute_force():
+    rows = prescriptions(1500)
+    index = CoOccurrenceIndex(k=5).ensure(lambda: rows)
+    X = pd.crosstab(rows["customer_id"], rows["medicine_id"]).clip(upper=1)
+    C = X.T @ X
+    for medicine in ["M0", "M7", "M31"]:
+        customers, top = index.recommend(medicine, n=5, metric="count")
+        assert customers == C.loc[medicine, medicine]
+        others = C.loc[medicine].drop(medicine)
+        assert [n for _, _, n in top] == sorted(others[others > 0], reverse=True)[:5]
+        for other, cosine, together in top:
+            assert together == C.loc[medicine, other]
+            expected = together / np.sqrt(C.loc[medicine, medicine] * C.loc[other, other])
+            assert cosine == pytest.approx(expected, abs=1e-4)
+
+
+@pytest.mark.parametrize("batch", [3, 40, 250])
+def test_incremental_adds_match_a_full_build(batch):
+    rows = prescriptions(3000, customers=250, medicines=80, seed=batch)
+    full = CoOccurrenceIndex(k=8).ensure(lambda: rows)
+    # New customers and medicines arrive in the later batches
+    index = CoOccurrenceIndex(k=8).ensure(lambda: rows.iloc[:1000])
+    for start in range(1000, len(rows), batch):
+        index.add(rows.iloc[start:start + batch])
+    index.add(rows.iloc[:100])  # already counted: changes nothing
+
+    assert neighbours(index) == neighbours(full)
+    assert index.status()["nonzero_pairs"] == full.status()["nonzero_pairs"]
+
+
+def test_add_before_build_is_left_to_the_build():
+    index = CoOccurrenceIndex()
+    index.add(prescriptions(10))
+    assert not index.ready
+    index.ensure(lambda: prescriptions(50))
+    assert index.status()["prescriptions"] == 50
@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import startup
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Each run imports the app in fresh interpreters (a few seconds); set to skip
+slow = pytest.mark.skipif(os.environ.get("PHARMACY_SKIP_STARTUP_TEST") == "1",
+                          reason="PHARMACY_SKIP_STARTUP_TEST=1")
+
+
+def run_budget_check(*args):
+    # The budget is for the default (pandas) backend; a DuckDB file opened by this
+    # test process would also be locked against the child
+    env = {k: v for k, v in os.environ.items() if k != "PHARMACY_BACKEND"}
+    return subprocess.run([sys.executable, "startup.py", *args], cwd=BACKEND, env=env,
+                          capture_output=True, text=True)
+
+
+@slow
+def test_import_stays_within_the_startup_budget():
+    # The budget comes from PHARMACY_STARTUP_BUDGET (default 3s), as in CI
+    out = run_budget_check("--runs", "2")
+    assert out.returncode == 0, out.stdout + out.stderr
+    assert out.stdout.rstrip().endswith("OK")
+
+
+@slow
+def test_budget_check_fails_when_over_budget():
+    out = run_budget_check("--budget", "0", "--runs", "1")
+    assert out.returncode == 1
+    assert "FAIL: startup is" in out.stdout
+
+
+def test_import_breakdown_attributes_imports_to_top_level_modules():
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       200 |        300 |     numpy.core",
+        "import time:       500 |     120000 |   pandas",
+        "import time:        50 |       4000 |   data_cache",
+        "import time:      7000 |     131000 | app",
+    ])
+    assert startup.import_breakdown(stderr, "app") == {"pandas": 0.12, "data_cache": 0.004, "app (self)": 0.007}
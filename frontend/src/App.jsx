@@ -1,10 +1,55 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import PlotlyGraph from './components/PlotlyGraph';
 import MLDashboard from './components/MLDashboard';
 import EDADashboard from './components/EDADashboard';
 
+// All dashboard charts in one request: /api/dashboard streams one NDJSON line
+// per chart as soon as it's ready. Returns { chart name: payload } so far, and
+// whether the stream failed (the charts then fetch their own endpoints).
+function useDashboardStream() {
+  const [payloads, setPayloads] = useState({});
+  const [failed, setFailed] = useState(false);
+
+  useEffect(() => {
+    const controller = new AbortController();
+    const load = async () => {
+      try {
+        const response = await fetch('http://127.0.0.1:8000/api/dashboard', { signal: controller.signal });
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          const lines = buffer.split('\n');
+          buffer = lines.pop();
+          for (const line of lines) {
+            if (!line.trim()) continue;
+            const frame = JSON.parse(line);
+            if (frame.chart) {
+              setPayloads(prev => ({ ...prev, [frame.chart]: frame.payload }));
+            }
+          }
+        }
+      } catch (err) {
+        if (err.name !== 'AbortError') {
+          console.error("Dashboard stream failed, fetching charts one by one", err);
+          setFailed(true);
+        }
+      }
+    };
+    load();
+    return () => controller.abort();
+  }, []);
+
+  return { payloads, failed };
+}
+
 function App() {
   const [activeTab, setActiveTab] = useState('dashboard');
+  const { payloads, failed } = useDashboardStream();
 
   const charts = [
     { endpoint: '/sales_over_time', title: 'Total Sales Over Time' },
@@ -57,6 +102,7 @@ function App() {
               key={index} 
               endpoint={chart.endpoint} 
               title={chart.title} 
+              payload={failed ? undefined : (payloads[chart.endpoint.slice(1)] ?? null)}
             />
           ))}
         </main>
@@ -9,8 +9,41 @@ const MLDashboard = () => {
   const [selectedModel, setSelectedModel] = useState("Random Forest");
   const [regPlot, setRegPlot] = useState(null);
   const [loadingPlot, setLoadingPlot] = useState(false);
+  const [mlStatus, setMlStatus] = useState(null);
+  const ready = Boolean(mlStatus && mlStatus.ready);
 
   useEffect(() => {
+    // The ML endpoints answer 503 while the models train, so poll the training
+    // status (backing off up to 30s) until they're ready or training failed
+    let timer;
+    let cancelled = false;
+    const poll = (delay) => {
+      axios.get('http://127.0.0.1:8000/api/ml/status')
+        .then(res => {
+          if (cancelled) return;
+          setMlStatus(res.data);
+          if (!res.data.ready && res.data.state !== 'failed') {
+            timer = setTimeout(() => poll(Math.min(delay * 2, 30000)), delay);
+          }
+        })
+        .catch(err => {
+          console.error("Error fetching ML status", err);
+          if (!cancelled) timer = setTimeout(() => poll(Math.min(delay * 2, 30000)), delay);
+        });
+    };
+    poll(2000);
+    return () => { cancelled = true; clearTimeout(timer); };
+  }, []);
+
+  const trainingMessage = () => {
+    if (!mlStatus) return "Loading metrics...";
+    if (mlStatus.state === 'failed') return `Model training failed: ${mlStatus.error || 'unknown error'}`;
+    const elapsed = mlStatus.elapsed_seconds != null ? ` (${Math.round(mlStatus.elapsed_seconds)}s)` : '';
+    return `Models are training: ${mlStatus.state}${elapsed}...`;
+  };
+
+  useEffect(() => {
+    if (!ready) return;
     // Fetch Regression Metrics
     axios.get('http://127.0.0.1:8000/api/ml/regression/compare')
       .then(res => {
@@ -34,10 +67,10 @@ const MLDashboard = () => {
     axios.get('http://127.0.0.1:8000/api/ml/classification/confusion_matrix')
       .then(res => setConfusionMatrix(res.data))
       .catch(err => console.error("Error fetching CM", err));
-  }, []);
+  }, [ready]);
 
   useEffect(() => {
-    if (selectedModel) {
+    if (ready && selectedModel) {
       setLoadingPlot(true);
       setRegPlot(null);
       setConfusionMatrix(null); // Reset CM
@@ -62,7 +95,7 @@ const MLDashboard = () => {
         })
         .catch(err => console.error("Error fetching regression CM", err));
     }
-  }, [selectedModel]);
+  }, [ready, selectedModel]);
 
   const renderConfusionMatrix = (cmData, title) => {
     if (!cmData || !cmData.matrix) return null;
@@ -100,11 +133,12 @@ const MLDashboard = () => {
   const [classCM, setClassCM] = useState(null);
 
   useEffect(() => {
+     if (!ready) return;
      // Fetch Classification CM
      axios.get('http://127.0.0.1:8000/api/ml/confusion_matrix/Status Classifier')
       .then(res => setClassCM(res.data))
       .catch(err => console.error("Error fetching class CM", err));
-  }, []);
+  }, [ready]);
 
   return (
     <div className="ml-dashboard">
@@ -124,6 +158,9 @@ const MLDashboard = () => {
                 <th style={{ padding: '12px', textAlign: 'left' }}>MAE</th>
                 <th style={{ padding: '12px', textAlign: 'left' }}>MSE</th>
                 <th style={{ padding: '12px', textAlign: 'left' }}>RMSE</th>
+                <th style={{ padding: '12px', textAlign: 'left' }}>CV R2 (± std)</th>
+                <th style={{ padding: '12px', textAlign: 'left' }}>Fit (s)</th>
+                <th style={{ padding: '12px', textAlign: 'left' }}>Predict (ms)</th>
               </tr>
             </thead>
             <tbody>
@@ -134,8 +171,11 @@ const MLDashboard = () => {
                   <td style={{ padding: '12px' }}>{m["MAE"]}</td>
                   <td style={{ padding: '12px' }}>{m["MSE"]}</td>
                   <td style={{ padding: '12px' }}>{m["RMSE"]}</td>
+                  <td style={{ padding: '12px' }}>{m["CV R2"] !== undefined ? `${m["CV R2"]} ± ${m["CV R2 Std"]}` : '-'}</td>
+                  <td style={{ padding: '12px' }}>{m["Fit Time (s)"] ?? '-'}</td>
+                  <td style={{ padding: '12px' }}>{m["Predict Time (ms)"] ?? '-'}</td>
                 </tr>
-              )) : <tr><td colSpan="5" style={{ padding: '20px', textAlign: 'center' }}>Loading metrics...</td></tr>}
+              )) : <tr><td colSpan="8" style={{ padding: '20px', textAlign: 'center' }}>{ready ? "Loading metrics..." : trainingMessage()}</td></tr>}
             </tbody>
           </table>
         </div>
@@ -150,7 +190,9 @@ const MLDashboard = () => {
           <div style={{ display: 'grid', gridTemplateColumns: 'repeat(auto-fit, minmax(400px, 1fr))', gap: '20px' }}>
             {/* Plot */}
             <div style={{ minHeight: '400px', background: 'rgba(0,0,0,0.2)', borderRadius: '8px', padding: '10px' }}>
-                {loadingPlot ? (
+                {!ready ? (
+                <div style={{ padding: '40px', textAlign: 'center' }}>{trainingMessage()}</div>
+                ) : loadingPlot ? (
                 <div style={{ padding: '40px', textAlign: 'center' }}>Loading Plot...</div>
                 ) : regPlot && regPlot.data ? (
                 <Plot
@@ -197,7 +239,7 @@ const MLDashboard = () => {
                 <p><strong>Model:</strong> Random Forest Classifier</p>
                 <p><strong>Accuracy:</strong> <span style={{ color: '#4ade80' }}>{classMetrics.Accuracy}</span></p>
               </div>
-            ) : <p>Loading...</p>}
+            ) : <p>{ready ? "Loading..." : trainingMessage()}</p>}
           </div>
 
           {/* Classification CM */}
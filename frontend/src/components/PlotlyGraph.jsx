@@ -2,37 +2,45 @@ import React, { useEffect, useState } from 'react';
 import Plot from 'react-plotly.js';
 import axios from 'axios';
 
-const PlotlyGraph = ({ endpoint, title }) => {
+// `payload` is the chart's response when the parent already has it (from the
+// /api/dashboard stream): null while it's on its way, undefined to fetch `endpoint`.
+const PlotlyGraph = ({ endpoint, title, payload }) => {
   const [data, setData] = useState(null);
   const [layout, setLayout] = useState(null);
   const [inference, setInference] = useState("");
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
+  const show = (body) => {
+    if (body.error) {
+      setError(body.error);
+    } else {
+      // Handle new response structure { graph: {...}, inference: "..." }
+      const graphData = body.graph || body; // Fallback for old structure
+      setData(graphData.data);
+      setLayout(graphData.layout);
+      setInference(body.inference || "");
+    }
+    setLoading(false);
+  };
+
   useEffect(() => {
+    if (payload !== undefined) {
+      if (payload !== null) show(payload);
+      return;
+    }
     const fetchData = async () => {
       try {
         const response = await axios.get(`http://127.0.0.1:8000${endpoint}`);
-        if (response.data.error) {
-          setError(response.data.error);
-        } else {
-          // Handle new response structure { graph: {...}, inference: "..." }
-          const graphData = response.data.graph || response.data; // Fallback for old structure
-          const inferenceText = response.data.inference || "";
-          
-          setData(graphData.data);
-          setLayout(graphData.layout);
-          setInference(inferenceText);
-        }
+        show(response.data);
       } catch (err) {
         setError(err.message);
-      } finally {
         setLoading(false);
       }
     };
 
     fetchData();
-  }, [endpoint]);
+  }, [endpoint, payload]);
 
   if (loading) return <div className="glass-panel loading">Loading {title}...</div>;
   if (error) return <div className="glass-panel error">Error: {error}</div>;